@@ -11,8 +11,9 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 import os
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
 import dj_database_url
+from django.core.exceptions import ImproperlyConfigured
 from datetime import timedelta
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -48,11 +49,15 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     *DJANGO_APPS,
     *THIRD_PARTY_PACKAGES,
 ]
 
 MIDDLEWARE = [
+    'core.middleware.RequestLogMiddleware',
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.ReadYourWritesMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -85,12 +90,40 @@ WSGI_APPLICATION = 'booking.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    'default': dj_database_url.config(
-        default=config('DATABASE_URL')
+# Connections are kept open for DB_CONN_MAX_AGE seconds (0 closes them after
+# every request, None keeps them forever) and checked before reuse when
+# DB_CONN_HEALTH_CHECKS is on. Only WSGI deployments should raise it: under
+# ASGI every thread of the async ORM would keep its own connection.
+# Behind PgBouncer in transaction mode, set DB_DISABLE_SERVER_SIDE_CURSORS.
+DB_CONN_MAX_AGE = config('DB_CONN_MAX_AGE', default=0, cast=lambda value: None if value == 'None' else int(value))
+DB_CONN_HEALTH_CHECKS = config('DB_CONN_HEALTH_CHECKS', default=True, cast=bool)
+DB_DISABLE_SERVER_SIDE_CURSORS = config('DB_DISABLE_SERVER_SIDE_CURSORS', default=False, cast=bool)
+
+
+def database(url):
+    database_settings = dj_database_url.parse(
+        url,
+        conn_max_age=DB_CONN_MAX_AGE,
+        conn_health_checks=DB_CONN_HEALTH_CHECKS,
+        disable_server_side_cursors=DB_DISABLE_SERVER_SIDE_CURSORS,
     )
+    return database_settings
+
+
+DATABASES = {
+    'default': database(config('DATABASE_URL'))
 }
 
+# Comma-separated replica URLs. Read-only endpoints (availability, history,
+# occupancy, exports) read from a random replica, except for users who wrote
+# within BOOKING_READ_YOUR_WRITES_SECONDS, who stay on the primary. For local
+# testing any URL works, including DATABASE_URL itself.
+DATABASE_REPLICA_URLS = config('DATABASE_REPLICA_URLS', default='', cast=Csv())
+for index, url in enumerate(DATABASE_REPLICA_URLS):
+    DATABASES[f'replica_{index}'] = {**database(url), 'TEST': {'MIRROR': 'default'}}
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+BOOKING_READ_YOUR_WRITES_SECONDS = config('BOOKING_READ_YOUR_WRITES_SECONDS', default=5, cast=int)
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -127,7 +160,7 @@ REST_FRAMEWORK = {
         'rest_framework.renderers.BrowsableAPIRenderer',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'core.authentication.CachedJWTAuthentication',
     ],
 }
 
@@ -141,26 +174,75 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-LOGGING = {
-    'version': 1,
-    'disable_existing_loggers': False,
-    'handlers': {
+# Logging goes to the console and LOG_FILE, rotated daily/hourly/... when
+# LOG_ROTATE_WHEN is set (e.g. 'midnight') or by size when LOG_MAX_BYTES is.
+# LOG_QUEUE hands records to a background writer thread; LOG_FORMAT=json
+# writes one JSON object per line with request_id, user_id, room_id and latency_ms.
+# LOG_REQUESTS adds a line per request; by default only when the queue is on,
+# so that it never costs a synchronous disk write per request.
+LOG_QUEUE = config('LOG_QUEUE', default=False, cast=bool)
+LOG_REQUESTS = config('LOG_REQUESTS', default=LOG_QUEUE, cast=bool)
+LOG_FORMAT = config('LOG_FORMAT', default='text')
+LOG_FILE = config('LOG_FILE', default='django_debug.log')
+LOG_MAX_BYTES = config('LOG_MAX_BYTES', default=0, cast=int)
+LOG_ROTATE_WHEN = config('LOG_ROTATE_WHEN', default='')
+LOG_BACKUP_COUNT = config('LOG_BACKUP_COUNT', default=5, cast=int)
+
+LOG_FILE_OPTIONS = {
+    'filename': LOG_FILE,
+    'max_bytes': LOG_MAX_BYTES,
+    'when': LOG_ROTATE_WHEN,
+    'backup_count': LOG_BACKUP_COUNT,
+}
+
+if LOG_QUEUE:
+    LOG_HANDLERS = {
+        'queue': {
+            '()': 'core.log.BackgroundHandler',
+            'json_format': LOG_FORMAT == 'json',
+            'filters': ['context'],
+            **LOG_FILE_OPTIONS,
+        },
+    }
+else:
+    LOG_HANDLERS = {
         'console': {
             'class': 'logging.StreamHandler',
+            'filters': ['context'],
         },
         'file': {
-            'class': 'logging.FileHandler',
-            'filename': 'django_debug.log',
+            '()': 'core.log.file_handler',
+            'formatter': LOG_FORMAT,
+            'filters': ['context'],
+            **LOG_FILE_OPTIONS,
+        },
+    }
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'context': {
+            '()': 'core.log.ContextFilter',
         },
     },
+    'formatters': {
+        'text': {
+            'format': '%(message)s',
+        },
+        'json': {
+            '()': 'core.log.JsonFormatter',
+        },
+    },
+    'handlers': LOG_HANDLERS,
     'loggers': {
         'django': {
-            'handlers': ['console', 'file'],
+            'handlers': list(LOG_HANDLERS),
             'level': 'INFO',
             'propagate': True,
         },
         'core': {
-            'handlers': ['console', 'file'],
+            'handlers': list(LOG_HANDLERS),
             'level': 'DEBUG',
             'propagate': False,
         },
@@ -173,3 +255,100 @@ SIMPLE_JWT = {
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
 }
+
+# core.authentication.CachedJWTAuthentication keeps up to JWT_USER_CACHE_SIZE
+# resolved users for JWT_USER_CACHE_TTL seconds (bounding how long another
+# worker may miss a deactivation). JWT_STATELESS_READS lets GET/HEAD/OPTIONS
+# requests trust the token claims without loading the user.
+JWT_USER_CACHE_SIZE = config('JWT_USER_CACHE_SIZE', default=10000, cast=int)
+JWT_USER_CACHE_TTL = config('JWT_USER_CACHE_TTL', default=60, cast=int)
+JWT_STATELESS_READS = config('JWT_STATELESS_READS', default=False, cast=bool)
+
+# Validate booking requests without reading the database and let the INSERT
+# enforce room existence and overlaps (one statement per booking).
+BOOKING_FAST_CREATE = config('BOOKING_FAST_CREATE', default=True, cast=bool)
+
+# Answer read-only availability checks from a per-worker LRU cache of each
+# room's future bookings. Cross-worker staleness is bounded by
+# BOOKING_AVAILABILITY_CACHE_STALENESS seconds when CACHES is shared.
+BOOKING_AVAILABILITY_CACHE = config('BOOKING_AVAILABILITY_CACHE', default=False, cast=bool)
+BOOKING_AVAILABILITY_CACHE_ROOMS = config('BOOKING_AVAILABILITY_CACHE_ROOMS', default=10000, cast=int)
+BOOKING_AVAILABILITY_CACHE_STALENESS = config('BOOKING_AVAILABILITY_CACHE_STALENESS', default=2.0, cast=float)
+
+# How concurrent writers of the same room are serialized on top of the overlap
+# exclusion constraint: 'none', 'advisory' (pg_advisory_xact_lock on the room
+# id) or 'room' (SELECT ... FOR UPDATE on the Room row). A lock not granted
+# within BOOKING_LOCK_TIMEOUT_MS answers 409; 0 fails immediately.
+BOOKING_LOCK_STRATEGY = config('BOOKING_LOCK_STRATEGY', default='none')
+BOOKING_LOCK_TIMEOUT_MS = config('BOOKING_LOCK_TIMEOUT_MS', default=2000, cast=int)
+
+# GET /metrics answers scrapers sending "Authorization: Bearer <BOOKING_METRICS_TOKEN>"
+# and staff sessions; everyone else is refused. Empty leaves it to staff only.
+BOOKING_METRICS_TOKEN = config('BOOKING_METRICS_TOKEN', default='')
+
+# Requests slower than this are counted, and a BOOKING_SLOW_REQUEST_SAMPLE_RATE
+# share of them is logged with their SQL by core.middleware.
+BOOKING_SLOW_REQUEST_MS = config('BOOKING_SLOW_REQUEST_MS', default=500, cast=int)
+BOOKING_SLOW_REQUEST_SAMPLE_RATE = config('BOOKING_SLOW_REQUEST_SAMPLE_RATE', default=0.1, cast=float)
+
+# How long hotel occupancy reports (core.analytics) are served from CACHES
+# before being recomputed; 0 always recomputes.
+BOOKING_ANALYTICS_CACHE_TTL = config('BOOKING_ANALYTICS_CACHE_TTL', default=300, cast=int)
+
+# archive_bookings moves bookings that ended more than
+# BOOKING_ARCHIVE_RETENTION_DAYS ago into the archive table, in batches of
+# BOOKING_ARCHIVE_BATCH_SIZE rows. History endpoints read both tables.
+BOOKING_ARCHIVE_RETENTION_DAYS = config('BOOKING_ARCHIVE_RETENTION_DAYS', default=90, cast=int)
+BOOKING_ARCHIVE_BATCH_SIZE = config('BOOKING_ARCHIVE_BATCH_SIZE', default=5000, cast=int)
+
+# POST /booking/ requests sent with an Idempotency-Key header store their
+# response for BOOKING_IDEMPOTENCY_TTL seconds and replay it to retries. A
+# retry arriving while the first request still runs waits for it up to
+# BOOKING_IDEMPOTENCY_WAIT_MS before answering 409.
+BOOKING_IDEMPOTENCY_TTL = config('BOOKING_IDEMPOTENCY_TTL', default=86400, cast=int)
+BOOKING_IDEMPOTENCY_WAIT_MS = config('BOOKING_IDEMPOTENCY_WAIT_MS', default=5000, cast=int)
+
+# Per-worker admission control for POST /booking/ (core.admission). Each room
+# lets BOOKING_ADMISSION_CONCURRENCY requests write at once and queues up to
+# BOOKING_ADMISSION_QUEUE more for BOOKING_ADMISSION_MAX_WAIT_MS before
+# answering 409. Each user may book BOOKING_USER_RATE times per second with
+# bursts of BOOKING_USER_BURST (0 disables), beyond which they get 429; a bulk
+# request counts once per booking. With the availability cache on, slots it
+# knows are taken are refused up front.
+BOOKING_ADMISSION = config('BOOKING_ADMISSION', default=False, cast=bool)
+BOOKING_ADMISSION_CONCURRENCY = config('BOOKING_ADMISSION_CONCURRENCY', default=1, cast=int)
+BOOKING_ADMISSION_QUEUE = config('BOOKING_ADMISSION_QUEUE', default=32, cast=int)
+BOOKING_ADMISSION_MAX_WAIT_MS = config('BOOKING_ADMISSION_MAX_WAIT_MS', default=1000, cast=int)
+BOOKING_USER_RATE = config('BOOKING_USER_RATE', default=2.0, cast=float)
+BOOKING_USER_BURST = config('BOOKING_USER_BURST', default=10, cast=int)
+
+# POST /booking/hold/ reserves a room for BOOKING_HOLD_TTL seconds; the hold
+# occupies the slot like a booking until it is confirmed or released. Expired
+# holds keep blocking the slot until sweep_holds deletes them, in batches of
+# BOOKING_HOLD_SWEEP_BATCH_SIZE rows.
+BOOKING_HOLD_TTL = config('BOOKING_HOLD_TTL', default=600, cast=int)
+BOOKING_HOLD_SWEEP_BATCH_SIZE = config('BOOKING_HOLD_SWEEP_BATCH_SIZE', default=1000, cast=int)
+
+# With BOOKING_CALENDAR on, every booking write refreshes per-room monthly
+# bitmaps of taken BOOKING_CALENDAR_SLOT_MINUTES slots (a divisor of 1440)
+# after commit, and GET /hotels/<id>/calendar/ answers from them. Run
+# rebuild_calendar after turning it on or changing the slot size.
+BOOKING_CALENDAR = config('BOOKING_CALENDAR', default=False, cast=bool)
+BOOKING_CALENDAR_SLOT_MINUTES = config('BOOKING_CALENDAR_SLOT_MINUTES', default=1440, cast=int)
+if BOOKING_CALENDAR_SLOT_MINUTES <= 0 or 1440 % BOOKING_CALENDAR_SLOT_MINUTES:
+    raise ImproperlyConfigured("BOOKING_CALENDAR_SLOT_MINUTES must divide a day (1440 minutes).")
+
+# With BOOKING_OUTBOX on, booking writes record events (booking.created,
+# booking.rescheduled, booking.cancelled) in their own transaction, and
+# run_outbox_worker hands them to the BOOKING_OUTBOX_HANDLERS callables in
+# batches of BOOKING_OUTBOX_BATCH_SIZE. Claimed events are leased for
+# BOOKING_OUTBOX_LEASE seconds; failures are retried after
+# BOOKING_OUTBOX_RETRY_BASE seconds, doubling up to BOOKING_OUTBOX_RETRY_MAX,
+# and given up after BOOKING_OUTBOX_MAX_ATTEMPTS tries.
+BOOKING_OUTBOX = config('BOOKING_OUTBOX', default=False, cast=bool)
+BOOKING_OUTBOX_HANDLERS = config('BOOKING_OUTBOX_HANDLERS', default='core.outbox.log_events', cast=Csv())
+BOOKING_OUTBOX_BATCH_SIZE = config('BOOKING_OUTBOX_BATCH_SIZE', default=100, cast=int)
+BOOKING_OUTBOX_LEASE = config('BOOKING_OUTBOX_LEASE', default=60, cast=int)
+BOOKING_OUTBOX_RETRY_BASE = config('BOOKING_OUTBOX_RETRY_BASE', default=1.0, cast=float)
+BOOKING_OUTBOX_RETRY_MAX = config('BOOKING_OUTBOX_RETRY_MAX', default=300.0, cast=float)
+BOOKING_OUTBOX_MAX_ATTEMPTS = config('BOOKING_OUTBOX_MAX_ATTEMPTS', default=10, cast=int)
@@ -17,11 +17,35 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
-from core.views import BookingView
+from core.views import (
+    BookingView, BookingDetailView, BookingHoldView, BookingHoldDetailView, BookingHoldConfirmView, BulkBookingView,
+    GroupBookingView, AvailabilityView, HotelAvailabilityView, RoomAvailabilityView, BookingHistoryView,
+    RoomBookingsView, HotelBookingsView, HotelOccupancyView, HotelCalendarView, BookingExportView, AsyncBookingView,
+    AsyncRoomAvailabilityView, metrics_view,
+)
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('booking/', BookingView.as_view(), name='booking'),
+    path('booking/<int:booking_id>/', BookingDetailView.as_view(), name='booking-detail'),
+    path('booking/hold/', BookingHoldView.as_view(), name='booking-hold'),
+    path('booking/hold/<int:hold_id>/', BookingHoldDetailView.as_view(), name='booking-hold-detail'),
+    path('booking/hold/<int:hold_id>/confirm/', BookingHoldConfirmView.as_view(), name='booking-hold-confirm'),
+    path('booking/bulk/', BulkBookingView.as_view(), name='booking-bulk'),
+    path('booking/group/', GroupBookingView.as_view(), name='booking-group'),
+    path('bookings/', BookingHistoryView.as_view(), name='booking-history'),
+    path('bookings/export/', BookingExportView.as_view(), name='booking-export'),
+    path('rooms/<int:room_id>/bookings/', RoomBookingsView.as_view(), name='room-bookings'),
+    path('hotels/<int:hotel_id>/bookings/', HotelBookingsView.as_view(), name='hotel-bookings'),
+    path('rooms/<int:room_id>/availability/', RoomAvailabilityView.as_view(), name='room-availability'),
+    path('availability/', AvailabilityView.as_view(), name='availability'),
+    path('hotels/<int:hotel_id>/availability/', HotelAvailabilityView.as_view(), name='hotel-availability'),
+    path('hotels/<int:hotel_id>/calendar/', HotelCalendarView.as_view(), name='hotel-calendar'),
+    path('hotels/<int:hotel_id>/occupancy/', HotelOccupancyView.as_view(), name='hotel-occupancy'),
+    path('async/booking/', AsyncBookingView.as_view(), name='async-booking'),
+    path('async/rooms/<int:room_id>/availability/', AsyncRoomAvailabilityView.as_view(),
+         name='async-room-availability'),
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('metrics', metrics_view, name='metrics'),
 ]
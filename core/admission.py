@@ -0,0 +1,175 @@
+"""
+Per-worker admission control in front of booking creation: a per-user token
+bucket, and per room a bounded queue of requests waiting to write. Requests
+that would only pile up on the room's locks are turned away before they open
+a transaction. Cross-worker correctness still rests on the database.
+"""
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from . import metrics
+from .models import availability_cache
+
+
+class AdmissionRejected(Exception):
+    """
+    reason is "queue_full", "timeout" or "booked"; retry_after is in seconds.
+    """
+    def __init__(self, reason, retry_after=None):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Room:
+    __slots__ = ("active", "waiting", "released")
+
+    def __init__(self, lock):
+        self.active = 0
+        self.waiting = 0
+        self.released = threading.Condition(lock)
+
+
+class RoomQueues:
+    """
+    Lets at most `concurrency` requests per room write at once, and up to
+    `max_queue` more wait at most `max_wait` seconds for their turn.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rooms = {}
+
+    @contextmanager
+    def admit(self, room_id, concurrency, max_queue, max_wait):
+        with self._lock:
+            room = self._rooms.get(room_id)
+            if room is None:
+                room = self._rooms[room_id] = _Room(self._lock)
+            try:
+                if room.active >= concurrency:
+                    self._wait(room, concurrency, max_queue, max_wait)
+                room.active += 1
+            finally:
+                if not room.active and not room.waiting:
+                    del self._rooms[room_id]
+        try:
+            yield
+        finally:
+            with self._lock:
+                room.active -= 1
+                if room.waiting:
+                    room.released.notify()
+                elif not room.active:
+                    del self._rooms[room_id]
+
+    @staticmethod
+    def _wait(room, concurrency, max_queue, max_wait):
+        if room.waiting >= max_queue:
+            raise AdmissionRejected("queue_full", retry_after=max_wait)
+        deadline = time.monotonic() + max_wait
+        room.waiting += 1
+        try:
+            while room.active >= concurrency:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise AdmissionRejected("timeout", retry_after=max_wait)
+                room.released.wait(remaining)
+        finally:
+            room.waiting -= 1
+
+    def depth(self):
+        with self._lock:
+            return sum(room.waiting for room in self._rooms.values())
+
+    def busy_rooms(self):
+        with self._lock:
+            return len(self._rooms)
+
+
+class TokenBuckets:
+    """
+    One token bucket per key, refilled at `rate` tokens per second up to
+    `burst`, for the max_keys most recently seen keys.
+    """
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst, cost=1):
+        """
+        0 when `cost` tokens were taken, otherwise the seconds until they are
+        available. A cost above `burst` is let through on a full bucket and
+        leaves it in debt.
+        """
+        current = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (burst, current))
+            tokens = min(burst, tokens + (current - updated) * rate)
+            needed = min(cost, burst)
+            wait = 0.0 if tokens >= needed else (needed - tokens) / rate
+            self._buckets[key] = (tokens - cost if not wait else tokens, current)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+room_queues = RoomQueues()
+user_buckets = TokenBuckets()
+
+metrics.registry.register(metrics.CallbackGauge(
+    "booking_admission_queue_depth", "Booking requests waiting for a room's writing slot.", room_queues.depth,
+))
+metrics.registry.register(metrics.CallbackGauge(
+    "booking_admission_busy_rooms", "Rooms with booking requests writing or waiting.", room_queues.busy_rooms,
+))
+
+
+def throttle_user(user_id, bookings=1):
+    """
+    Seconds the user has to wait before making `bookings` more, or 0.
+    """
+    if not settings.BOOKING_ADMISSION or not settings.BOOKING_USER_RATE:
+        return 0
+    wait = user_buckets.take(user_id, settings.BOOKING_USER_RATE, settings.BOOKING_USER_BURST, bookings)
+    if wait:
+        metrics.admission_rejections.inc(reason="rate_limited")
+    return wait
+
+
+@contextmanager
+def admit(room_id, start_at, end_at):
+    """
+    Run the block once the room has a free writing slot. Raises
+    AdmissionRejected when the queue is full, the wait exceeds
+    BOOKING_ADMISSION_MAX_WAIT_MS, or the availability cache already knows
+    the slot is taken, before and again after waiting.
+    """
+    if not settings.BOOKING_ADMISSION:
+        yield
+        return
+
+    def check_booked():
+        if settings.BOOKING_AVAILABILITY_CACHE and availability_cache.is_available(room_id, start_at, end_at) is False:
+            metrics.admission_rejections.inc(reason="booked")
+            raise AdmissionRejected("booked")
+
+    check_booked()
+    started = time.perf_counter()
+    try:
+        with room_queues.admit(
+            room_id, settings.BOOKING_ADMISSION_CONCURRENCY, settings.BOOKING_ADMISSION_QUEUE,
+            settings.BOOKING_ADMISSION_MAX_WAIT_MS / 1000,
+        ):
+            metrics.admission_wait.observe(time.perf_counter() - started)
+            # Whoever held the slot may just have taken the interval
+            check_booked()
+            yield
+    except AdmissionRejected as e:
+        if e.reason in ("queue_full", "timeout"):
+            metrics.admission_rejections.inc(reason=e.reason)
+        raise
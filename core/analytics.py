@@ -0,0 +1,152 @@
+import datetime
+import math
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db.backends.postgresql.psycopg_any import DateTimeTZRange
+from django.db.models import BigIntegerField
+from django.db.models.functions import Cast, Extract
+
+from .models import ArchivedBooking, Booking, Room
+
+
+GRANULARITIES = {"hour": 3600, "day": 86400}
+# A bit over a year of hourly buckets
+MAX_BUCKETS = 9000
+# Per-room matrices are returned as JSON, so keep them to a sane size
+MAX_MATRIX_CELLS = 1000000
+HISTOGRAM_BINS = 10
+CACHE_KEY = "booking:occupancy:{}:{}:{}:{}:{}"
+
+
+def _isoformat(epoch):
+    return datetime.datetime.fromtimestamp(epoch, datetime.timezone.utc).isoformat()
+
+
+def bucket_window(start_at, end_at, granularity):
+    """
+    (start, end, buckets) with start floored and end ceiled to whole UTC
+    buckets, start and end as epoch seconds.
+    """
+    step = GRANULARITIES[granularity]
+    start = int(start_at.timestamp()) // step * step
+    end = -(-math.ceil(end_at.timestamp()) // step) * step
+    return start, end, (end - start) // step
+
+
+def occupancy_matrix(intervals, room_ids, start, step, buckets):
+    """
+    Share of every bucket each room is booked, as a (rooms, buckets) array.
+
+    intervals is an (n, 3) int64 array of (room_id, start, end) epoch seconds
+    and room_ids the sorted ids the rows follow. Bookings of one room never
+    overlap, so every cell lies in [0, 1].
+    """
+    seconds = np.zeros((len(room_ids), buckets), dtype=np.int64)
+    if not len(intervals) or not len(room_ids) or not buckets:
+        return seconds.astype(np.float64)
+
+    end = start + step * buckets
+    # Rooms moved to another hotel between the two queries are skipped
+    rows = np.minimum(np.searchsorted(room_ids, intervals[:, 0]), len(room_ids) - 1)
+    lo = np.clip(intervals[:, 1], start, end) - start
+    hi = np.clip(intervals[:, 2], start, end) - start
+    keep = (hi > lo) & (room_ids[rows] == intervals[:, 0])
+    rows, lo, hi = rows[keep], lo[keep], hi[keep]
+
+    first = lo // step
+    last = (hi - 1) // step
+
+    # Bookings inside a single bucket
+    single = first == last
+    np.add.at(seconds, (rows[single], first[single]), hi[single] - lo[single])
+
+    # Partial first and last buckets, then every bucket in between through a
+    # difference array, so each booking costs O(1) whatever its length
+    rows, lo, hi, first, last = (a[~single] for a in (rows, lo, hi, first, last))
+    np.add.at(seconds, (rows, first), (first + 1) * step - lo)
+    np.add.at(seconds, (rows, last), hi - last * step)
+    full = np.zeros_like(seconds)
+    np.add.at(full, (rows, first + 1), step)
+    np.add.at(full, (rows, last), -step)
+    seconds += np.cumsum(full, axis=1)
+
+    return seconds / step
+
+
+def load_intervals(hotel_id, start, end):
+    """
+    The hotel's confirmed live and archived bookings overlapping [start, end) as an
+    (n, 3) int64 array.
+    """
+    utc = datetime.timezone.utc
+    start_at, end_at = datetime.datetime.fromtimestamp(start, utc), datetime.datetime.fromtimestamp(end, utc)
+    epochs = {
+        "start_epoch": Cast(Extract('start_at', 'epoch', tzinfo=utc), BigIntegerField()),
+        "end_epoch": Cast(Extract('end_at', 'epoch', tzinfo=utc), BigIntegerField()),
+    }
+    live = Booking.objects.confirmed().filter(room__hotel_id=hotel_id, period__overlap=DateTimeTZRange(start_at, end_at))
+    archived = ArchivedBooking.objects.filter(room__hotel_id=hotel_id, start_at__lt=end_at, end_at__gt=start_at)
+    bookings = live.annotate(**epochs).values_list('room_id', 'start_epoch', 'end_epoch').union(
+        archived.annotate(**epochs).values_list('room_id', 'start_epoch', 'end_epoch'), all=True
+    )
+    return np.array(list(bookings), dtype=np.int64).reshape(-1, 3)
+
+
+def hotel_occupancy(hotel_id, start_at, end_at, granularity="day", include_matrix=False):
+    """
+    Occupancy of a hotel's rooms over [start_at, end_at) per hour or day:
+    the hotel-wide share per bucket, each room's share of the whole window
+    and a histogram of those shares. Results are cached for
+    BOOKING_ANALYTICS_CACHE_TTL seconds.
+    """
+    step = GRANULARITIES[granularity]
+    start, end, buckets = bucket_window(start_at, end_at, granularity)
+
+    key = CACHE_KEY.format(hotel_id, granularity, start, end, int(include_matrix))
+    ttl = settings.BOOKING_ANALYTICS_CACHE_TTL
+    if ttl:
+        result = cache.get(key)
+        if result is not None:
+            return result
+
+    room_ids = np.fromiter(
+        Room.objects.filter(hotel_id=hotel_id).order_by('id').values_list('id', flat=True), dtype=np.int64
+    )
+    if include_matrix and len(room_ids) * buckets > MAX_MATRIX_CELLS:
+        raise ValidationError("Too many rooms and buckets for a matrix, use a shorter window or day granularity.")
+
+    matrix = occupancy_matrix(load_intervals(hotel_id, start, end), room_ids, start, step, buckets)
+
+    by_bucket = matrix.mean(axis=0) if len(room_ids) else np.zeros(buckets)
+    by_room = matrix.mean(axis=1) if buckets else np.zeros(len(room_ids))
+    counts, edges = np.histogram(by_room, bins=HISTOGRAM_BINS, range=(0.0, 1.0))
+    bucket_starts = start + step * np.arange(buckets)
+
+    result = {
+        "hotel": hotel_id,
+        "granularity": granularity,
+        "start": _isoformat(start),
+        "end": _isoformat(end),
+        "rooms": len(room_ids),
+        "occupancy": round(float(by_bucket.mean()), 4) if buckets else 0.0,
+        "buckets": [
+            {"start": _isoformat(int(t)), "occupancy": round(float(v), 4)}
+            for t, v in zip(bucket_starts, by_bucket)
+        ],
+        "histogram": {
+            "edges": [round(float(e), 2) for e in edges],
+            "rooms": counts.tolist(),
+        },
+    }
+    if include_matrix:
+        result["matrix"] = {
+            "room_ids": room_ids.tolist(),
+            "rows": np.round(matrix, 4).tolist(),
+        }
+
+    if ttl:
+        cache.set(key, result, ttl)
+    return result
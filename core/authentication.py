@@ -0,0 +1,135 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication, JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+
+class UserCache:
+    """
+    Bounded LRU of users resolved from access tokens, keyed by (user id, token id).
+    An entry lives for at most max_age seconds and never past its token's expiry.
+    """
+    def __init__(self, max_entries=10000, max_age=60):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            user, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        # A private copy, so no two requests share one instance
+        return copy.copy(user)
+
+    def set(self, key, user, token_expires_at):
+        expires_at = min(time.time() + self.max_age, token_expires_at)
+        with self._lock:
+            self._entries[key] = (copy.copy(user), expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == user_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache(settings.JWT_USER_CACHE_SIZE, settings.JWT_USER_CACHE_TTL)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that resolves users through user_cache instead of a
+    SELECT per request. Saving or deleting a user drops their entries in this
+    worker; other workers notice within JWT_USER_CACHE_TTL seconds.
+
+    With JWT_STATELESS_READS, safe (read-only) requests trust the token claims
+    and get a TokenUser without touching the database at all, unless the view
+    sets stateless_reads = False.
+    """
+    stateless = False
+
+    def authenticate(self, request):
+        view = (request.parser_context or {}).get('view')
+        self.stateless = (
+            settings.JWT_STATELESS_READS
+            and request.method in SAFE_METHODS
+            and getattr(view, 'stateless_reads', True)
+        )
+        return super().authenticate(request)
+
+    def get_user(self, validated_token):
+        if self.stateless:
+            return JWTStatelessUserAuthentication.get_user(self, validated_token)
+
+        key = (validated_token.get(api_settings.USER_ID_CLAIM), validated_token.get(api_settings.JTI_CLAIM))
+        user = user_cache.get(key)
+        if user is None:
+            # Runs the usual lookup plus the is_active and revocation checks
+            user = super().get_user(validated_token)
+            user_cache.set(key, user, validated_token["exp"])
+        return user
+
+
+class AsyncJWTAuthentication(CachedJWTAuthentication):
+    """
+    CachedJWTAuthentication for plain async views. The token is checked in
+    the event loop; only a user cache miss reads the database, through the
+    async ORM. Raises AuthenticationFailed (or InvalidToken) like the sync one.
+    """
+    async def aauthenticate(self, request):
+        self.stateless = settings.JWT_STATELESS_READS and request.method in SAFE_METHODS
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        if self.stateless:
+            return JWTStatelessUserAuthentication.get_user(self, validated_token)
+
+        key = (validated_token.get(api_settings.USER_ID_CLAIM), validated_token.get(api_settings.JTI_CLAIM))
+        user = user_cache.get(key)
+        if user is not None:
+            return user
+
+        # The checks of JWTAuthentication.get_user, with an awaited lookup
+        if key[0] is None:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+        try:
+            user = await self.user_model.objects.aget(**{api_settings.USER_ID_FIELD: key[0]})
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN and (
+            validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password)
+        ):
+            raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        user_cache.set(key, user, validated_token["exp"])
+        return user
@@ -0,0 +1,123 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django.utils.timezone import now
+
+
+def overlaps_any(intervals, start_at, end_at):
+    """
+    Whether [start_at, end_at) intersects any of the sorted, mutually
+    non-overlapping (start, end) intervals.
+    """
+    # Only the last interval starting before end_at can reach past start_at
+    index = bisect_left(intervals, (end_at,))
+    return index > 0 and intervals[index - 1][1] > start_at
+
+
+class _Entry:
+    __slots__ = ("intervals", "version", "checked_at")
+
+    def __init__(self, intervals, version):
+        self.intervals = intervals
+        self.version = version
+        self.checked_at = time.monotonic()
+
+
+class RoomIntervalCache:
+    """
+    Per-worker LRU cache of each room's future booking intervals, kept as a
+    sorted list of non-overlapping (start_at, end_at) tuples.
+
+    Entries are dropped when a booking of the room is committed in this worker.
+    Other workers bump a per-room version stamp in Django's cache, which every
+    entry re-checks once it is older than max_staleness seconds, so with a
+    shared CACHES backend cross-worker staleness is bounded by max_staleness.
+
+    Only read-only checks use it; writes always go through the database.
+    """
+    VERSION_KEY = "booking:room-version:{}"
+
+    def __init__(self, load_intervals, max_rooms=10000, max_staleness=2.0):
+        self.load_intervals = load_intervals
+        self.max_rooms = max_rooms
+        self.max_staleness = max_staleness
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def is_available(self, room_id, start_at, end_at):
+        """
+        Answer from memory, or return None for ranges starting in the past,
+        which only the database knows about.
+        """
+        current = now()
+        if start_at < current:
+            return None
+
+        entry = self._get(room_id)
+        if entry is not None and self._is_fresh(entry, room_id):
+            self._count("hits")
+        else:
+            self._count("misses")
+            entry = self._load(room_id, current)
+        return not overlaps_any(entry.intervals, start_at, end_at)
+
+    def invalidate(self, *room_ids):
+        for room_id in room_ids:
+            with self._lock:
+                self._entries.pop(room_id, None)
+            key = self.VERSION_KEY.format(room_id)
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, 1, timeout=None)
+            self._count("invalidations")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _get(self, room_id):
+        with self._lock:
+            entry = self._entries.get(room_id)
+            if entry is not None:
+                self._entries.move_to_end(room_id)
+            return entry
+
+    def _is_fresh(self, entry, room_id):
+        if time.monotonic() - entry.checked_at <= self.max_staleness:
+            return True
+        if cache.get(self.VERSION_KEY.format(room_id), 0) != entry.version:
+            return False
+        entry.checked_at = time.monotonic()
+        return True
+
+    def _load(self, room_id, horizon):
+        # Read the version first, so a write racing with the load makes the entry stale
+        version = cache.get(self.VERSION_KEY.format(room_id), 0)
+        # Bookings ending before the horizon can never matter to later checks
+        entry = _Entry(self.load_intervals(room_id, horizon), version)
+        with self._lock:
+            self._entries[room_id] = entry
+            self._entries.move_to_end(room_id)
+            while len(self._entries) > self.max_rooms:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return entry
@@ -0,0 +1,92 @@
+"""
+Per-room, per-month occupancy bitmaps behind the hotel calendar. Bit i of a
+month's bitmap is set when a booking overlaps the month's i-th slot of
+BOOKING_CALENDAR_SLOT_MINUTES; months are UTC calendar months.
+"""
+import datetime
+from bisect import bisect_left
+
+import numpy as np
+
+# Longest range one calendar request may span
+MAX_CALENDAR_DAYS = 400
+
+
+def next_month(month):
+    return month.replace(year=month.year + month.month // 12, month=month.month % 12 + 1)
+
+
+def month_starts(start_at, end_at):
+    """
+    The first instants of the UTC calendar months that [start_at, end_at) overlaps.
+    """
+    start_at = start_at.astimezone(datetime.timezone.utc)
+    month = datetime.datetime(start_at.year, start_at.month, 1, tzinfo=datetime.timezone.utc)
+    months = []
+    while month < end_at:
+        months.append(month)
+        month = next_month(month)
+    return months
+
+
+def month_slots(month, slot_seconds):
+    return int((next_month(month) - month).total_seconds()) // slot_seconds
+
+
+def room_bitmaps(months, slot_seconds, intervals):
+    """
+    Packed bitmaps of one room for the given sorted months, from its (start,
+    end) booking intervals in epoch seconds, computed over the months' whole
+    span at once. Intervals outside the months leave them untouched.
+    """
+    if not intervals:
+        return [bytes(-(-month_slots(month, slot_seconds) // 8)) for month in months]
+    origin = int(months[0].timestamp())
+    total = (int(next_month(months[-1]).timestamp()) - origin) // slot_seconds
+    starts, ends = np.array(intervals, dtype=np.int64).reshape(-1, 2).T
+    first = np.clip((starts - origin) // slot_seconds, 0, total)
+    last = np.clip(-((origin - ends) // slot_seconds), 0, total)
+    # +1 where an interval starts covering slots, -1 where it stops
+    change = np.zeros(total + 1, dtype=np.int32)
+    np.add.at(change, first, 1)
+    np.add.at(change, last, -1)
+    taken = np.cumsum(change[:-1]) > 0
+
+    bitmaps = []
+    for month in months:
+        offset = (int(month.timestamp()) - origin) // slot_seconds
+        bitmaps.append(np.packbits(taken[offset:offset + month_slots(month, slot_seconds)]).tobytes())
+    return bitmaps
+
+
+def occupancy_matrix(room_ids, months, slot_seconds, bitmaps):
+    """
+    Stack (room_id, month, bitmap) rows into a boolean matrix with one row
+    per sorted room id and the months' slots back to back. Room-months
+    without a bitmap have no bookings, and bitmaps of rooms missing from
+    room_ids (e.g. added since they were listed) are ignored.
+    """
+    spans, total = {}, 0
+    for month in months:
+        size = month_slots(month, slot_seconds)
+        spans[month.date()] = (total, size)
+        total += size
+    occupied = np.zeros((len(room_ids), total), dtype=bool)
+    for room_id, month, bitmap in bitmaps:
+        row = bisect_left(room_ids, room_id)
+        if row == len(room_ids) or room_ids[row] != room_id:
+            continue
+        offset, size = spans[month]
+        occupied[row, offset:offset + size] = np.unpackbits(
+            np.frombuffer(bitmap, dtype=np.uint8), count=size
+        )
+    return occupied
+
+
+def slot_strings(free):
+    """
+    One string per matrix row with '1' for free and '0' for taken slots.
+    """
+    text = (free.astype(np.uint8) + ord("0")).tobytes().decode("ascii")
+    width = free.shape[1]
+    return [text[index * width:(index + 1) * width] for index in range(free.shape[0])]
@@ -0,0 +1,86 @@
+import csv
+import io
+import json
+import zlib
+from itertools import chain, islice
+
+from .models import ArchivedBooking, Booking
+
+FORMATS = ("csv", "ndjson")
+COLUMNS = (
+    "id", "user_id", "username", "room_id", "room_number", "hotel_id", "hotel_name", "start_at", "end_at", "archived",
+)
+# Relations are joined in SQL; rows come back as plain tuples in this order
+FIELDS = (
+    "id", "user_id", "user__username", "room_id", "room__room_number", "room__hotel_id", "room__hotel__name",
+    "start_at", "end_at",
+)
+CHUNK_SIZE = 2000
+
+
+def export_rows(hotel_id=None, start=None, end=None, chunk_size=CHUNK_SIZE):
+    """
+    Confirmed live, then archived bookings as tuples in COLUMNS order, read
+    through server-side cursors chunk_size rows at a time. start and end keep the
+    bookings overlapping [start, end).
+    """
+    filters = {}
+    if hotel_id is not None:
+        filters["room__hotel_id"] = hotel_id
+    if start is not None:
+        filters["end_at__gt"] = start
+    if end is not None:
+        filters["start_at__lt"] = end
+
+    return chain.from_iterable(
+        (row + (archived,) for row in queryset.filter(**filters).order_by("id").values_list(*FIELDS)
+         .iterator(chunk_size=chunk_size))
+        for queryset, archived in ((Booking.objects.confirmed(), False), (ArchivedBooking.objects.all(), True))
+    )
+
+
+def csv_chunks(rows, chunk_size=CHUNK_SIZE):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    while True:
+        batch = list(islice(rows, chunk_size))
+        writer.writerows(
+            row[:7] + (row[7].isoformat(), row[8].isoformat(), int(row[9])) for row in batch
+        )
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+        if len(batch) < chunk_size:
+            return
+
+
+def ndjson_chunks(rows, chunk_size=CHUNK_SIZE):
+    while True:
+        batch = list(islice(rows, chunk_size))
+        if batch:
+            yield "".join(
+                json.dumps(dict(zip(COLUMNS, row)), default=lambda value: value.isoformat()) + "\n"
+                for row in batch
+            ).encode()
+        if len(batch) < chunk_size:
+            return
+
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(wbits=31)  # gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_bookings(output="csv", compress=False, chunk_size=CHUNK_SIZE, **filters):
+    """
+    The export as an iterator of byte strings; memory use is bounded by
+    chunk_size whatever the number of bookings.
+    """
+    rows = export_rows(chunk_size=chunk_size, **filters)
+    chunks = (csv_chunks if output == "csv" else ndjson_chunks)(rows, chunk_size)
+    return gzip_chunks(chunks) if compress else chunks
@@ -0,0 +1,95 @@
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction, OperationalError
+from django.utils.timezone import now
+from rest_framework.response import Response
+
+from . import metrics
+from .locks import is_lock_timeout
+from .models import IdempotencyKey
+from .responses import bad_request_response, conflict_response, unprocessable_entity_response
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = IdempotencyKey._meta.get_field("key").max_length
+
+
+def fingerprint(data):
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def is_transient(response):
+    """
+    Responses worth retrying (busy room, server errors) are not stored.
+    """
+    return response.status_code == 409 or response.status_code >= 500
+
+
+def idempotent(request, key, handler, admission=None):
+    """
+    Run handler() once per (user, key) and replay its response to retries.
+
+    A finished request is replayed straight away. Otherwise admission, when
+    given, is called with the rest of the work and runs it once the request
+    may write, so that waiting for admission holds no transaction. The key
+    is claimed in the transaction that runs the handler, so a concurrent
+    duplicate blocks on the key's unique index, for at most
+    BOOKING_IDEMPOTENCY_WAIT_MS, instead of racing for the room, and then
+    replays the first response.
+    """
+    if len(key) > MAX_KEY_LENGTH:
+        return bad_request_response(f"{HEADER} must be at most {MAX_KEY_LENGTH} characters.")
+
+    digest = fingerprint(request.data)
+    stored = IdempotencyKey.objects.filter(user_id=request.user.id, key=key, expires_at__gt=now()).first()
+    if stored is not None:
+        return replay(stored, digest)
+    if admission is None:
+        return run_once(request, key, digest, handler)
+    return admission(lambda: run_once(request, key, digest, handler))
+
+
+def run_once(request, key, digest, handler):
+    with transaction.atomic():
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT current_setting('lock_timeout'), set_config('lock_timeout', %s, true)",
+                    [f"{settings.BOOKING_IDEMPOTENCY_WAIT_MS}ms"],
+                )
+                lock_timeout = cursor.fetchone()[0]
+            claimed = IdempotencyKey.claim(
+                request.user.id, key, digest, now() + timedelta(seconds=settings.BOOKING_IDEMPOTENCY_TTL)
+            )
+        except OperationalError as e:
+            if not is_lock_timeout(e):
+                raise
+            transaction.set_rollback(True)
+            metrics.idempotent_requests.inc(outcome="in_progress")
+            return conflict_response(f"A request with this {HEADER} is still in progress.")
+
+        if claimed is None:
+            return replay(IdempotencyKey.objects.get(user_id=request.user.id, key=key), digest)
+
+        # The handler's own lock waits follow the usual settings again
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT set_config('lock_timeout', %s, true)", [lock_timeout])
+        response = handler()
+        if is_transient(response):
+            # Forget the key so that a retry runs the request again
+            transaction.set_rollback(True)
+        else:
+            IdempotencyKey.objects.filter(pk=claimed).update(status_code=response.status_code, response=response.data)
+        metrics.idempotent_requests.inc(outcome="executed")
+        return response
+
+
+def replay(stored, digest):
+    if stored.fingerprint != digest:
+        metrics.idempotent_requests.inc(outcome="mismatch")
+        return unprocessable_entity_response(f"This {HEADER} was already used for a different request.")
+
+    metrics.idempotent_requests.inc(outcome="replayed")
+    return Response(stored.response, status=stored.status_code, headers={"Idempotent-Replayed": "true"})
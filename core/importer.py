@@ -0,0 +1,271 @@
+import csv
+import io
+import json
+from datetime import datetime, timezone
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction, IntegrityError, OperationalError
+
+from .models import Booking, Hotel, Room, RoomAvailability, availability_cache
+
+FORMATS = ("jsonl", "csv")
+COLUMNS = ("type", "key", "name", "location", "hotel", "room_number", "user", "start_at", "end_at")
+# (room_id << ROOM_SHIFT) + epoch seconds orders intervals by room, then time
+ROOM_SHIFT = 34
+
+
+def read_records(stream, file_format):
+    """
+    (line number, record dict or None) for every data line of a JSONL or CSV
+    stream; None marks a line that could not be parsed.
+    """
+    if file_format == "csv":
+        for line, record in enumerate(csv.DictReader(stream), start=2):
+            yield line, record
+        return
+
+    for line, text in enumerate(stream, start=1):
+        if not text.strip():
+            continue
+        try:
+            record = json.loads(text)
+        except ValueError:
+            record = None
+        yield line, record if isinstance(record, dict) else None
+
+
+def _text(records, field):
+    return np.array([str(record.get(field) or "").strip() for record in records], dtype=str)
+
+
+def _epoch(value):
+    try:
+        parsed = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return -1
+    # Naive datetimes are taken as UTC, like TIME_ZONE
+    return int((parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)).timestamp())
+
+
+def _first_error(checks, size):
+    """
+    Per row, the message of the first failing (ok mask, message) check, or "".
+    """
+    errors = np.full(size, "", dtype=object)
+    for ok, message in reversed(checks):
+        errors[~ok] = message
+    return errors
+
+
+class InventoryImporter:
+    """
+    Validates and inserts hotel, room and booking records batch by batch.
+
+    Every record has a `type`. Hotels carry a file-wide `key` that rooms
+    reference through `hotel`; bookings name their room by `hotel` key and
+    `room_number` and their guest by `user` (a username). The key to hotel id
+    map and the number of records done live in an ImportRun, saved in the
+    batch's transaction, so a rerun resumes after the last committed batch.
+    """
+    def __init__(self, run, rejects=None):
+        self.run = run
+        self.rejects = rejects
+        self.counts = {"hotel": 0, "room": 0, "booking": 0, "rejected": 0}
+        # Rejects of the batch being imported, written once it committed
+        self.pending_rejects = []
+
+    def import_batch(self, batch):
+        self.pending_rejects = []
+        with transaction.atomic():
+            by_type = {"hotel": [], "room": [], "booking": []}
+            for line, record in batch:
+                if record is None:
+                    self.reject(line, record, "Unreadable record.")
+                elif record.get("type") not in by_type:
+                    self.reject(line, record, "Unknown record type.")
+                else:
+                    by_type[record["type"]].append((line, record))
+
+            # Rooms may reference hotels, and bookings rooms, of the same batch
+            self.import_hotels(by_type["hotel"])
+            self.import_rooms(by_type["room"])
+            self.import_bookings(by_type["booking"])
+
+            self.run.position += len(batch)
+            self.run.save()
+
+        # A batch that rolled back, e.g. in a crash, is redone by the resume
+        # and must not leave its rejects behind twice
+        self.counts["rejected"] += len(self.pending_rejects)
+        if self.rejects is not None and self.pending_rejects:
+            self.rejects.writelines(self.pending_rejects)
+            self.rejects.flush()
+
+    def reject(self, line, record, error):
+        self.pending_rejects.append(json.dumps({"line": line, "error": error, "record": record}) + "\n")
+
+    def reject_rows(self, rows, errors):
+        for (line, record), error in zip(rows, errors):
+            if error:
+                self.reject(line, record, error)
+
+    def import_hotels(self, rows):
+        if not rows:
+            return
+        records = [record for _, record in rows]
+        keys, names, locations = _text(records, "key"), _text(records, "name"), _text(records, "location")
+        _, first = np.unique(keys, return_index=True)
+        unique = np.zeros(len(rows), dtype=bool)
+        unique[first] = True
+        known = np.array([key in self.run.hotel_keys for key in keys], dtype=bool)
+
+        errors = _first_error([
+            (np.char.str_len(keys) > 0, "Hotel key is required."),
+            (unique & ~known, "Duplicate hotel key."),
+            # Hotel.clean, plus the column lengths
+            (np.char.str_len(names) >= 3, "Hotel name must be at least 3 characters long."),
+            (np.char.str_len(names) <= Hotel._meta.get_field("name").max_length, "Hotel name is too long."),
+            (np.char.str_len(locations) > 0, "Hotel location is required."),
+            (np.char.str_len(locations) <= Hotel._meta.get_field("location").max_length, "Hotel location is too long."),
+        ], len(rows))
+        self.reject_rows(rows, errors)
+
+        valid = np.flatnonzero(errors == "")
+        hotels = Hotel.objects.bulk_create(
+            [Hotel(name=str(names[i]), location=str(locations[i])) for i in valid], batch_size=1000
+        )
+        self.run.hotel_keys.update((str(keys[i]), hotel.id) for i, hotel in zip(valid, hotels))
+        self.counts["hotel"] += len(hotels)
+
+    def import_rooms(self, rows):
+        if not rows:
+            return
+        records = [record for _, record in rows]
+        numbers = _text(records, "room_number")
+        hotel_ids = np.array([self.run.hotel_keys.get(key, 0) for key in _text(records, "hotel")], dtype=np.int64)
+
+        errors = _first_error([
+            (hotel_ids > 0, "Unknown hotel key."),
+            # Room.clean, plus the column length
+            (np.char.isdigit(numbers), "Room number must be numeric."),
+            (np.char.str_len(numbers) <= Room._meta.get_field("room_number").max_length, "Room number is too long."),
+        ], len(rows))
+        self.reject_rows(rows, errors)
+
+        valid = np.flatnonzero(errors == "")
+        rooms = Room.objects.bulk_create(
+            [Room(hotel_id=int(hotel_ids[i]), room_number=str(numbers[i])) for i in valid], batch_size=1000
+        )
+        self.counts["room"] += len(rooms)
+
+    def import_bookings(self, rows):
+        if not rows:
+            return
+        records = [record for _, record in rows]
+        hotel_ids = np.array([self.run.hotel_keys.get(key, 0) for key in _text(records, "hotel")], dtype=np.int64)
+        numbers, usernames = _text(records, "room_number"), _text(records, "user")
+        starts = np.array([_epoch(record.get("start_at")) for record in records], dtype=np.int64)
+        ends = np.array([_epoch(record.get("end_at")) for record in records], dtype=np.int64)
+
+        # One query each for the rooms and the users the batch names; the
+        # oldest room wins if a hotel repeats a room number
+        rooms = {}
+        for room_id, hotel_id, number in (Room.objects.filter(hotel_id__in=set(hotel_ids.tolist()))
+                                          .order_by("-id").values_list("id", "hotel_id", "room_number")):
+            rooms[hotel_id, number] = room_id
+        users = dict(get_user_model().objects.filter(username__in=set(usernames.tolist()))
+                     .values_list("username", "id"))
+        room_ids = np.array([rooms.get((int(h), n), 0) for h, n in zip(hotel_ids, numbers)], dtype=np.int64)
+        user_ids = np.array([users.get(name, 0) for name in usernames], dtype=np.int64)
+
+        checks = [
+            (room_ids > 0, "Unknown room."),
+            (user_ids > 0, "Unknown user."),
+            ((starts >= 0) & (ends >= 0), "Start and end dates must be ISO 8601 datetimes."),
+            (starts < ends, "Start date must be before the end date."),
+        ]
+        errors = _first_error(checks, len(rows))
+        candidates = np.flatnonzero(errors == "")
+
+        # Overlaps with earlier rows of the file for the same room: sorted by
+        # (room, start), a row overlaps if it starts before the running maximum
+        # of the previous rows' ends
+        order = candidates[np.lexsort((starts[candidates], room_ids[candidates]))]
+        start_keys = (room_ids[order] << ROOM_SHIFT) + starts[order]
+        end_keys = (room_ids[order] << ROOM_SHIFT) + ends[order]
+        previous_end = np.concatenate(([np.iinfo(np.int64).min], np.maximum.accumulate(end_keys)[:-1]))
+        errors[order[start_keys < previous_end]] = "Overlaps another booking of the file."
+
+        accepted = np.sort(order[start_keys >= previous_end])
+        while True:
+            booked = self.existing_overlaps(room_ids[accepted], starts[accepted], ends[accepted])
+            errors[accepted[booked]] = "Room is already booked for the given dates."
+            accepted = accepted[~booked]
+            try:
+                with transaction.atomic():
+                    self.copy_bookings(user_ids[accepted], room_ids[accepted], starts[accepted], ends[accepted])
+                break
+            except (IntegrityError, OperationalError) as e:
+                # A live booking took one of the slots after the check
+                if not Booking.is_overlap_violation(e):
+                    raise
+        self.reject_rows(rows, errors)
+
+        if settings.BOOKING_AVAILABILITY_CACHE and len(accepted):
+            booked_rooms = set(room_ids[accepted].tolist())
+            transaction.on_commit(lambda: availability_cache.invalidate(*booked_rooms))
+        if settings.BOOKING_CALENDAR:
+            RoomAvailability.refresh_on_commit(
+                (room_id, datetime.fromtimestamp(start, timezone.utc), datetime.fromtimestamp(end, timezone.utc))
+                for room_id, start, end in zip(
+                    room_ids[accepted].tolist(), starts[accepted].tolist(), ends[accepted].tolist()
+                )
+            )
+        self.counts["booking"] += len(accepted)
+
+    @staticmethod
+    def copy_bookings(user_ids, room_ids, starts, ends):
+        """
+        Insert the bookings with COPY, skipping model instances and INSERT
+        compilation. The overlap constraint still checks every row.
+        """
+        if not len(user_ids):
+            return
+        starts, ends = (
+            np.datetime_as_string(epochs.astype("datetime64[s]"), timezone="UTC") for epochs in (starts, ends)
+        )
+        rows = io.StringIO("".join(
+            f"{user_id}\t{room_id}\t{start_at}\t{end_at}\n"
+            for user_id, room_id, start_at, end_at in zip(user_ids.tolist(), room_ids.tolist(), starts, ends)
+        ))
+        with connection.cursor() as cursor, connection.wrap_database_errors:
+            cursor.copy_expert(
+                f"COPY {Booking._meta.db_table} (user_id, room_id, start_at, end_at) FROM STDIN", rows
+            )
+
+    @staticmethod
+    def existing_overlaps(room_ids, starts, ends):
+        """
+        Mask of the intervals overlapping a booking already in the database,
+        found with one join against the bookings' GiST index.
+        """
+        if not len(room_ids):
+            return np.zeros(0, dtype=bool)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT DISTINCT candidate.index
+                FROM unnest(%s::bigint[], %s::bigint[], %s::bigint[]) WITH ORDINALITY
+                    AS candidate(room_id, start_epoch, end_epoch, index)
+                JOIN {Booking._meta.db_table} booking
+                    ON booking.room_id = candidate.room_id
+                    AND booking.period && tstzrange(to_timestamp(candidate.start_epoch), to_timestamp(candidate.end_epoch))
+                """,
+                [room_ids.tolist(), starts.tolist(), ends.tolist()],
+            )
+            overlapping = np.array([index - 1 for index, in cursor.fetchall()], dtype=np.int64)
+        booked = np.zeros(len(room_ids), dtype=bool)
+        booked[overlapping] = True
+        return booked
@@ -0,0 +1,174 @@
+from contextlib import contextmanager, nullcontext
+from time import perf_counter
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction, connection, OperationalError
+
+from . import metrics
+
+# First key of the two-key advisory lock form, so room locks do not collide
+# with other users of advisory locks. The second key is the room id, which
+# has to fit an int4.
+ROOM_LOCK_NAMESPACE = 0x626B
+MAX_INT4 = 2**31 - 1
+
+
+class RoomBusy(Exception):
+    """
+    The room lock could not be acquired within BOOKING_LOCK_TIMEOUT_MS.
+    """
+
+
+def savepoint_if_nested():
+    """
+    A savepoint when already inside a transaction, so that a constraint violation
+    leaves it usable. Outside one a single statement is atomic by itself.
+    """
+    if transaction.get_connection().in_atomic_block:
+        return transaction.atomic()
+    return nullcontext()
+
+
+def is_lock_timeout(error):
+    """
+    Whether an OperationalError was raised by lock_timeout or NOWAIT.
+    """
+    diag = getattr(error.__cause__, "diag", None)
+    return getattr(diag, "sqlstate", None) == "55P03"
+
+
+class LockStrategy:
+    """
+    Serializes writers of the same rooms until the current transaction ends.
+    Rooms are always locked in ascending id order so that writers locking
+    several rooms cannot deadlock.
+    """
+    name = None
+
+    def acquire(self, cursor, room_ids, nowait):
+        raise NotImplementedError
+
+
+class AdvisoryLockStrategy(LockStrategy):
+    """
+    Transaction-scoped PostgreSQL advisory locks keyed on the room id.
+    Nothing is written, and the lock is taken even when no booking exists yet.
+    """
+    name = "advisory"
+
+    @staticmethod
+    def keys(room_id):
+        """
+        The namespace and the room id, or the room id alone for ids beyond
+        int4. PostgreSQL keeps the one-key and two-key forms apart, so no two
+        rooms share a lock.
+        """
+        return [ROOM_LOCK_NAMESPACE, room_id] if room_id <= MAX_INT4 else [room_id]
+
+    def acquire(self, cursor, room_ids, nowait):
+        for room_id in room_ids:
+            keys = self.keys(room_id)
+            placeholders = ", ".join(["%s"] * len(keys))
+            if nowait:
+                cursor.execute(f"SELECT pg_try_advisory_xact_lock({placeholders})", keys)
+                if not cursor.fetchone()[0]:
+                    raise RoomBusy(room_id)
+            else:
+                cursor.execute(f"SELECT pg_advisory_xact_lock({placeholders})", keys)
+
+
+class RoomRowLockStrategy(LockStrategy):
+    """
+    SELECT ... FOR UPDATE on the Room rows themselves.
+    """
+    name = "room"
+
+    def acquire(self, cursor, room_ids, nowait):
+        Room = apps.get_model("core", "Room")
+        list(
+            Room.objects.select_for_update(nowait=nowait)
+            .filter(pk__in=room_ids)
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+
+
+LOCK_STRATEGIES = {
+    "none": None,
+    "advisory": AdvisoryLockStrategy,
+    "room": RoomRowLockStrategy,
+}
+
+
+def get_lock_strategy(name=None):
+    strategy_class = LOCK_STRATEGIES[name or settings.BOOKING_LOCK_STRATEGY]
+    return strategy_class() if strategy_class else None
+
+
+@contextmanager
+def room_lock(*room_ids):
+    """
+    Run the block in a transaction holding the configured lock on every room.
+    With the "none" strategy the overlap exclusion constraint alone guards
+    the rooms and no transaction is opened unless needed.
+    Raises RoomBusy when a lock is not granted within BOOKING_LOCK_TIMEOUT_MS
+    (0 means fail immediately).
+    """
+    strategy = get_lock_strategy()
+    if strategy is None:
+        with savepoint_if_nested():
+            yield
+        return
+
+    timeout = settings.BOOKING_LOCK_TIMEOUT_MS
+    try:
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                if timeout > 0:
+                    cursor.execute("SELECT set_config('lock_timeout', %s, true)", [f"{timeout}ms"])
+                started = perf_counter()
+                try:
+                    strategy.acquire(cursor, sorted(set(room_ids)), nowait=timeout == 0)
+                finally:
+                    metrics.lock_wait.observe(perf_counter() - started, strategy=strategy.name)
+            yield
+    except RoomBusy:
+        metrics.booking_conflicts.inc(reason="busy")
+        raise
+    except OperationalError as e:
+        if is_lock_timeout(e):
+            metrics.booking_conflicts.inc(reason="busy")
+            raise RoomBusy(*room_ids) from e
+        raise
+
+
+def lock_rooms(rooms, limit=None, skip_locked=False):
+    """
+    Lock the rooms of a queryset, or the first `limit` of them, in id order
+    inside the current transaction, and return their ids. FOR NO KEY UPDATE excludes other lockers of the
+    rooms, but not the foreign key checks of bookings being inserted for
+    them, so single bookings committing meanwhile cannot deadlock with the
+    holder. With skip_locked, rooms locked by someone else are left out
+    instead of waited for; otherwise raises RoomBusy when the locks are not
+    granted within BOOKING_LOCK_TIMEOUT_MS (0 means fail immediately).
+    """
+    timeout = settings.BOOKING_LOCK_TIMEOUT_MS
+    if timeout > 0 and not skip_locked:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT set_config('lock_timeout', %s, true)", [f"{timeout}ms"])
+    started = perf_counter()
+    room_ids = (
+        rooms.select_for_update(no_key=True, nowait=timeout == 0 and not skip_locked, skip_locked=skip_locked)
+        .order_by("pk")
+        .values_list("pk", flat=True)
+    )
+    try:
+        return list(room_ids[:limit] if limit else room_ids)
+    except OperationalError as e:
+        if is_lock_timeout(e):
+            metrics.booking_conflicts.inc(reason="busy")
+            raise RoomBusy() from e
+        raise
+    finally:
+        metrics.lock_wait.observe(perf_counter() - started, strategy="group")
@@ -0,0 +1,122 @@
+"""
+Logging helpers: per-request context, a JSON formatter and a queue handler
+that moves formatting and disk writes to a background thread.
+"""
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+CONTEXT_FIELDS = ("request_id", "user_id", "room_id", "latency_ms")
+
+_context = ContextVar("log_context", default={})
+_traceback_formatter = logging.Formatter()
+
+
+def bind(**fields):
+    """
+    Attach fields (request_id, user_id, room_id, ...) to every record logged
+    by the current request from now on.
+    """
+    _context.set({**_context.get(), **fields})
+
+
+def reset(**fields):
+    """
+    Start a fresh context, returning the token to restore the previous one.
+    """
+    return _context.set(fields)
+
+
+def restore(token):
+    _context.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """
+    Copies the request context onto the record in the logging thread,
+    before the record may be handed to another thread.
+    """
+    def filter(self, record):
+        for name, value in _context.get().items():
+            if not hasattr(record, name):
+                setattr(record, name, value)
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        data = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for name in CONTEXT_FIELDS:
+            value = getattr(record, name, None)
+            if value is not None:
+                data[name] = value
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            # Rendered by BackgroundHandler.prepare
+            data["exception"] = record.exc_text
+        return json.dumps(data, default=str)
+
+
+def file_handler(filename, max_bytes=0, when="", backup_count=5):
+    """
+    A file handler rotated by time when `when` is set, else by size when
+    max_bytes is set, else never rotated.
+    """
+    if when:
+        return logging.handlers.TimedRotatingFileHandler(filename, when=when, backupCount=backup_count)
+    if max_bytes:
+        return logging.handlers.RotatingFileHandler(filename, maxBytes=max_bytes, backupCount=backup_count)
+    return logging.FileHandler(filename)
+
+
+class BackgroundHandler(logging.handlers.QueueHandler):
+    """
+    Enqueues records and lets a background thread format them and write them
+    to a file (rotated by size or time) and to stderr. The request thread only
+    pays for an in-memory put.
+    """
+    def __init__(self, filename, json_format=True, max_bytes=0, when="", backup_count=5, console=True):
+        super().__init__(queue.SimpleQueue())
+        formatter = JsonFormatter() if json_format else logging.Formatter()
+        targets = [file_handler(filename, max_bytes, when, backup_count)]
+        if console:
+            targets.append(logging.StreamHandler(sys.stderr))
+        for target in targets:
+            target.setFormatter(formatter)
+        self.listener = logging.handlers.QueueListener(self.queue, *targets, respect_handler_level=True)
+        self.listener.start()
+        self._listening = True
+
+    def prepare(self, record):
+        """
+        Render the message and the traceback now, while args and the
+        exception still hold what they held when the record was logged, and
+        leave the formatting to the background thread.
+        """
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = record.exc_text or _traceback_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def close(self):
+        # logging.shutdown() closes handlers at exit: drain the queue first
+        if self._listening:
+            self._listening = False
+            self.listener.stop()
+            for target in self.listener.handlers:
+                target.close()
+        super().close()
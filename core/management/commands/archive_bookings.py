@@ -0,0 +1,49 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils.timezone import now
+
+from core.models import ArchivedBooking
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Move bookings that ended more than --retention-days ago from the live booking table "
+        "into the archive, in batches. With --every, keep doing so on a schedule."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-days', type=int, default=settings.BOOKING_ARCHIVE_RETENTION_DAYS)
+        parser.add_argument('--batch-size', type=int, default=settings.BOOKING_ARCHIVE_BATCH_SIZE)
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help="Seconds to sleep between batches, to spread the load on a busy database.")
+        parser.add_argument('--every', type=float, default=0,
+                            help="Run again every this many seconds instead of exiting.")
+
+    def handle(self, *args, **options):
+        while True:
+            self.archive(options['retention_days'], options['batch_size'], options['pause'])
+            if not options['every']:
+                return
+            time.sleep(options['every'])
+
+    def archive(self, retention_days, batch_size, pause):
+        before = now() - timedelta(days=retention_days)
+        started, total = time.perf_counter(), 0
+        while True:
+            # Every batch commits on its own, so live rows are locked briefly
+            moved = ArchivedBooking.archive_batch(before, batch_size)
+            total += moved
+            if moved < batch_size:
+                break
+            if pause:
+                time.sleep(pause)
+
+        elapsed = time.perf_counter() - started
+        logger.info("Archived %s bookings that ended before %s in %.1fs.", total, before.isoformat(), elapsed)
+        self.stdout.write(f"Archived {total} bookings that ended before {before.isoformat()} in {elapsed:.1f}s")
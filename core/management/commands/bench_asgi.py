@@ -0,0 +1,264 @@
+import asyncio
+import itertools
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+from urllib.parse import urlencode, urlsplit, urlunsplit
+
+from decouple import config
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from django.utils.timezone import now
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core.management.commands.bench_booking import summarize
+from core.models import Hotel, Room
+
+SERVERS = {
+    # Threaded development server: one thread per connection
+    "wsgi": lambda port: [sys.executable, "manage.py", "runserver", "--noreload", f"127.0.0.1:{port}"],
+    "asgi": lambda port: [
+        sys.executable, "-m", "uvicorn", "booking.asgi:application", "--port", str(port),
+        "--log-level", "warning", "--no-access-log",
+    ],
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class LatencyProxy:
+    """
+    TCP proxy in front of the database that delays every chunk the database
+    sends by `delay` seconds, standing in for a database across the network.
+    """
+    def __init__(self, host, port, delay):
+        self.target = (host, port)
+        self.delay = delay
+        self.port = free_port()
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        asyncio.run_coroutine_threadsafe(
+            asyncio.start_server(self.handle, "127.0.0.1", self.port), self.loop,
+        ).result()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    async def handle(self, client_reader, client_writer):
+        server_reader, server_writer = await asyncio.open_connection(*self.target)
+        await asyncio.gather(
+            self.pipe(client_reader, server_writer, 0),
+            self.pipe(server_reader, client_writer, self.delay),
+        )
+
+    @staticmethod
+    async def pipe(reader, writer, delay):
+        try:
+            while data := await reader.read(65536):
+                if delay:
+                    await asyncio.sleep(delay)
+                writer.write(data)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+class Command(BaseCommand):
+    help = (
+        "Start the project under the threaded WSGI development server and under uvicorn (ASGI), "
+        "drive the same mix of bookings and room availability checks at high concurrency against "
+        "each (the async endpoints under ASGI), and print throughput, p50/p95/p99 latency and the "
+        "peak server thread count per server as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rooms', type=int, default=100)
+        parser.add_argument('--concurrency', type=int, default=64, help="Requests in flight at once.")
+        parser.add_argument('--requests', type=int, default=2000, help="Requests per server.")
+        parser.add_argument('--read-ratio', type=float, default=0.8,
+                            help="Share of requests that check availability instead of booking.")
+        parser.add_argument('--db-latency-ms', type=float, default=0,
+                            help="Delay every database reply by this much through a local proxy.")
+        parser.add_argument('--servers', default="wsgi,asgi", help="Comma-separated servers to compare.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help="Write the JSON report to this file instead of stdout.")
+
+    def handle(self, *args, **options):
+        servers = options['servers'].split(",")
+        if set(servers) - set(SERVERS):
+            raise CommandError(f"--servers must be among {', '.join(SERVERS)}.")
+
+        hotel = Hotel.objects.create(name="bench asgi hotel", location="bench-asgi")
+        rooms = Room.objects.bulk_create(
+            Room(hotel=hotel, room_number=str(100 + number)) for number in range(options['rooms'])
+        )
+        user, _ = get_user_model().objects.get_or_create(username="bench_asgi")
+        token = str(AccessToken.for_user(user))
+        database = settings.DATABASES['default']
+        try:
+            if options['db_latency_ms']:
+                with LatencyProxy(database['HOST'] or "localhost", int(database['PORT'] or 5432),
+                                  options['db_latency_ms'] / 1000) as proxy:
+                    results = self.run_all(servers, rooms, token, options, proxy.port)
+            else:
+                results = self.run_all(servers, rooms, token, options, None)
+        finally:
+            hotel.delete()
+
+        report = {
+            "config": {key: options[key] for key in (
+                'rooms', 'concurrency', 'requests', 'read_ratio', 'db_latency_ms', 'seed',
+            )},
+            "servers": results,
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output + "\n")
+        else:
+            self.stdout.write(output)
+
+    def run_all(self, servers, rooms, token, options, proxy_port):
+        env = {**os.environ, "DEBUG": "False", "DB_CONN_MAX_AGE": "0"}
+        if proxy_port:
+            url = urlsplit(config('DATABASE_URL'))
+            credentials = url.netloc.rpartition("@")[0]
+            env["DATABASE_URL"] = urlunsplit(url._replace(
+                netloc=f"{credentials}@127.0.0.1:{proxy_port}" if credentials else f"127.0.0.1:{proxy_port}",
+            ))
+        # Every server books its own future, so nobody collides with another run
+        base = now() + timedelta(days=2)
+        results = {}
+        for index, name in enumerate(servers):
+            results[name] = self.run_server(
+                name, env, rooms, token, options, base + timedelta(days=3650 * index),
+            )
+        return results
+
+    def run_server(self, name, env, rooms, token, options, base):
+        port = free_port()
+        process = subprocess.Popen(
+            SERVERS[name](port), cwd=settings.BASE_DIR, env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        peak_threads = [0]
+        stop = threading.Event()
+
+        def watch_threads():
+            while not stop.wait(0.05):
+                peak_threads[0] = max(peak_threads[0], self.thread_count(process.pid))
+
+        try:
+            self.wait_for(port, process)
+            watcher = threading.Thread(target=watch_threads, daemon=True)
+            watcher.start()
+            samples, elapsed = asyncio.run(self.drive(name, port, rooms, token, options, base))
+            stop.set()
+            watcher.join()
+        finally:
+            stop.set()
+            process.terminate()
+            process.wait()
+
+        total = sum(len(items) for items in samples.values())
+        return {
+            "duration_seconds": round(elapsed, 3),
+            "throughput": round(total / elapsed, 1),
+            "peak_threads": peak_threads[0],
+            "endpoints": {endpoint: summarize(items, elapsed) for endpoint, items in samples.items()},
+        }
+
+    @staticmethod
+    def wait_for(port, process, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError(f"Server exited with status {process.returncode}.")
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                return
+            except OSError:
+                time.sleep(0.1)
+        raise CommandError(f"Server did not listen on port {port} within {timeout}s.")
+
+    @staticmethod
+    def thread_count(pid):
+        try:
+            with open(f"/proc/{pid}/status") as status:
+                for line in status:
+                    if line.startswith("Threads:"):
+                        return int(line.split()[1])
+        except OSError:
+            pass
+        return 0
+
+    async def drive(self, name, port, rooms, token, options, base):
+        prefix = "async-" if name == "asgi" else ""
+        rng = random.Random(options['seed'])
+        pending = iter(range(options['requests']))
+        fresh_slots = itertools.count()
+        samples = defaultdict(list)
+
+        async def request(method, path, body=b""):
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            try:
+                writer.write(
+                    f"{method} {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nAuthorization: Bearer {token}\r\n"
+                    f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n"
+                    .encode() + body
+                )
+                await writer.drain()
+                response = await reader.read()
+            finally:
+                writer.close()
+            return int(response.split(b" ", 2)[1]) if response else 0
+
+        async def client():
+            for _ in pending:
+                room = rng.choice(rooms)
+                if rng.random() < options['read_ratio']:
+                    endpoint = "availability"
+                    start_at = base + timedelta(hours=rng.randrange(24 * 30))
+                    path = reverse(f'{prefix}room-availability', args=[room.id]) + "?" + urlencode({
+                        "start": start_at.isoformat(), "end": (start_at + timedelta(hours=2)).isoformat(),
+                    })
+                    body, method = b"", "GET"
+                else:
+                    endpoint, method = "booking", "POST"
+                    # Fresh slots never repeat, so every booking should succeed
+                    slot = next(fresh_slots)
+                    path = reverse(f'{prefix}booking')
+                    body = json.dumps({
+                        "room": room.id,
+                        "start_at": (base + timedelta(hours=slot)).isoformat(),
+                        "end_at": (base + timedelta(hours=slot + 1)).isoformat(),
+                    }).encode()
+                started = time.perf_counter()
+                try:
+                    status = await request(method, path, body)
+                except OSError:
+                    status = 0
+                samples[endpoint].append((time.perf_counter() - started, status))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(options['concurrency'])))
+        return samples, time.perf_counter() - started
@@ -0,0 +1,189 @@
+import itertools
+import json
+import random
+import statistics
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.urls import reverse
+from django.utils.timezone import now
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core.models import Booking, Hotel, Room
+
+
+def summarize(items, elapsed):
+    """
+    Request count, throughput, latency percentiles and status counts of
+    (latency in seconds, status) samples gathered over `elapsed` seconds.
+    """
+    latencies = sorted(latency * 1000 for latency, _ in items)
+    percentiles = statistics.quantiles(latencies, n=100, method='inclusive') if len(latencies) > 1 else latencies * 99
+    return {
+        "requests": len(items),
+        "throughput": round(len(items) / elapsed, 1),
+        "latency_ms": {
+            "p50": round(percentiles[49], 2),
+            "p95": round(percentiles[94], 2),
+            "p99": round(percentiles[98], 2),
+            "max": round(latencies[-1], 2),
+        },
+        "statuses": dict(Counter(str(status) for _, status in items)),
+    }
+
+
+BATCH_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed hotels, rooms and historical bookings with bulk inserts, then drive concurrent "
+        "JWT-authenticated clients against POST /booking/ and the availability endpoint. "
+        "Prints throughput, p50/p95/p99 latency and DB queries per endpoint as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hotels', type=int, default=10)
+        parser.add_argument('--rooms', type=int, default=100, help="Rooms per hotel.")
+        parser.add_argument('--bookings', type=int, default=10000, help="Historical bookings to seed.")
+        parser.add_argument('--clients', type=int, default=8, help="Concurrent clients.")
+        parser.add_argument('--requests', type=int, default=200, help="Requests per client.")
+        parser.add_argument('--read-ratio', type=float, default=0.5,
+                            help="Share of requests that search availability instead of booking.")
+        parser.add_argument('--conflict-rate', type=float, default=0.1,
+                            help="Share of booking requests that target an already booked slot.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help="Write the JSON report to this file instead of stdout.")
+        parser.add_argument('--keep', action='store_true', help="Keep the seeded data afterwards.")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        started = time.perf_counter()
+        hotels, rooms, taken = self.seed(options)
+        seed_seconds = time.perf_counter() - started
+        try:
+            samples, elapsed = self.drive(hotels, rooms, taken, options, rng)
+        finally:
+            if not options['keep']:
+                Hotel.objects.filter(id__in=[hotel.id for hotel in hotels]).delete()
+
+        report = {
+            "config": {key: options[key] for key in (
+                'hotels', 'rooms', 'bookings', 'clients', 'requests', 'read_ratio', 'conflict_rate', 'seed'
+            )},
+            "seed_seconds": round(seed_seconds, 3),
+            "duration_seconds": round(elapsed, 3),
+            "throughput": round(sum(len(items) for items in samples.values()) / elapsed, 1),
+            "endpoints": {name: self.summarize_endpoint(items, elapsed) for name, items in samples.items()},
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output + "\n")
+        else:
+            self.stdout.write(output)
+
+    def seed(self, options):
+        hotels = Hotel.objects.bulk_create(
+            Hotel(name=f"bench hotel {number}", location=f"bench-{number % 3}") for number in range(options['hotels'])
+        )
+        rooms = Room.objects.bulk_create(
+            (Room(hotel=hotel, room_number=str(100 + number)) for hotel in hotels for number in range(options['rooms'])),
+            batch_size=BATCH_SIZE,
+        )
+        user, _ = get_user_model().objects.get_or_create(username="bench_booking_seed")
+
+        # Back-to-back two hour stays in the past, spread round robin over the rooms
+        past = now() - timedelta(hours=2 * (options['bookings'] // len(rooms) + 1))
+        history = (
+            Booking(user=user, room=rooms[index % len(rooms)],
+                    start_at=past + timedelta(hours=2 * (index // len(rooms))),
+                    end_at=past + timedelta(hours=2 * (index // len(rooms) + 1)))
+            for index in range(options['bookings'])
+        )
+        while batch := list(itertools.islice(history, BATCH_SIZE)):
+            Booking.objects.bulk_create(batch)
+
+        # A pool of future stays for the conflicting requests to collide with
+        future = now() + timedelta(days=1)
+        taken = Booking.objects.bulk_create(
+            Booking(user=user, room=room, start_at=future, end_at=future + timedelta(hours=2)) for room in rooms
+        )
+        return hotels, rooms, [(booking.room_id, booking.start_at, booking.end_at) for booking in taken]
+
+    def drive(self, hotels, rooms, taken, options, rng):
+        samples = defaultdict(list)
+        samples_lock = threading.Lock()
+        # Fresh slots start after the conflict pool and never repeat
+        fresh_slots = itertools.count(2)
+        fresh_lock = threading.Lock()
+        base = now() + timedelta(days=2)
+
+        def client_loop(number, client_rng):
+            user, _ = get_user_model().objects.get_or_create(username=f"bench_booking_{number}")
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(user)}")
+            local = defaultdict(list)
+            queries = []
+
+            def count_queries(execute, sql, params, many, context):
+                queries.append(sql)
+                return execute(sql, params, many, context)
+
+            try:
+                with connection.execute_wrapper(count_queries):
+                    for _ in range(options['requests']):
+                        queries.clear()
+                        if client_rng.random() < options['read_ratio']:
+                            name = "availability"
+                            start_at = base + timedelta(hours=client_rng.randrange(24 * 30))
+                            request_started = time.perf_counter()
+                            response = client.get(
+                                reverse('hotel-availability', kwargs={"hotel_id": client_rng.choice(hotels).id}),
+                                {"start": start_at.isoformat(), "end": (start_at + timedelta(days=2)).isoformat()},
+                            )
+                        else:
+                            name = "booking"
+                            if client_rng.random() < options['conflict_rate']:
+                                room_id, start_at, end_at = client_rng.choice(taken)
+                            else:
+                                with fresh_lock:
+                                    slot = next(fresh_slots)
+                                room_id = client_rng.choice(rooms).id
+                                start_at, end_at = base + timedelta(hours=slot), base + timedelta(hours=slot + 1)
+                            request_started = time.perf_counter()
+                            response = client.post(
+                                reverse('booking'),
+                                {"room": room_id, "start_at": start_at.isoformat(), "end_at": end_at.isoformat()},
+                                format="json",
+                            )
+                        local[name].append((time.perf_counter() - request_started, response.status_code, len(queries)))
+            finally:
+                connection.close()
+            with samples_lock:
+                for name, items in local.items():
+                    samples[name].extend(items)
+
+        threads = [
+            threading.Thread(target=client_loop, args=(number, random.Random(rng.random())))
+            for number in range(options['clients'])
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return samples, time.perf_counter() - started
+
+    @staticmethod
+    def summarize_endpoint(items, elapsed):
+        return {
+            **summarize([(latency, status) for latency, status, _ in items], elapsed),
+            "queries_per_request": round(statistics.fmean(count for _, _, count in items), 2),
+        }
@@ -0,0 +1,89 @@
+import random
+import threading
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils.timezone import now
+
+from core.locks import LOCK_STRATEGIES, RoomBusy
+from core.models import Booking, Hotel, Room
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare booking throughput of the room lock strategies under contention: "
+        "every thread on a single hot room versus threads spread over many cold rooms. "
+        "Creates a throwaway hotel in the configured database and deletes it afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--attempts', type=int, default=200, help="Booking attempts per thread.")
+        parser.add_argument('--rooms', type=int, default=100, help="Number of cold rooms.")
+        parser.add_argument('--slots', type=int, default=500, help="Distinct one-hour slots to pick from.")
+        parser.add_argument('--timeout-ms', type=int, default=2000, help="BOOKING_LOCK_TIMEOUT_MS to run with.")
+        parser.add_argument(
+            '--strategies', default=','.join(LOCK_STRATEGIES), help="Comma separated strategies to compare."
+        )
+
+    def handle(self, *args, **options):
+        user, _ = get_user_model().objects.get_or_create(username="bench_locks")
+        hotel = Hotel.objects.create(name="bench locks", location="bench")
+        rooms = Room.objects.bulk_create(
+            Room(hotel=hotel, room_number=str(number)) for number in range(options['rooms'] + 1)
+        )
+        hot_room, cold_rooms = rooms[0], rooms[1:]
+        try:
+            self.stdout.write(f"{'strategy':<10} {'scenario':<6} {'attempts/s':>11} {'created':>8} "
+                              f"{'conflicts':>10} {'busy':>6}")
+            for strategy in options['strategies'].split(','):
+                for scenario, pool in (("hot", [hot_room]), ("cold", cold_rooms)):
+                    Booking.objects.filter(room__hotel=hotel).delete()
+                    with override_settings(BOOKING_LOCK_STRATEGY=strategy,
+                                           BOOKING_LOCK_TIMEOUT_MS=options['timeout_ms']):
+                        result = self.run_scenario(user, pool, options)
+                    self.stdout.write(
+                        f"{strategy:<10} {scenario:<6} {result['throughput']:>11.1f} {result['created']:>8} "
+                        f"{result['conflicts']:>10} {result['busy']:>6}"
+                    )
+        finally:
+            hotel.delete()
+
+    def run_scenario(self, user, rooms, options):
+        counts = {"created": 0, "conflicts": 0, "busy": 0}
+        lock = threading.Lock()
+        start_at = now() + timedelta(days=1)
+
+        def worker(seed):
+            rng = random.Random(seed)
+            local = {"created": 0, "conflicts": 0, "busy": 0}
+            try:
+                for _ in range(options['attempts']):
+                    slot_start = start_at + timedelta(hours=rng.randrange(options['slots']))
+                    try:
+                        Booking.create_booking(user, rng.choice(rooms), slot_start, slot_start + timedelta(hours=2))
+                        local["created"] += 1
+                    except ValidationError:
+                        local["conflicts"] += 1
+                    except RoomBusy:
+                        local["busy"] += 1
+            finally:
+                connection.close()
+            with lock:
+                for key, value in local.items():
+                    counts[key] += value
+
+        threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(options['threads'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        return {**counts, "throughput": options['threads'] * options['attempts'] / elapsed}
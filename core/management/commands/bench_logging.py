@@ -0,0 +1,87 @@
+import logging
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.log import BackgroundHandler, ContextFilter, JsonFormatter, bind, reset, restore
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the logging overhead a booking request pays in its own thread: eager f-strings "
+        "with a synchronous FileHandler (before) versus lazy formatting with the queue-based "
+        "background writer (after), in text and JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20000)
+        parser.add_argument('--disk-latency-us', type=float, default=0,
+                            help="Simulated stall added to every flush to disk, as under I/O pressure.")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'pipeline':<28} {'us/request':>11} {'drain ms':>9}")
+        with tempfile.TemporaryDirectory() as directory:
+            for name, queued, json_format, lazy in (
+                ("sync file, f-strings", False, False, False),
+                ("sync file, lazy", False, False, True),
+                ("queue, lazy", True, False, True),
+                ("queue, lazy, json", True, True, True),
+            ):
+                per_request, drain = self.measure(
+                    os.path.join(directory, f"{len(name)}-{queued}-{json_format}.log"),
+                    queued, json_format, lazy, options['requests'], options['disk_latency_us'] / 1e6,
+                )
+                self.stdout.write(f"{name:<28} {per_request:>11.2f} {drain:>9.1f}")
+
+    def measure(self, filename, queued, json_format, lazy, requests, disk_latency):
+        if queued:
+            handler = BackgroundHandler(filename, json_format=json_format, console=False)
+            file_handler = handler.listener.handlers[0]
+        else:
+            handler = file_handler = logging.FileHandler(filename)
+            handler.setFormatter(JsonFormatter() if json_format else logging.Formatter())
+        if disk_latency:
+            self.slow_down(file_handler, disk_latency)
+        handler.addFilter(ContextFilter())
+        logger = logging.getLogger(f"bench_logging.{filename}")
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        logger.addHandler(handler)
+
+        username, errors = "alireza", {"room": ["Room does not exist."]}
+        started = time.perf_counter()
+        for number in range(requests):
+            token = reset(request_id=f"{number:032x}")
+            bind(user_id=1, room_id=number % 100)
+            # The log calls of one POST /booking/ that fails validation
+            if lazy:
+                logger.debug("Serializer data: %s", errors)
+                logger.info("User %s is attempting to create a booking.", username)
+                logger.warning("Invalid serializer data: %s", errors)
+                logger.info("%s %s %s", "POST", "/booking/", 400, extra={"latency_ms": 1.0})
+            else:
+                logger.debug(f"Serializer data: {errors}")
+                logger.info(f"User {username} is attempting to create a booking.")
+                logger.warning(f"Invalid serializer data: {errors}")
+                logger.info("POST /booking/ 400", extra={"latency_ms": 1.0})
+            restore(token)
+        elapsed = time.perf_counter() - started
+
+        # Time for the background writer to catch up, not paid by requests
+        drain_started = time.perf_counter()
+        handler.close()
+        drain = time.perf_counter() - drain_started
+        logger.removeHandler(handler)
+        return elapsed / requests * 1e6, drain * 1000
+
+    @staticmethod
+    def slow_down(handler, delay):
+        flush = handler.flush
+
+        def slow_flush():
+            time.sleep(delay)
+            flush()
+
+        handler.flush = slow_flush
@@ -0,0 +1,50 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import is_naive, make_aware
+
+from core.export import CHUNK_SIZE, FORMATS, export_bookings
+from core.routers import replica_reads
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream every live and archived booking, with its user, room and hotel, as CSV or NDJSON "
+        "(optionally gzipped) to a file or stdout. Memory use does not grow with the number of bookings."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', choices=FORMATS, default='csv')
+        parser.add_argument('--gzip', action='store_true')
+        parser.add_argument('--hotel', type=int, help="Only bookings of this hotel id.")
+        parser.add_argument('--start', help="Only bookings ending after this ISO 8601 datetime.")
+        parser.add_argument('--end', help="Only bookings starting before this ISO 8601 datetime.")
+        parser.add_argument('--file', default='-', help="Destination path, '-' for stdout.")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        filters = {}
+        if options['hotel'] is not None:
+            filters['hotel_id'] = options['hotel']
+        for name in ('start', 'end'):
+            if options[name]:
+                value = parse_datetime(options[name])
+                if value is None:
+                    raise CommandError(f"--{name} is not an ISO 8601 datetime: {options[name]}")
+                filters[name] = make_aware(value) if is_naive(value) else value
+
+        chunks = export_bookings(options['output'], options['gzip'], options['chunk_size'], **filters)
+        started, written = time.perf_counter(), 0
+        output = sys.stdout.buffer if options['file'] == '-' else open(options['file'], 'wb')
+        try:
+            with replica_reads():
+                for chunk in chunks:
+                    output.write(chunk)
+                    written += len(chunk)
+        finally:
+            if output is not sys.stdout.buffer:
+                output.close()
+
+        self.stderr.write(f"Wrote {written} bytes in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,59 @@
+import os
+import sys
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+
+from core.importer import FORMATS, InventoryImporter, read_records
+from core.models import ImportRun
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk load hotels, rooms and bookings from a JSONL or CSV file. Records are validated in "
+        "batches, overlapping bookings (within the file or with existing ones) go to a reject file, "
+        "and an interrupted import resumes after its last committed batch when run again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Source file, '-' for stdin.")
+        parser.add_argument('--format', dest='file_format', choices=FORMATS,
+                            help="Defaults to csv for *.csv files and jsonl otherwise.")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--rejects', help="Where rejected records are appended, as JSONL. "
+                                              "Defaults to <path>.rejects.jsonl.")
+        parser.add_argument('--name', help="Identifies the source across resumed runs. Defaults to the path.")
+        parser.add_argument('--restart', action='store_true', help="Start over from the first record.")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['file_format'] or ('csv' if path.endswith('.csv') else 'jsonl')
+        name = options['name'] or (os.path.abspath(path) if path != '-' else 'stdin')
+        rejects_path = options['rejects'] or (f"{path}.rejects.jsonl" if path != '-' else 'stdin.rejects.jsonl')
+
+        run, _ = ImportRun.objects.get_or_create(name=name)
+        if options['restart']:
+            run.position, run.hotel_keys = 0, {}
+            run.save()
+        elif run.position:
+            self.stdout.write(f"Resuming {name} after record {run.position}")
+
+        stream = sys.stdin if path == '-' else open(path, newline='' if file_format == 'csv' else None)
+        with stream, open(rejects_path, 'a' if run.position else 'w') as rejects:
+            importer = InventoryImporter(run, rejects)
+            records = islice(read_records(stream, file_format), run.position, None)
+            started, done = time.perf_counter(), 0
+            while batch := list(islice(records, options['batch_size'])):
+                importer.import_batch(batch)
+                done += len(batch)
+                if options['verbosity'] >= 2:
+                    self.stdout.write(f"{run.position} records, {done / (time.perf_counter() - started):.0f} rows/s")
+
+        elapsed = time.perf_counter() - started
+        counts = importer.counts
+        self.stdout.write(
+            f"Imported {counts['hotel']} hotels, {counts['room']} rooms and {counts['booking']} bookings, "
+            f"rejected {counts['rejected']} records ({rejects_path}) in {elapsed:.1f}s, "
+            f"{done / elapsed if elapsed else 0:.0f} rows/s"
+        )
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from django.utils.timezone import now
+
+from core.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = "Delete stored Idempotency-Key responses past their expiry."
+
+    def handle(self, *args, **options):
+        deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=now()).delete()
+        self.stdout.write(f"Deleted {deleted} expired idempotency keys")
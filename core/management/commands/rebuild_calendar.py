@@ -0,0 +1,36 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils.timezone import now
+
+from core.bitmaps import month_starts
+from core.models import Room, RoomAvailability
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the per-room calendar bitmaps from the bookings for the current month and "
+        "--months more, a batch of rooms at a time. Safe to run while bookings are being written."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=12, help="Months after the current one to rebuild.")
+        parser.add_argument('--hotel', type=int, help="Only rebuild this hotel's rooms.")
+        parser.add_argument('--batch-size', type=int, default=200, help="Rooms per transaction.")
+
+    def handle(self, *args, **options):
+        current = now()
+        months = month_starts(current, current + timedelta(days=31 * options['months'] + 1))[:options['months'] + 1]
+        rooms = Room.objects.order_by('id')
+        if options['hotel']:
+            rooms = rooms.filter(hotel_id=options['hotel'])
+
+        started, done, last_id = time.perf_counter(), 0, 0
+        while batch := list(rooms.filter(id__gt=last_id).values_list('id', flat=True)[:options['batch_size']]):
+            RoomAvailability.refresh([(room_id, month) for room_id in batch for month in months])
+            done, last_id = done + len(batch), batch[-1]
+
+        self.stdout.write(
+            f"Rebuilt {len(months)} months of {done} rooms in {time.perf_counter() - started:.1f}s"
+        )
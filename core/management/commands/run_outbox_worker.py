@@ -0,0 +1,38 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.outbox import get_handlers, process_batch
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Hand booking events from the outbox to the BOOKING_OUTBOX_HANDLERS in batches, retrying "
+        "failed ones with backoff. Several workers can run side by side. With --once, exit as soon "
+        "as no event is due."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.BOOKING_OUTBOX_BATCH_SIZE)
+        parser.add_argument('--poll', type=float, default=1.0,
+                            help="Seconds to sleep when no event is due.")
+        parser.add_argument('--once', action='store_true', help="Exit once no event is due.")
+
+    def handle(self, *args, **options):
+        handlers = get_handlers()
+        started, total = time.perf_counter(), 0
+        while True:
+            claimed = process_batch(options['batch_size'], handlers=handlers)
+            total += claimed
+            if claimed < options['batch_size']:
+                if options['once']:
+                    break
+                time.sleep(options['poll'])
+
+        elapsed = time.perf_counter() - started
+        logger.info("Processed %s outbox events in %.1fs.", total, elapsed)
+        self.stdout.write(f"Processed {total} outbox events in {elapsed:.1f}s")
@@ -0,0 +1,45 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.models import Booking
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete expired room holds in batches, giving their slots back. With --every, keep doing so "
+        "on a schedule; expired holds block their slot until swept."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.BOOKING_HOLD_SWEEP_BATCH_SIZE)
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help="Seconds to sleep between batches, to spread the load on a busy database.")
+        parser.add_argument('--every', type=float, default=0,
+                            help="Run again every this many seconds instead of exiting.")
+
+    def handle(self, *args, **options):
+        while True:
+            self.sweep(options['batch_size'], options['pause'])
+            if not options['every']:
+                return
+            time.sleep(options['every'])
+
+    def sweep(self, batch_size, pause):
+        started, total = time.perf_counter(), 0
+        while True:
+            # Every batch commits on its own, so bookings of the room are not held up
+            deleted = Booking.sweep_expired_holds(batch_size)
+            total += deleted
+            if deleted < batch_size:
+                break
+            if pause:
+                time.sleep(pause)
+
+        elapsed = time.perf_counter() - started
+        logger.info("Swept %s expired holds in %.1fs.", total, elapsed)
+        self.stdout.write(f"Swept {total} expired holds in {elapsed:.1f}s")
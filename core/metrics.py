@@ -0,0 +1,167 @@
+"""
+Minimal in-process metrics registry rendered in the Prometheus text format.
+Values are per worker process; scrape every worker or aggregate downstream.
+"""
+import threading
+from bisect import bisect_left
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple((name, labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key, value):
+        return [f"{self.name}{_format_labels(key)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            # Per-bucket (non-cumulative) counts, then the sum and the total count
+            state = self._values.setdefault(key, [0] * (len(self.buckets) + 1) + [0.0, 0])
+            state[bisect_left(self.buckets, value)] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def totals(self, **labels):
+        """
+        The number and the sum of the values observed with these labels.
+        """
+        with self._lock:
+            state = self._values.get(self._key(labels))
+        return (state[-1], state[-2]) if state else (0, 0.0)
+
+    def _render_sample(self, key, state):
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + ("+Inf",), state):
+            cumulative += count
+            le = bound if bound == "+Inf" else _format_value(bound)
+            lines.append(f"{self.name}_bucket{_format_labels(key + (('le', le),))} {cumulative}")
+        lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(state[-2])}")
+        lines.append(f"{self.name}_count{_format_labels(key)} {state[-1]}")
+        return lines
+
+
+class CallbackGauge(_Metric):
+    """
+    A gauge (or counter, with type="counter") read from a callback at scrape time.
+    """
+    def __init__(self, name, documentation, callback, type="gauge"):
+        super().__init__(name, documentation)
+        self.callback = callback
+        self.type = type
+
+    def render(self):
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+            *self._render_sample((), self.callback()),
+        ]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+request_duration = registry.register(Histogram(
+    "booking_request_duration_seconds", "Time spent handling a request.", ["view", "method"]
+))
+requests_total = registry.register(Counter(
+    "booking_requests_total", "Handled requests by response status.", ["view", "method", "status"]
+))
+request_db_queries = registry.register(Histogram(
+    "booking_request_db_queries", "Database queries run by a request.", ["view"], buckets=QUERY_COUNT_BUCKETS
+))
+request_db_duration = registry.register(Histogram(
+    "booking_request_db_duration_seconds", "Time a request spent waiting on the database.", ["view"]
+))
+lock_wait = registry.register(Histogram(
+    "booking_lock_wait_seconds", "Time spent acquiring room locks before writing bookings.", ["strategy"]
+))
+booking_conflicts = registry.register(Counter(
+    "booking_conflicts_total", "Booking writes rejected because the room was taken or busy.", ["reason"]
+))
+slow_requests = registry.register(Counter(
+    "booking_slow_requests_total", "Requests slower than BOOKING_SLOW_REQUEST_MS.", ["view"]
+))
+idempotent_requests = registry.register(Counter(
+    "booking_idempotent_requests_total",
+    "Requests sent with an Idempotency-Key, by outcome (executed, replayed, mismatch, in_progress).", ["outcome"]
+))
+admission_wait = registry.register(Histogram(
+    "booking_admission_wait_seconds", "Time booking requests queued for their room's writing slot."
+))
+admission_rejections = registry.register(Counter(
+    "booking_admission_rejections_total",
+    "Booking requests turned away before writing (queue_full, timeout, booked, rate_limited).", ["reason"]
+))
+holds = registry.register(Counter(
+    "booking_holds_total", "Room holds by outcome (created, confirmed, released, expired).", ["outcome"]
+))
+outbox_events = registry.register(Counter(
+    "booking_outbox_events_total", "Outbox events processed by this worker, by outcome (handled, retried, failed).",
+    ["outcome"]
+))
@@ -0,0 +1,174 @@
+import logging
+import random
+import uuid
+from contextvars import ContextVar
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from rest_framework.permissions import SAFE_METHODS
+
+from . import log, metrics
+from .routers import record_write, replicas
+
+logger = logging.getLogger(__name__)
+
+# SQL kept per request for slow request samples; queries beyond it are only counted
+MAX_SAMPLED_QUERIES = 100
+
+_request_queries = ContextVar("request_queries", default=None)
+
+
+class RequestQueries:
+    __slots__ = ("count", "duration", "sampled")
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.sampled = []
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Execute wrapper installed on every database connection (see signals).
+    Times the query for the request being measured, found through a context
+    variable, so queries an async request runs in worker threads count too.
+    """
+    queries = _request_queries.get()
+    if queries is None:
+        return execute(sql, params, many, context)
+    started = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = perf_counter() - started
+        queries.count += 1
+        queries.duration += elapsed
+        if len(queries.sampled) < MAX_SAMPLED_QUERIES:
+            queries.sampled.append((sql, elapsed))
+
+
+class HybridMiddleware:
+    """
+    Runs natively under both WSGI and ASGI, so the middleware chain never
+    pushes an async view through a worker thread. Subclasses implement
+    __call__'s sync body as handle() and the async one as __acall__().
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.handle(request)
+
+
+class MetricsMiddleware(HybridMiddleware):
+    """
+    Records latency, status, DB query count and DB time of every request, and
+    logs a sample of slow requests together with their SQL.
+    """
+    def handle(self, request):
+        queries = RequestQueries()
+        token = _request_queries.set(queries)
+        started = perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_queries.reset(token)
+        self.observe(request, response, perf_counter() - started, queries)
+        return response
+
+    async def __acall__(self, request):
+        queries = RequestQueries()
+        token = _request_queries.set(queries)
+        started = perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_queries.reset(token)
+        self.observe(request, response, perf_counter() - started, queries)
+        return response
+
+    @staticmethod
+    def observe(request, response, duration, queries):
+        view = getattr(request.resolver_match, "url_name", None) or "unmatched"
+        metrics.request_duration.observe(duration, view=view, method=request.method)
+        metrics.requests_total.inc(view=view, method=request.method, status=response.status_code)
+        metrics.request_db_queries.observe(queries.count, view=view)
+        metrics.request_db_duration.observe(queries.duration, view=view)
+
+        if duration * 1000 >= settings.BOOKING_SLOW_REQUEST_MS:
+            metrics.slow_requests.inc(view=view)
+            if random.random() < settings.BOOKING_SLOW_REQUEST_SAMPLE_RATE:
+                logger.warning(
+                    "Slow request %s %s: %.1f ms, %d queries, %.1f ms in the database\n%s",
+                    request.method, request.path, duration * 1000, queries.count, queries.duration * 1000,
+                    "\n".join(f"  {elapsed * 1000:.1f} ms  {sql}" for sql, elapsed in queries.sampled),
+                )
+
+
+class RequestLogMiddleware(HybridMiddleware):
+    """
+    Gives every request an id (X-Request-ID, or a new one), binds it to the
+    logging context and, with LOG_REQUESTS, logs one line per request with
+    its latency.
+    """
+    def handle(self, request):
+        request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+        token = log.reset(request_id=request_id)
+        started = perf_counter()
+        try:
+            return self.finish(request, self.get_response(request), request_id, started)
+        finally:
+            log.restore(token)
+
+    async def __acall__(self, request):
+        request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+        token = log.reset(request_id=request_id)
+        started = perf_counter()
+        try:
+            return self.finish(request, await self.get_response(request), request_id, started)
+        finally:
+            log.restore(token)
+
+    @staticmethod
+    def finish(request, response, request_id, started):
+        response["X-Request-ID"] = request_id
+        if not settings.LOG_REQUESTS:
+            return response
+        logger.info(
+            "%s %s %s", request.method, request.path, response.status_code,
+            extra={"latency_ms": round((perf_counter() - started) * 1000, 2)},
+        )
+        return response
+
+
+class ReadYourWritesMiddleware(HybridMiddleware):
+    """
+    Remembers users whose write requests succeeded, so that their next reads
+    stay on the primary instead of a possibly lagging replica.
+    """
+    def handle(self, request):
+        response = self.get_response(request)
+        if self.is_write(request, response):
+            record_write(request.user)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        # Without replicas there is nothing to remember, nor a reason to leave the event loop
+        if self.is_write(request, response) and replicas():
+            # A session-authenticated user is still a lazy database lookup
+            await sync_to_async(record_write)(request.user)
+        return response
+
+    @staticmethod
+    def is_write(request, response):
+        return request.method not in SAFE_METHODS and response.status_code < 400 and hasattr(request, "user")
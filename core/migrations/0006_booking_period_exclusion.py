@@ -0,0 +1,73 @@
+# Generated by Django 5.1 on 2026-10-18 17:53
+
+import core.models
+import django.contrib.postgres.constraints
+from django.contrib.postgres.operations import BtreeGistExtension
+import django.contrib.postgres.fields.ranges
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Offending bookings listed in the error, at most
+MAX_REPORTED_OVERLAPS = 50
+
+
+def check_no_overlaps(apps, schema_editor):
+    """
+    Refuse to add the exclusion constraint over bookings that already
+    overlap, listing them, instead of failing halfway with PostgreSQL's
+    first violation. A booking overlaps an earlier one of its room when it
+    starts before the latest end among the room's earlier bookings.
+    """
+    table = apps.get_model('core', 'Booking')._meta.db_table
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT id, room_id, start_at, end_at FROM (
+                SELECT id, room_id, start_at, end_at, max(end_at) OVER (
+                    PARTITION BY room_id ORDER BY start_at, id ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+                ) AS previous_end_at
+                FROM {table}
+            ) AS bookings
+            WHERE start_at < previous_end_at
+            ORDER BY room_id, start_at, id
+        """)
+        overlapping = cursor.fetchall()
+    if overlapping:
+        lines = [
+            f"  booking {booking_id} of room {room_id} ({start_at.isoformat()} - {end_at.isoformat()})"
+            for booking_id, room_id, start_at, end_at in overlapping[:MAX_REPORTED_OVERLAPS]
+        ]
+        if len(overlapping) > MAX_REPORTED_OVERLAPS:
+            lines.append(f"  ... and {len(overlapping) - MAX_REPORTED_OVERLAPS} more")
+        raise RuntimeError(
+            f"Found {len(overlapping)} overlapping bookings, listed below; each overlaps an earlier booking "
+            "of its room. Move or delete them and migrate again:\n" + "\n".join(lines)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_alter_booking_options_alter_booking_end_at_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # btree_gist lets the GiST exclusion index compare room ids with '='.
+        BtreeGistExtension(),
+        migrations.RemoveConstraint(
+            model_name='booking',
+            name='unique_booking_per_room',
+        ),
+        # The column is STORED, so PostgreSQL backfills it for existing rows while adding it.
+        migrations.AddField(
+            model_name='booking',
+            name='period',
+            field=models.GeneratedField(db_persist=True, expression=core.models.TsTzRange('start_at', 'end_at'), output_field=django.contrib.postgres.fields.ranges.DateTimeRangeField(), verbose_name='Period'),
+        ),
+        migrations.RunPython(check_no_overlaps, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='booking',
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(expressions=[('room', '='), ('period', '&&')], name='exclude_overlapping_bookings'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1 on 2026-10-18 17:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_booking_period_exclusion'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='hotel',
+            name='location',
+            field=models.CharField(db_index=True, max_length=200, verbose_name='Hotel Location'),
+        ),
+        migrations.AddIndex(
+            model_name='room',
+            index=models.Index(fields=['hotel', 'id'], name='room_hotel_id_idx'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.1 on 2026-10-18 18:10
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_booking_history_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedBooking',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('start_at', models.DateTimeField(verbose_name='Start Date')),
+                ('end_at', models.DateTimeField(verbose_name='End Date')),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Archived At')),
+            ],
+            options={
+                'verbose_name': 'Archived Booking',
+                'verbose_name_plural': 'Archived Bookings',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['end_at'], name='booking_end_at_idx'),
+        ),
+        migrations.AddField(
+            model_name='archivedbooking',
+            name='room',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.room', verbose_name='Room'),
+        ),
+        migrations.AddField(
+            model_name='archivedbooking',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='User'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedbooking',
+            index=models.Index(fields=['user', 'start_at', 'id'], name='archived_user_start_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedbooking',
+            index=models.Index(fields=['room', 'start_at', 'id'], name='archived_room_start_id_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1 on 2026-10-18 18:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_booking_holds'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomAvailability',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(verbose_name='Month')),
+                ('occupied', models.BinaryField(verbose_name='Occupied Slots')),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='availability', to='core.room', verbose_name='Room')),
+            ],
+            options={
+                'verbose_name': 'Room Availability',
+                'verbose_name_plural': 'Room Availability',
+                'constraints': [models.UniqueConstraint(fields=('room', 'month'), name='room_availability_room_month_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1 on 2026-10-18 18:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_room_availability'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='version',
+            field=models.PositiveIntegerField(db_default=1, default=1, verbose_name='Version'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1 on 2026-10-18 19:13
+
+import rest_framework.utils.encoders
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_outbox_event'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='idempotencykey',
+            name='response',
+            field=models.JSONField(encoder=rest_framework.utils.encoders.JSONEncoder, null=True, verbose_name='Response'),
+        ),
+    ]
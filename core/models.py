@@ -1,14 +1,55 @@
-from django.db import models, transaction, DatabaseError
+import logging
+import operator
+from bisect import insort
+from collections import defaultdict
+from contextlib import nullcontext
+from datetime import timedelta
+from functools import reduce
+from itertools import groupby
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection, models, transaction, DatabaseError, IntegrityError, OperationalError
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.fields import DateTimeRangeField, RangeOperators
+from django.db.backends.postgresql.psycopg_any import DateTimeTZRange
 from django.utils.translation import gettext_lazy as _
 from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils.timezone import now
-from django.db.models import Q
+from django.db.models import Q, Func, Exists, OuterRef
+from django.db.models.functions import Now
+from rest_framework.utils.encoders import JSONEncoder
+from .availability import RoomIntervalCache, overlaps_any
+from .bitmaps import month_starts, next_month, occupancy_matrix, room_bitmaps, slot_strings
+from .locks import RoomBusy, lock_rooms, room_lock
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+OVERLAP_CONSTRAINT_NAME = "exclude_overlapping_bookings"
+
+
+class StaleVersion(Exception):
+    """
+    The booking changed since the client read it; version is the current one.
+    """
+    def __init__(self, version):
+        super().__init__(version)
+        self.version = version
+
+
+class TsTzRange(Func):
+    """
+    PostgreSQL tstzrange(lower, upper), half-open '[)' like the overlap filters it replaces.
+    """
+    function = "TSTZRANGE"
+    output_field = DateTimeRangeField()
 
 
 class Hotel(models.Model):
     name = models.CharField(max_length=100, verbose_name=_("Hotel Name"))
-    location = models.CharField(max_length=200, verbose_name=_("Hotel Location"))
+    location = models.CharField(max_length=200, db_index=True, verbose_name=_("Hotel Location"))
 
     def __str__(self):
         return self.name
@@ -21,10 +62,27 @@ class Hotel(models.Model):
             raise ValidationError(_("Hotel name must be at least 3 characters long."))
 
 
+class RoomQuerySet(models.QuerySet):
+    def available(self, start_at, end_at):
+        """
+        Rooms without any booking intersecting [start_at, end_at), as a single
+        NOT EXISTS anti-join against the bookings' GiST index.
+        """
+        return self.exclude(Exists(Booking.objects.overlapping(OuterRef("pk"), start_at, end_at)))
+
+
 class Room(models.Model):
     hotel = models.ForeignKey(Hotel, on_delete=models.CASCADE, related_name="rooms")
     room_number = models.CharField(max_length=10, verbose_name=_("Room Number"))
 
+    objects = RoomQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Walks one hotel's rooms in primary key order for cursor pagination
+            models.Index(fields=["hotel", "id"], name="room_hotel_id_idx"),
+        ]
+
     def __str__(self):
         return f"Room {self.room_number} - {self.hotel.name}"
 
@@ -36,19 +94,61 @@ class Room(models.Model):
             raise ValidationError(_("Room number must be numeric."))
 
 
+class BookingQuerySet(models.QuerySet):
+    def overlapping(self, room, start_at, end_at):
+        """
+        Bookings of the given room whose period intersects [start_at, end_at).
+        Served by the GiST index behind the exclusion constraint.
+        """
+        return self.filter(room=room, period__overlap=DateTimeTZRange(start_at, end_at))
+
+    def confirmed(self):
+        """
+        Bookings proper, without the holds of unfinished checkouts.
+        """
+        return self.filter(hold_expires_at__isnull=True)
+
+
 class Booking(models.Model):
     user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE, verbose_name=_("User"))
     room = models.ForeignKey(Room, on_delete=models.CASCADE, verbose_name=_("Room"))
     start_at = models.DateTimeField(verbose_name=_("Start Date"))
     end_at = models.DateTimeField(verbose_name=_("End Date"))
+    # Set while the booking is only a hold; it occupies the slot all the same
+    hold_expires_at = models.DateTimeField(null=True, blank=True, verbose_name=_("Hold Expires At"))
+    # Bumped by every reschedule(), which only applies to the version the client read.
+    # The database default covers raw inserts such as the importer's COPY
+    version = models.PositiveIntegerField(default=1, db_default=1, verbose_name=_("Version"))
+    period = models.GeneratedField(
+        expression=TsTzRange("start_at", "end_at"),
+        output_field=DateTimeRangeField(),
+        db_persist=True,
+        verbose_name=_("Period"),
+    )
+
+    objects = BookingQuerySet.as_manager()
 
     class Meta:
         constraints = [
-            models.UniqueConstraint(
-                fields=["room", "start_at", "end_at"],
-                name="unique_booking_per_room"
+            # A room can never hold two bookings whose [start_at, end_at) periods intersect.
+            ExclusionConstraint(
+                name=OVERLAP_CONSTRAINT_NAME,
+                expressions=[
+                    ("room", RangeOperators.EQUAL),
+                    ("period", RangeOperators.OVERLAPS),
+                ],
             )
         ]
+        indexes = [
+            # Keyset pagination of booking history on (start_at, id)
+            models.Index(fields=["user", "start_at", "id"], name="booking_user_start_id_idx"),
+            models.Index(fields=["room", "start_at", "id"], name="booking_room_start_id_idx"),
+            # Batches of archive_bookings
+            models.Index(fields=["end_at"], name="booking_end_at_idx"),
+            # Batches of sweep_holds
+            models.Index(fields=["hold_expires_at"], name="booking_hold_expires_idx",
+                         condition=Q(hold_expires_at__isnull=False)),
+        ]
         verbose_name = _("Booking")
         verbose_name_plural = _("Bookings")
 
@@ -66,18 +166,109 @@ class Booking(models.Model):
         if self.start_at < now():
             raise ValidationError(_("Start date cannot be in the past."))
 
-    def save(self, *args, **kwargs):
+    def save(self, *args, validate=True, **kwargs):
         """
         Override save method to include validation.
+        Pass validate=False when the dates were already checked by the caller.
         """
-        self.clean()
+        if validate:
+            self.clean()
         super().save(*args, **kwargs)
 
+    def event(self):
+        """
+        The payload of outbox events about this booking.
+        """
+        return {
+            "booking_id": self.pk, "user_id": self.user_id, "room_id": self.room_id,
+            "start_at": self.start_at, "end_at": self.end_at,
+        }
+
+    @staticmethod
+    def is_overlap_violation(error):
+        """
+        Whether an IntegrityError was raised by the overlap exclusion constraint,
+        or an OperationalError by a deadlock while checking it. Two writers of
+        overlapping periods in flight at once each wait for the other's row, and
+        PostgreSQL breaks the tie by aborting one of them.
+        """
+        diag = getattr(error.__cause__, "diag", None)
+        if getattr(diag, "sqlstate", None) == "40P01":
+            return "exclusion constraint" in (getattr(diag, "context", None) or "")
+        return getattr(diag, "constraint_name", None) == OVERLAP_CONSTRAINT_NAME
+
+    @staticmethod
+    def is_foreign_key_violation(error):
+        """
+        Whether an IntegrityError was raised by a missing referenced row.
+        """
+        diag = getattr(error.__cause__, "diag", None)
+        return getattr(diag, "sqlstate", None) == "23503"
+
+    def insert(self):
+        """
+        Insert an already validated booking with a single INSERT statement.
+        The exclusion constraint rejects overlaps and the room foreign key
+        rejects unknown rooms, so nothing is read beforehand.
+        Raises RoomBusy when the configured room lock is not granted in time.
+        """
+        # Foreign keys are checked at commit; inside a caller's transaction that
+        # is too late to map a missing room, so check them right away
+        nested = transaction.get_connection().in_atomic_block
+        try:
+            with room_lock(self.room_id), OutboxEvent.atomic():
+                self.save(force_insert=True, validate=False)
+                if self.hold_expires_at is None:
+                    OutboxEvent.emit("booking.created", [self.event()])
+                if nested:
+                    with connection.cursor() as cursor:
+                        cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+                        cursor.execute("SET CONSTRAINTS ALL DEFERRED")
+        except (IntegrityError, OperationalError) as e:
+            error = self.insert_error(e)
+            if error is None:
+                raise
+            raise error
+
+    @classmethod
+    async def ainsert(cls, **fields):
+        """
+        insert() for async views, through the async ORM. Room locks and outbox
+        events need a transaction, which Django only offers to sync code, so
+        with a BOOKING_LOCK_STRATEGY or BOOKING_OUTBOX the sync insert() runs
+        in a worker thread instead.
+        """
+        if settings.BOOKING_LOCK_STRATEGY != "none" or settings.BOOKING_OUTBOX:
+            booking = cls(**fields)
+            await sync_to_async(booking.insert)()
+            return booking
+        try:
+            return await cls.objects.acreate(**fields)
+        except (IntegrityError, OperationalError) as e:
+            error = cls.insert_error(e)
+            if error is None:
+                raise
+            raise error
+
+    @classmethod
+    def insert_error(cls, error):
+        """
+        The ValidationError to report for an IntegrityError or OperationalError
+        raised by an INSERT, or None when it is not about the room or the dates.
+        """
+        if cls.is_overlap_violation(error):
+            metrics.booking_conflicts.inc(reason="overlap")
+            return ValidationError(_("Room is already booked for the given dates."))
+        if cls.is_foreign_key_violation(error):
+            return ValidationError({"room": _("Room does not exist.")})
+        return None
+
     @classmethod
     def create_booking(cls, user, room, start_at, end_at):
         """
-        booking with validation for overlapping bookings and date constraints,
-        using SELECT ... FOR UPDATE to prevent race conditions.
+        booking with validation for date constraints. Overlapping bookings are
+        rejected by the database exclusion constraint; concurrent writers of the
+        room are serialized by the BOOKING_LOCK_STRATEGY lock, if any.
         """
         # Validate dates
         if start_at >= end_at:
@@ -86,25 +277,154 @@ class Booking(models.Model):
         if start_at < now():
             raise ValidationError(_("Start date cannot be in the past."))
 
-        # Start atomic transaction
-        with transaction.atomic():
-            # Lock the room's existing bookings using SELECT ... FOR UPDATE
-            overlapping_bookings = cls.objects.filter(
-                room=room,
-                start_at__lt=end_at,
-                end_at__gt=start_at
-            ).select_for_update()
-
-            if overlapping_bookings.exists():
+        booking = cls(user=user, room=room, start_at=start_at, end_at=end_at)
+        booking.insert()
+        return booking
+
+    @classmethod
+    def create_bookings(cls, user, items, all_or_nothing=True):
+        """
+        Create many already validated bookings ({room_id, start_at, end_at} dicts)
+        with a fixed number of queries: one for the rooms, one for the existing
+        overlaps of the whole batch and one bulk INSERT.
+        Returns, per item, either the created Booking or an error message.
+        In all-or-nothing mode nothing is inserted unless every item succeeds,
+        and a busy room raises RoomBusy; otherwise only its items fail.
+        """
+        results = [None] * len(items)
+        existing_rooms = set(
+            Room.objects.filter(id__in={item["room_id"] for item in items}).values_list("id", flat=True)
+        )
+        for index, item in enumerate(items):
+            if item["room_id"] not in existing_rooms:
+                results[index] = _("Room does not exist.")
+
+        # Every booking that overlaps any item, fetched in one index-backed query
+        occupied = defaultdict(list)
+        candidates = [Q(room_id=item["room_id"], period__overlap=DateTimeTZRange(item["start_at"], item["end_at"]))
+                      for index, item in enumerate(items) if results[index] is None]
+        if candidates:
+            for room_id, start_at, end_at in (cls.objects.filter(reduce(operator.or_, candidates))
+                                              .values_list("room_id", "start_at", "end_at")):
+                occupied[room_id].append((start_at, end_at))
+        for intervals in occupied.values():
+            intervals.sort()
+
+        # Earlier items of the batch win over later ones for the same slot
+        accepted = []
+        for index, item in enumerate(items):
+            if results[index] is not None:
+                continue
+            intervals = occupied[item["room_id"]]
+            if overlaps_any(intervals, item["start_at"], item["end_at"]):
+                metrics.booking_conflicts.inc(reason="overlap")
+                results[index] = _("Room is already booked for the given dates.")
+                continue
+            insort(intervals, (item["start_at"], item["end_at"]))
+            accepted.append(index)
+
+        if all_or_nothing and len(accepted) != len(items):
+            return results
+
+        bookings = [cls(user=user, **items[index]) for index in accepted]
+        errors = {}
+
+        def insert_each():
+            # Every item commits on its own, so each one's outcome is final
+            for index, booking in zip(accepted, bookings):
+                try:
+                    booking.insert()
+                except ValidationError as e:
+                    errors[index] = e.messages[0]
+                except RoomBusy:
+                    errors[index] = _("Room is busy, please retry.")
+
+        try:
+            with room_lock(*(booking.room_id for booking in bookings)), OutboxEvent.atomic():
+                cls.objects.bulk_create(bookings)
+                OutboxEvent.emit("booking.created", [booking.event() for booking in bookings])
+            # bulk_create sends no post_save signals
+            cls.written_on_commit((b.room_id, b.start_at, b.end_at) for b in bookings)
+        except (IntegrityError, OperationalError) as e:
+            # A concurrent request took one of the slots after our check
+            if not cls.is_overlap_violation(e):
+                raise
+            if all_or_nothing:
                 raise ValidationError(_("Room is already booked for the given dates."))
+            insert_each()
+        except RoomBusy:
+            # Another writer holds one of the rooms; the others may still be booked
+            if all_or_nothing:
+                raise
+            insert_each()
+        for index, booking in zip(accepted, bookings):
+            results[index] = errors.get(index, booking)
+        return results
+
+    @classmethod
+    def create_group(cls, user, hotel_id, start_at, end_at, room_ids=None, count=None):
+        """
+        Book several rooms of one hotel for the same already validated dates,
+        all or nothing: the rooms in room_ids, or any `count` rooms free for
+        the whole period. The rooms are locked in id order (see lock_rooms),
+        so concurrent groups can neither deadlock nor take the same room; one
+        query finds the overlaps of all of them and one INSERT creates the
+        bookings. Returns the bookings in room order. Raises ValidationError,
+        or RoomBusy when the given rooms stay locked for too long.
+        """
+        rooms = Room.objects.filter(hotel_id=hotel_id)
+
+        def busy(room_ids):
+            return set(cls.objects.filter(room_id__in=room_ids, period__overlap=DateTimeTZRange(start_at, end_at))
+                       .values_list("room_id", flat=True))
+
+        with transaction.atomic():
+            if room_ids is not None:
+                free = lock_rooms(rooms.filter(pk__in=room_ids))
+                missing = sorted(set(room_ids) - set(free))
+                if missing:
+                    raise ValidationError({
+                        "rooms": _("Rooms %s do not exist in this hotel.") % ", ".join(map(str, missing)),
+                    })
+                taken = sorted(busy(free))
+                if taken:
+                    metrics.booking_conflicts.inc(len(taken), reason="overlap")
+                    raise ValidationError(
+                        _("Rooms %s are already booked for the given dates.") % ", ".join(map(str, taken))
+                    )
+            else:
+                free, tried = [], []
+                # Rooms another group is taking are skipped rather than waited for, and rooms
+                # booked since the search started are dropped once locked; look further until done
+                while len(free) < count:
+                    locked = lock_rooms(rooms.available(start_at, end_at).exclude(pk__in=tried),
+                                        limit=count - len(free), skip_locked=True)
+                    if not locked:
+                        break
+                    tried += locked
+                    taken = busy(locked)
+                    free += [room_id for room_id in locked if room_id not in taken]
+                if len(free) < count:
+                    raise ValidationError(_("Only %(free)d rooms of the hotel are free for the given dates.")
+                                          % {"free": len(free)})
+                free.sort()
 
-            # Create the booking after validations and locks
-            return cls.objects.create(user=user, room=room, start_at=start_at, end_at=end_at)
+            bookings = [cls(user=user, room_id=room_id, start_at=start_at, end_at=end_at) for room_id in free]
+            try:
+                cls.objects.bulk_create(bookings)
+            except (IntegrityError, OperationalError) as e:
+                # A single booking, which takes no room lock by default, won the race for a slot
+                if not cls.is_overlap_violation(e):
+                    raise
+                raise cls.overlap_error()
+            OutboxEvent.emit("booking.created", [booking.event() for booking in bookings])
+            cls.written_on_commit((room_id, start_at, end_at) for room_id in free)
+        return bookings
 
     def update_booking(self, start_at, end_at):
         """
-        Update an existing booking with validation for overlapping bookings and date constraints,
-        using SELECT ... FOR UPDATE to prevent race conditions.
+        Move this booking to [start_at, end_at) with reschedule(), provided
+        nobody changed it since it was loaded.
         """
         # Validate dates
         if start_at >= end_at:
@@ -113,32 +433,202 @@ class Booking(models.Model):
         if start_at < now():
             raise ValidationError(_("Start date cannot be in the past."))
 
-        with transaction.atomic():
-            # Lock overlapping bookings for the same room (excluding the current booking)
-            overlapping_bookings = Booking.objects.filter(
-                room=self.room,
-                start_at__lt=end_at,
-                end_at__gt=start_at
-            ).exclude(id=self.id).select_for_update()
-
-            if overlapping_bookings.exists():
-                raise ValidationError(_("Room is already booked for the given dates."))
+        self.version = self.reschedule(self.user_id, self.pk, self.version, start_at, end_at)
+        self.start_at = start_at
+        self.end_at = end_at
+
+    @classmethod
+    def reschedule(cls, user, booking_id, version, start_at, end_at):
+        """
+        Move one of the user's confirmed, not yet started bookings to the
+        already validated [start_at, end_at), if it is still at `version`,
+        and return its new version. A single UPDATE compares the version,
+        skips overlapping periods and bumps the version, so nothing is read
+        or locked beforehand and no room lock is taken; the exclusion
+        constraint still settles races with concurrent writers of the room.
+        Raises Booking.DoesNotExist, StaleVersion or ValidationError.
+        """
+        table = cls._meta.db_table
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                # previous is the row as it was before this UPDATE
+                cursor.execute(
+                    f"""
+                    UPDATE {table} AS booking SET start_at = %s, end_at = %s, version = booking.version + 1
+                    FROM {table} AS previous
+                    WHERE booking.id = %s AND previous.id = booking.id AND booking.user_id = %s
+                        AND booking.version = %s AND booking.hold_expires_at IS NULL
+                        AND booking.start_at > statement_timestamp()
+                        AND NOT EXISTS (
+                            SELECT 1 FROM {table} AS other
+                            WHERE other.room_id = booking.room_id AND other.id <> booking.id
+                                AND other.period && tstzrange(%s, %s)
+                        )
+                    RETURNING booking.room_id, previous.start_at, previous.end_at, booking.version
+                    """,
+                    [start_at, end_at, booking_id, getattr(user, "pk", user), version, start_at, end_at],
+                )
+                row = cursor.fetchone()
+                if row is not None:
+                    room_id, previous_start_at, previous_end_at, new_version = row
+                    OutboxEvent.emit("booking.rescheduled", [{
+                        "booking_id": booking_id, "user_id": getattr(user, "pk", user), "room_id": room_id,
+                        "start_at": start_at, "end_at": end_at, "version": new_version,
+                        "previous_start_at": previous_start_at, "previous_end_at": previous_end_at,
+                    }])
+                    cls.written_on_commit([(room_id, previous_start_at, previous_end_at), (room_id, start_at, end_at)])
+        except (IntegrityError, OperationalError) as e:
+            # A concurrent writer took the slot after the guard looked
+            if not cls.is_overlap_violation(e):
+                raise
+            raise cls.overlap_error()
+
+        if row is None:
+            raise cls.refusal(user, booking_id, version) or cls.overlap_error()
+        return new_version
+
+    @classmethod
+    def cancel(cls, user, booking_id, version):
+        """
+        Delete one of the user's confirmed, not yet started bookings, if it is
+        still at `version`, with a single DELETE. Raises like reschedule().
+        """
+        table = cls._meta.db_table
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                DELETE FROM {table}
+                WHERE id = %s AND user_id = %s AND version = %s AND hold_expires_at IS NULL
+                    AND start_at > statement_timestamp()
+                RETURNING room_id, start_at, end_at
+                """,
+                [booking_id, getattr(user, "pk", user), version],
+            )
+            row = cursor.fetchone()
+            if row is not None:
+                room_id, start_at, end_at = row
+                OutboxEvent.emit("booking.cancelled", [{
+                    "booking_id": booking_id, "user_id": getattr(user, "pk", user), "room_id": room_id,
+                    "start_at": start_at, "end_at": end_at,
+                }])
+                cls.written_on_commit([row])
+
+        if row is None:
+            # Versions only grow, so a booking that still matches was changed and changed back in between
+            raise cls.refusal(user, booking_id, version) or StaleVersion(version)
+
+    @classmethod
+    def refusal(cls, user, booking_id, version):
+        """
+        The error to raise when a write of the user's booking at `version`
+        matched no row for any reason but an overlap, or None.
+        """
+        current = (cls.objects.confirmed().filter(pk=booking_id, user=user)
+                   .values_list("version", "start_at").first())
+        if current is None:
+            return cls.DoesNotExist("Booking does not exist.")
+        if current[0] != version:
+            return StaleVersion(current[0])
+        if current[1] <= now():
+            return ValidationError(_("Bookings that already started cannot be changed."))
+        return None
+
+    @staticmethod
+    def overlap_error():
+        metrics.booking_conflicts.inc(reason="overlap")
+        return ValidationError(_("Room is already booked for the given dates."))
+
+    @staticmethod
+    def written_on_commit(intervals):
+        """
+        What the post_save and post_delete signals do, for writes that bypass
+        them: once the transaction commits, drop the rooms of the written
+        (room_id, start_at, end_at) intervals from the availability cache and
+        refresh their calendar.
+        """
+        intervals = list(intervals)
+        rooms = {room_id for room_id, _, _ in intervals}
+        if settings.BOOKING_AVAILABILITY_CACHE and rooms:
+            transaction.on_commit(lambda: availability_cache.invalidate(*rooms))
+        RoomAvailability.refresh_on_commit(intervals)
+
+    @classmethod
+    def confirm_hold(cls, user, hold_id):
+        """
+        Turn the user's unexpired hold into a booking with a single UPDATE,
+        and return whether the booking is confirmed. Confirming twice
+        succeeds, so clients can retry.
+        """
+        with OutboxEvent.atomic():
+            confirmed = cls.objects.filter(pk=hold_id, user=user, hold_expires_at__gt=Now()).update(hold_expires_at=None)
+            if confirmed and settings.BOOKING_OUTBOX:
+                OutboxEvent.emit("booking.created", [booking.event() for booking in cls.objects.filter(pk=hold_id)])
+        if confirmed:
+            metrics.holds.inc(outcome="confirmed")
+            return True
+        return cls.objects.confirmed().filter(pk=hold_id, user=user).exists()
+
+    @classmethod
+    def release_hold(cls, user, hold_id):
+        """
+        Give the slot of the user's hold back, and return whether there was one.
+        """
+        deleted, _ = cls.objects.filter(pk=hold_id, user=user, hold_expires_at__isnull=False).delete()
+        if deleted:
+            metrics.holds.inc(outcome="released")
+        return bool(deleted)
 
-            # Update the booking
-            self.start_at = start_at
-            self.end_at = end_at
-            self.save()
+    @classmethod
+    def sweep_expired_holds(cls, batch_size=1000):
+        """
+        Delete up to batch_size expired holds in one statement and return how
+        many were deleted. Holds being confirmed or released concurrently are
+        skipped, and confirming waits for this statement instead of racing it.
+        """
+        table = cls._meta.db_table
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                DELETE FROM {table} WHERE id IN (
+                    SELECT id FROM {table} WHERE hold_expires_at <= statement_timestamp()
+                    ORDER BY hold_expires_at LIMIT %s FOR UPDATE SKIP LOCKED
+                )
+                RETURNING room_id, start_at, end_at
+                """,
+                [batch_size],
+            )
+            swept = cursor.fetchall()
+            deleted = cursor.rowcount
+            # A raw DELETE sends no post_delete signals
+            cls.written_on_commit(swept)
+        metrics.holds.inc(deleted, outcome="expired")
+        return deleted
 
     @staticmethod
     def is_room_available(room, start_at, end_at):
         """
         Check if a room is available for a given date range.
+        Answered from the in-process interval cache when it is enabled.
+        """
+        if settings.BOOKING_AVAILABILITY_CACHE:
+            available = availability_cache.is_available(getattr(room, "pk", room), start_at, end_at)
+            if available is not None:
+                return available
+        return not Booking.objects.overlapping(room, start_at, end_at).exists()
+
+    @staticmethod
+    async def ais_room_available(room, start_at, end_at):
+        """
+        is_room_available() for async views. A cache miss loads the room's
+        bookings with the sync ORM, so the cache is consulted in a worker thread.
         """
-        return not Booking.objects.filter(
-            room=room,
-            start_at__lt=end_at,
-            end_at__gt=start_at
-        ).exists()
+        if settings.BOOKING_AVAILABILITY_CACHE:
+            available = await sync_to_async(availability_cache.is_available)(
+                getattr(room, "pk", room), start_at, end_at
+            )
+            if available is not None:
+                return available
+        return not await Booking.objects.overlapping(room, start_at, end_at).aexists()
 
     @staticmethod
     def sample_utility_check(name: str) -> bool:
@@ -153,10 +643,351 @@ class Booking(models.Model):
         """
         Debugging utility to check for overlapping bookings.
         """
-        overlaps = Booking.objects.filter(
-            room=room,
-            start_at__lt=end_at,
-            end_at__gt=start_at
+        if Booking.is_room_available(room, start_at, end_at):
+            logger.debug("Overlapping bookings: none")
+            return False
+        logger.debug("Overlapping bookings: %s", Booking.objects.overlapping(room, start_at, end_at))
+        return True
+
+
+class ArchivedBooking(models.Model):
+    """
+    A past booking moved out of the live Booking table by archive_bookings.
+    It keeps its id, so history pages can mix both tables on (start_at, id).
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE, verbose_name=_("User"))
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, verbose_name=_("Room"))
+    start_at = models.DateTimeField(verbose_name=_("Start Date"))
+    end_at = models.DateTimeField(verbose_name=_("End Date"))
+    archived_at = models.DateTimeField(default=now, verbose_name=_("Archived At"))
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "start_at", "id"], name="archived_user_start_id_idx"),
+            models.Index(fields=["room", "start_at", "id"], name="archived_room_start_id_idx"),
+        ]
+        verbose_name = _("Archived Booking")
+        verbose_name_plural = _("Archived Bookings")
+
+    def __str__(self):
+        return f"Archived booking by {self.user.username} for {self.room} from {self.start_at} to {self.end_at}"
+
+    @classmethod
+    def archive_batch(cls, before, batch_size=5000):
+        """
+        Move up to batch_size bookings that ended before `before` into the
+        archive in one statement, and return how many were moved. Rows locked
+        by a concurrent update are skipped until the next batch.
+        """
+        live, archive = Booking._meta.db_table, cls._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                WITH moved AS (
+                    DELETE FROM {live} WHERE id IN (
+                        SELECT id FROM {live} WHERE end_at < %s AND hold_expires_at IS NULL
+                        ORDER BY end_at LIMIT %s FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING id, user_id, room_id, start_at, end_at
+                )
+                INSERT INTO {archive} (id, user_id, room_id, start_at, end_at, archived_at)
+                SELECT id, user_id, room_id, start_at, end_at, now() FROM moved
+                """,
+                [before, batch_size],
+            )
+            return cursor.rowcount
+
+
+class ImportRun(models.Model):
+    """
+    Progress of one import_inventory source, saved with every batch so an
+    interrupted import resumes after the last committed one.
+    """
+    name = models.CharField(max_length=255, unique=True, verbose_name=_("Source"))
+    # Records of the source already imported or rejected
+    position = models.BigIntegerField(default=0, verbose_name=_("Position"))
+    # The source's hotel keys to Hotel ids
+    hotel_keys = models.JSONField(default=dict, verbose_name=_("Hotel Keys"))
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Updated At"))
+
+    def __str__(self):
+        return f"Import of {self.name} at record {self.position}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    The response to a POST /booking/ sent with an Idempotency-Key header,
+    replayed to retries with the same key until expires_at.
+    """
+    user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE, verbose_name=_("User"))
+    key = models.CharField(max_length=255, verbose_name=_("Key"))
+    # SHA-256 of the request body, so a key cannot be reused for another request
+    fingerprint = models.CharField(max_length=64, verbose_name=_("Fingerprint"))
+    # Empty while the first request is still running
+    status_code = models.PositiveSmallIntegerField(null=True, verbose_name=_("Status Code"))
+    # Encoded like the API renders it, so that a replay matches the first response exactly
+    response = models.JSONField(null=True, encoder=JSONEncoder, verbose_name=_("Response"))
+    expires_at = models.DateTimeField(db_index=True, verbose_name=_("Expires At"))
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "key"], name="unique_idempotency_key_per_user"),
+        ]
+
+    def __str__(self):
+        return f"Idempotency key {self.key} of user {self.user_id}"
+
+    @classmethod
+    def claim(cls, user_id, key, fingerprint, expires_at):
+        """
+        Insert the key, or take over an expired one, and return its id; None
+        when a live row exists. Must run in the transaction that handles the
+        request: a concurrent claim of the same key waits on the unique index
+        until that transaction ends.
+        """
+        table = cls._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {table} (user_id, key, fingerprint, expires_at)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (user_id, key) DO UPDATE SET
+                    fingerprint = EXCLUDED.fingerprint, status_code = NULL, response = NULL,
+                    expires_at = EXCLUDED.expires_at
+                WHERE {table}.expires_at <= statement_timestamp()
+                RETURNING id
+                """,
+                [user_id, key, fingerprint, expires_at],
+            )
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+
+class RoomAvailability(models.Model):
+    """
+    Which slots of one UTC calendar month a room has taken, one bit per
+    BOOKING_CALENDAR_SLOT_MINUTES slot, derived from the room's live and
+    archived bookings (holds included). Kept up to date after every booking
+    write while BOOKING_CALENDAR is on; rebuild_calendar recomputes it.
+    """
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name="availability", verbose_name=_("Room"))
+    # First day of the month
+    month = models.DateField(verbose_name=_("Month"))
+    occupied = models.BinaryField(verbose_name=_("Occupied Slots"))
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["room", "month"], name="room_availability_room_month_uniq"),
+        ]
+        verbose_name = _("Room Availability")
+        verbose_name_plural = _("Room Availability")
+
+    def __str__(self):
+        return f"Availability of {self.room_id} in {self.month:%Y-%m}"
+
+    @classmethod
+    def refresh_on_commit(cls, intervals):
+        """
+        Refresh every month the (room_id, start_at, end_at) intervals touch
+        once the current transaction commits, when BOOKING_CALENDAR is on.
+        """
+        if not settings.BOOKING_CALENDAR:
+            return
+        pairs = {(room_id, month) for room_id, start_at, end_at in intervals for month in month_starts(start_at, end_at)}
+        if pairs:
+            # The bookings are committed either way; rebuild_calendar repairs a failed refresh
+            transaction.on_commit(lambda: cls.refresh(pairs), robust=True)
+
+    @classmethod
+    def refresh(cls, pairs):
+        """
+        Recompute the bitmaps of the given (room_id, month start) pairs from
+        the rooms' bookings. The rows are locked, in a fixed order, before the
+        bookings are read, so whichever refresh of a room-month runs last sees
+        every booking committed before it.
+        """
+        pairs = sorted(set(pairs))
+        if not pairs:
+            return
+        slot = settings.BOOKING_CALENDAR_SLOT_MINUTES * 60
+        table = cls._meta.db_table
+        room_ids = sorted({room_id for room_id, _ in pairs})
+        months = [month for _, month in pairs]
+        span = DateTimeTZRange(min(months), next_month(max(months)))
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"""
+                    INSERT INTO {table} (room_id, month, occupied)
+                    SELECT room_id, month, ''::bytea FROM unnest(%s::bigint[], %s::date[]) AS pair(room_id, month)
+                    ON CONFLICT (room_id, month) DO UPDATE SET occupied = {table}.occupied
+                    """,
+                    [[room_id for room_id, _ in pairs], [month.date() for month in months]],
+                )
+
+            intervals = defaultdict(list)
+            for queryset in (Booking.objects.filter(period__overlap=span),
+                             ArchivedBooking.objects.filter(start_at__lt=span.upper, end_at__gt=span.lower)):
+                for room_id, start_at, end_at in (queryset.filter(room_id__in=room_ids)
+                                                  .values_list("room_id", "start_at", "end_at")):
+                    intervals[room_id].append((int(start_at.timestamp()), int(end_at.timestamp())))
+
+            # pairs are sorted, so each room's months come together and in order
+            bitmaps = []
+            for room_id, room_pairs in groupby(pairs, key=operator.itemgetter(0)):
+                bitmaps.extend(room_bitmaps([month for _, month in room_pairs], slot, intervals[room_id]))
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"""
+                    UPDATE {table} SET occupied = bitmap.occupied
+                    FROM unnest(%s::bigint[], %s::date[], %s::bytea[]) AS bitmap(room_id, month, occupied)
+                    WHERE {table}.room_id = bitmap.room_id AND {table}.month = bitmap.month
+                    """,
+                    [[room_id for room_id, _ in pairs], [month.date() for month in months], bitmaps],
+                )
+
+    @classmethod
+    def hotel_calendar(cls, hotel_id, start_at, end_at):
+        """
+        Per room of the hotel, which slots of [start_at, end_at), widened to
+        whole slots, are free, and which rooms are free for all of them.
+        Two queries: the rooms, and their bitmaps of the months involved.
+        """
+        slot = settings.BOOKING_CALENDAR_SLOT_MINUTES * 60
+        months = month_starts(start_at, end_at)
+        room_ids = list(Room.objects.filter(hotel_id=hotel_id).order_by("id").values_list("id", flat=True))
+        bitmaps = cls.objects.filter(
+            room__hotel_id=hotel_id, month__in=[month.date() for month in months]
+        ).values_list("room_id", "month", "occupied")
+        occupied = occupancy_matrix(room_ids, months, slot, bitmaps)
+
+        origin = months[0].timestamp()
+        first = int((start_at.timestamp() - origin) // slot)
+        last = -int((origin - end_at.timestamp()) // slot)
+        free = ~occupied[:, first:last]
+        return {
+            "slot_minutes": settings.BOOKING_CALENDAR_SLOT_MINUTES,
+            "start": months[0] + timedelta(seconds=first * slot),
+            "end": months[0] + timedelta(seconds=last * slot),
+            "free_rooms": [room_id for room_id, all_free in zip(room_ids, free.all(axis=1)) if all_free],
+            "rooms": [{"room": room_id, "free": slots} for room_id, slots in zip(room_ids, slot_strings(free))],
+        }
+
+
+class OutboxEvent(models.Model):
+    """
+    Something that happened to a booking, recorded in the transaction of the
+    write itself and handed to the BOOKING_OUTBOX_HANDLERS by
+    run_outbox_worker. Handled events are deleted; events still failing after
+    BOOKING_OUTBOX_MAX_ATTEMPTS tries are kept with failed_at set.
+    """
+    topic = models.CharField(max_length=64, verbose_name=_("Topic"))
+    payload = models.JSONField(encoder=DjangoJSONEncoder, verbose_name=_("Payload"))
+    created_at = models.DateTimeField(default=now, verbose_name=_("Created At"))
+    # Not handed out before then: claimed events are leased, failed ones back off
+    available_at = models.DateTimeField(default=now, verbose_name=_("Available At"))
+    attempts = models.PositiveIntegerField(default=0, verbose_name=_("Attempts"))
+    last_error = models.TextField(blank=True, verbose_name=_("Last Error"))
+    failed_at = models.DateTimeField(null=True, blank=True, verbose_name=_("Failed At"))
+
+    class Meta:
+        indexes = [
+            # Claims of run_outbox_worker
+            models.Index(fields=["available_at", "id"], name="outbox_pending_idx", condition=Q(failed_at__isnull=True)),
+        ]
+        verbose_name = _("Outbox Event")
+        verbose_name_plural = _("Outbox Events")
+
+    def __str__(self):
+        return f"Outbox event {self.id} ({self.topic})"
+
+    @staticmethod
+    def atomic():
+        """
+        The transaction a booking write needs for its events to commit with it,
+        when BOOKING_OUTBOX is on and the write does not run in one already.
+        """
+        if settings.BOOKING_OUTBOX and not transaction.get_connection().in_atomic_block:
+            return transaction.atomic()
+        return nullcontext()
+
+    @classmethod
+    def emit(cls, topic, payloads):
+        """
+        Record one event per payload with a single INSERT, when BOOKING_OUTBOX
+        is on. Call it inside the transaction of the write.
+        """
+        if settings.BOOKING_OUTBOX and payloads:
+            cls.objects.bulk_create(cls(topic=topic, payload=payload) for payload in payloads)
+
+    @classmethod
+    def claim(cls, batch_size, lease):
+        """
+        Lease up to batch_size due events, oldest first, for `lease` seconds
+        and return them, counting the attempt. Events other workers are
+        claiming are skipped rather than waited for. The lease commits right
+        away, so handlers never run inside a long transaction, and the events
+        of a worker that dies come due again when it expires.
+        """
+        table = cls._meta.db_table
+        events = cls.objects.raw(
+            f"""
+            UPDATE {table}
+            SET available_at = statement_timestamp() + make_interval(secs => %s), attempts = attempts + 1
+            WHERE id IN (
+                SELECT id FROM {table}
+                WHERE failed_at IS NULL AND available_at <= statement_timestamp()
+                ORDER BY available_at, id LIMIT %s FOR UPDATE SKIP LOCKED
+            )
+            RETURNING *
+            """,
+            [lease, batch_size],
         )
-        print("Overlapping bookings:", overlaps)
-        return overlaps.exists()
+        return sorted(events, key=operator.attrgetter("id"))
+
+    @classmethod
+    def settle(cls, events, errors):
+        """
+        Delete the handled events and schedule the ones in errors ({id:
+        message}) again, backing off exponentially, or give up on them after
+        BOOKING_OUTBOX_MAX_ATTEMPTS tries.
+        """
+        handled = [event.id for event in events if event.id not in errors]
+        with transaction.atomic():
+            if handled:
+                cls.objects.filter(id__in=handled).delete()
+            for event in events:
+                if event.id not in errors:
+                    continue
+                pending = cls.objects.filter(id=event.id)
+                if event.attempts >= settings.BOOKING_OUTBOX_MAX_ATTEMPTS:
+                    pending.update(failed_at=Now(), last_error=errors[event.id])
+                    metrics.outbox_events.inc(outcome="failed")
+                else:
+                    delay = min(settings.BOOKING_OUTBOX_RETRY_BASE * 2 ** (event.attempts - 1),
+                                settings.BOOKING_OUTBOX_RETRY_MAX)
+                    pending.update(available_at=Now() + timedelta(seconds=delay), last_error=errors[event.id])
+                    metrics.outbox_events.inc(outcome="retried")
+        metrics.outbox_events.inc(len(handled), outcome="handled")
+
+
+availability_cache = RoomIntervalCache(
+    load_intervals=lambda room_id, horizon: list(
+        Booking.objects.filter(room_id=room_id, end_at__gt=horizon)
+        .order_by("start_at")
+        .values_list("start_at", "end_at")
+    ),
+    max_rooms=settings.BOOKING_AVAILABILITY_CACHE_ROOMS,
+    max_staleness=settings.BOOKING_AVAILABILITY_CACHE_STALENESS,
+)
+
+metrics.registry.register(metrics.CallbackGauge(
+    "booking_availability_cache_rooms", "Rooms held by the availability cache.",
+    lambda: availability_cache.stats()["size"],
+))
+for _counter in ("hits", "misses", "evictions", "invalidations"):
+    metrics.registry.register(metrics.CallbackGauge(
+        f"booking_availability_cache_{_counter}_total", f"Availability cache {_counter}.",
+        lambda counter=_counter: availability_cache.stats()[counter], type="counter",
+    ))
@@ -0,0 +1,61 @@
+"""
+Side effects of booking writes, run by run_outbox_worker instead of the
+request. Every callable listed in BOOKING_OUTBOX_HANDLERS is handed each
+claimed batch of OutboxEvents (topic, payload), so it can do its work once
+per batch. Delivery is at least once: a failed event is handed to every
+handler again on retry, so handlers must tolerate seeing an event twice.
+"""
+import logging
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+
+def get_handlers():
+    return [import_string(path) for path in settings.BOOKING_OUTBOX_HANDLERS]
+
+
+def dispatch(events, handlers):
+    """
+    Hand the events to every handler and return {event id: error} for those
+    that failed. A handler failing on the whole batch is given its events
+    one at a time, so a single bad event does not hold back the others.
+    """
+    errors = {}
+    for handler in handlers:
+        try:
+            handler(events)
+        except Exception as e:
+            if len(events) == 1:
+                logger.exception("Outbox handler %s failed on event %s.", handler.__name__, events[0].id)
+                errors.setdefault(events[0].id, f"{handler.__name__}: {e!r}")
+                continue
+            logger.warning("Outbox handler %s failed on a batch of %d events, retrying them one by one.",
+                           handler.__name__, len(events))
+            for event in events:
+                for event_id, error in dispatch([event], [handler]).items():
+                    errors.setdefault(event_id, error)
+    return errors
+
+
+def process_batch(batch_size, lease=None, handlers=None):
+    """
+    Claim, dispatch and settle one batch of due events, and return how many
+    were claimed.
+    """
+    events = OutboxEvent.claim(batch_size, settings.BOOKING_OUTBOX_LEASE if lease is None else lease)
+    if events:
+        OutboxEvent.settle(events, dispatch(events, get_handlers() if handlers is None else handlers))
+    return len(events)
+
+
+def log_events(events):
+    """
+    The default handler: one log line per event.
+    """
+    for event in events:
+        logger.info("Booking event %s: %s", event.topic, event.payload)
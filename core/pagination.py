@@ -0,0 +1,101 @@
+import binascii
+from base64 import b64decode, b64encode
+from datetime import datetime
+from heapq import merge
+from itertools import islice
+
+from django.contrib.postgres.expressions import ArraySubquery
+from django.db.models import Func, OuterRef, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, CursorPagination
+from rest_framework.utils.urls import replace_query_param
+
+
+class RoomCursorPagination(CursorPagination):
+    """
+    Keyset pagination over room ids: no COUNT query and no OFFSET scan,
+    so every page costs the same for hotels with thousands of rooms.
+    """
+    ordering = 'id'
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+
+class BookingKeysetPagination(BasePagination):
+    """
+    Keyset pagination on (start_at, id), newest first. The cursor carries the
+    last row's key, so a page is one index range scan whatever its depth.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+    # Optional (field, queryset): rows are only indexed on (field, start_at, id),
+    # e.g. a hotel's bookings by room, and the queryset lists the field's values
+    partitions = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """
+        queryset may also be a list of querysets (e.g. live and archived
+        bookings with disjoint ids): each is scanned for one page and the
+        pages are merged.
+        """
+        self.request = request
+        querysets = queryset if isinstance(queryset, (list, tuple)) else [queryset]
+        cursor = self.decode_cursor(request)
+        page_size = self.get_page_size(request)
+
+        pages = []
+        for queryset in querysets:
+            queryset = queryset.order_by('-start_at', '-id')
+            if cursor is not None:
+                start_at, pk = cursor
+                # The redundant start_at bound lets the index range scan start at the cursor
+                queryset = queryset.filter(
+                    Q(start_at__lt=start_at) | Q(start_at=start_at, id__lt=pk), start_at__lte=start_at
+                )
+            if self.partitions is not None:
+                queryset = queryset.filter(pk__in=self.partition_heads(queryset, page_size + 1))
+            pages.append(queryset[:page_size + 1])
+
+        page = list(pages[0]) if len(pages) == 1 else list(
+            islice(merge(*pages, key=lambda row: (row.start_at, row.id), reverse=True), page_size + 1)
+        )
+        self.has_next = len(page) > page_size
+        page = page[:page_size]
+        self.next_position = (page[-1].start_at, page[-1].id) if self.has_next else None
+        return page
+
+    def partition_heads(self, queryset, limit):
+        """
+        The ids of the first `limit` rows of every partition, each read from
+        its own index range, which hold the first `limit` rows overall.
+        """
+        field, keys = self.partitions
+        head = queryset.filter(**{field: OuterRef('pk')}).values('id')[:limit]
+        return keys.values(head_id=Func(ArraySubquery(head), function='unnest'))
+
+    def get_page_size(self, request):
+        try:
+            return min(max(int(request.query_params[self.page_size_query_param]), 1), self.max_page_size)
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            start_at, pk = b64decode(encoded.encode('ascii')).decode('ascii').split('|')
+            return datetime.fromisoformat(start_at), int(pk)
+        except (TypeError, ValueError, UnicodeDecodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        start_at, pk = self.next_position
+        encoded = b64encode(f"{start_at.isoformat()}|{pk}".encode('ascii')).decode('ascii')
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, encoded)
@@ -1,23 +1,47 @@
 # apps/api/responses.py
 
+from django.http import JsonResponse
 from rest_framework.response import Response
-from .statuses import OK_200, BAD_REQUEST_400, INTERNAL_SERVER_ERROR_500
+from .statuses import (
+    OK_200, BAD_REQUEST_400, NOT_FOUND_404, CONFLICT_409, INTERNAL_SERVER_ERROR_500, UNPROCESSABLE_ENTITY_422,
+    TOO_MANY_REQUESTS_429,
+)
+
+def envelope(status_code: dict, data: dict or list = None, error=None):
+    return {
+        'detail': status_code.get('detail'),
+        'code': status_code.get('code', status_code.get('detail').replace(' ', '_')),
+        'error': error,
+        'data': data if data else {}
+    }
 
 def custom_response(status_code: dict = OK_200, data: dict or list = None, error=None):
-    return Response(
-        data={
-            'detail': status_code.get('detail'),
-            'code': status_code.get('code', status_code.get('detail').replace(' ', '_')),
-            'error': error,
-            'data': data if data else {}
-        },
-        status=status_code.get('number')
-    )
+    return Response(data=envelope(status_code, data, error), status=status_code.get('number'))
+
+def json_response(status_code: dict = OK_200, data: dict or list = None, error=None):
+    """The same envelope for plain (async) Django views, which have no DRF renderer."""
+    return JsonResponse(envelope(status_code, data, error), status=status_code.get('number'))
 
 def bad_request_response(error_message: str):
     """Return a standardized bad request response."""
     return custom_response(status_code=BAD_REQUEST_400, error=error_message)
 
+def not_found_response(error_message: str):
+    """Return a standardized not found response."""
+    return custom_response(status_code=NOT_FOUND_404, error=error_message)
+
+def conflict_response(error_message: str):
+    """Return a standardized conflict response."""
+    return custom_response(status_code=CONFLICT_409, error=error_message)
+
+def unprocessable_entity_response(error_message: str):
+    """Return a standardized unprocessable entity response."""
+    return custom_response(status_code=UNPROCESSABLE_ENTITY_422, error=error_message)
+
+def too_many_requests_response(error_message: str):
+    """Return a standardized too many requests response."""
+    return custom_response(status_code=TOO_MANY_REQUESTS_429, error=error_message)
+
 def internal_server_error_response(error_message: str):
     """Return a standardized internal server error response."""
     return custom_response(status_code=INTERNAL_SERVER_ERROR_500, error=error_message)
@@ -0,0 +1,78 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.core.cache import cache
+
+REPLICA_PREFIX = "replica_"
+LAST_WRITE_KEY = "booking:last-write:{}"
+
+_read_scope = ContextVar("replica_read_scope", default=None)
+
+
+def replicas():
+    return [alias for alias in settings.DATABASES if alias.startswith(REPLICA_PREFIX)]
+
+
+@contextmanager
+def replica_reads(pending_user=False):
+    """
+    Let the ORM reads of the block go to a replica, the same one throughout.
+    With pending_user, the choice waits for settle_reads() so that a user who
+    just wrote can be kept on the primary; reads before that (authentication
+    itself) may use any replica.
+    """
+    token = _read_scope.set(SimpleNamespace(alias=None, pending_user=pending_user))
+    try:
+        yield
+    finally:
+        _read_scope.reset(token)
+
+
+def settle_reads(user):
+    scope = _read_scope.get()
+    if scope is None or not scope.pending_user:
+        return
+    scope.pending_user = False
+    if user.is_authenticated and cache.get(LAST_WRITE_KEY.format(user.pk)):
+        scope.alias = "default"
+
+
+def record_write(user):
+    """
+    Keep the user's reads on the primary for BOOKING_READ_YOUR_WRITES_SECONDS.
+    """
+    if settings.BOOKING_READ_YOUR_WRITES_SECONDS and user.is_authenticated and replicas():
+        cache.set(LAST_WRITE_KEY.format(user.pk), True, settings.BOOKING_READ_YOUR_WRITES_SECONDS)
+
+
+class ReplicaRouter:
+    """
+    Reads inside replica_reads() go to a random replica unless the user wrote
+    recently. Everything else, and all writes, use the primary. Replicas are
+    never migrated; they follow the primary.
+    """
+    def db_for_read(self, model, **hints):
+        scope = _read_scope.get()
+        if scope is None:
+            return None
+        if scope.alias is None:
+            aliases = replicas()
+            if not aliases:
+                return None
+            if scope.pending_user:
+                return random.choice(aliases)
+            scope.alias = random.choice(aliases)
+        return scope.alias
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Every alias holds the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return not db.startswith(REPLICA_PREFIX)
@@ -1,5 +1,9 @@
 from rest_framework import serializers
-from .models import Booking
+from django.utils.timezone import now
+from .analytics import GRANULARITIES, MAX_BUCKETS, bucket_window
+from .bitmaps import MAX_CALENDAR_DAYS
+from .export import FORMATS
+from .models import Booking, Room
 
 class BookingSerializer(serializers.ModelSerializer):
     class Meta:
@@ -13,11 +17,173 @@ class BookingSerializer(serializers.ModelSerializer):
         end_at = attrs.get('end_at')
 
         # Check for overlapping bookings
-        if Booking.objects.filter(
-            room=room,
-            start_at__lt=end_at,
-            end_at__gt=start_at
-        ).exists():
+        if not Booking.is_room_available(room, start_at, end_at):
             raise serializers.ValidationError("Room is already booked for the given dates.")
 
         return attrs
+
+    def create(self, validated_data):
+        return Booking.create_booking(**validated_data)
+
+
+class FastBookingSerializer(serializers.ModelSerializer):
+    """
+    Create-only serializer that never touches the database while validating.
+    The room is taken as a raw id and the overlap check is left to the INSERT.
+    """
+    room = serializers.IntegerField(source='room_id', min_value=1)
+
+    class Meta:
+        model = Booking
+        fields = ['room', 'start_at', 'end_at']
+
+    def validate(self, attrs):
+        if attrs['start_at'] >= attrs['end_at']:
+            raise serializers.ValidationError("Start date must be before the end date.")
+
+        if attrs['start_at'] < now():
+            raise serializers.ValidationError("Start date cannot be in the past.")
+
+        return attrs
+
+    def create(self, validated_data):
+        booking = Booking(**validated_data)
+        booking.insert()
+        return booking
+
+
+class BookingVersionSerializer(serializers.Serializer):
+    version = serializers.IntegerField(min_value=1)
+
+
+class BookingUpdateSerializer(BookingVersionSerializer):
+    start_at = serializers.DateTimeField()
+    end_at = serializers.DateTimeField()
+
+    def validate(self, attrs):
+        if attrs['start_at'] >= attrs['end_at']:
+            raise serializers.ValidationError("Start date must be before the end date.")
+
+        if attrs['start_at'] < now():
+            raise serializers.ValidationError("Start date cannot be in the past.")
+
+        return attrs
+
+
+class AvailabilityQuerySerializer(serializers.Serializer):
+    start = serializers.DateTimeField()
+    end = serializers.DateTimeField()
+    location = serializers.CharField(required=False, max_length=200)
+
+    def validate(self, attrs):
+        if attrs['start'] >= attrs['end']:
+            raise serializers.ValidationError("Start date must be before the end date.")
+
+        return attrs
+
+
+class OccupancyQuerySerializer(serializers.Serializer):
+    start = serializers.DateTimeField()
+    end = serializers.DateTimeField()
+    granularity = serializers.ChoiceField(choices=sorted(GRANULARITIES), default='day')
+    matrix = serializers.BooleanField(default=False)
+
+    def validate(self, attrs):
+        if attrs['start'] >= attrs['end']:
+            raise serializers.ValidationError("Start date must be before the end date.")
+
+        if bucket_window(attrs['start'], attrs['end'], attrs['granularity'])[2] > MAX_BUCKETS:
+            raise serializers.ValidationError(f"At most {MAX_BUCKETS} buckets can be requested at once.")
+
+        return attrs
+
+
+class CalendarQuerySerializer(serializers.Serializer):
+    start = serializers.DateTimeField()
+    end = serializers.DateTimeField()
+
+    def validate(self, attrs):
+        if attrs['start'] >= attrs['end']:
+            raise serializers.ValidationError("Start date must be before the end date.")
+
+        if (attrs['end'] - attrs['start']).days >= MAX_CALENDAR_DAYS:
+            raise serializers.ValidationError(f"At most {MAX_CALENDAR_DAYS} days can be requested at once.")
+
+        return attrs
+
+
+class ExportQuerySerializer(serializers.Serializer):
+    # Not `format`, which DRF keeps for picking a renderer
+    output = serializers.ChoiceField(choices=FORMATS, default='csv')
+    gzip = serializers.BooleanField(default=False)
+    hotel = serializers.IntegerField(required=False, min_value=1)
+    start = serializers.DateTimeField(required=False)
+    end = serializers.DateTimeField(required=False)
+
+    def validate(self, attrs):
+        if 'start' in attrs and 'end' in attrs and attrs['start'] >= attrs['end']:
+            raise serializers.ValidationError("Start date must be before the end date.")
+
+        return attrs
+
+
+class AvailableRoomSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Room
+        fields = ['id', 'hotel', 'room_number']
+
+
+class BulkBookingSerializer(serializers.Serializer):
+    """
+    Envelope of a bulk request. Items are validated one by one with
+    FastBookingSerializer so that each can fail on its own.
+    """
+    MODE_ALL_OR_NOTHING = 'all_or_nothing'
+    MODE_PARTIAL = 'partial'
+
+    bookings = serializers.ListField(child=serializers.DictField(), allow_empty=False, max_length=1000)
+    mode = serializers.ChoiceField(choices=[MODE_ALL_OR_NOTHING, MODE_PARTIAL], default=MODE_ALL_OR_NOTHING)
+
+
+class GroupBookingSerializer(serializers.Serializer):
+    """
+    One hotel, one period, and either the rooms to book or how many.
+    """
+    MAX_ROOMS = 200
+
+    hotel = serializers.IntegerField(min_value=1)
+    start_at = serializers.DateTimeField()
+    end_at = serializers.DateTimeField()
+    rooms = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False,
+                                  allow_empty=False, max_length=MAX_ROOMS)
+    count = serializers.IntegerField(required=False, min_value=1, max_value=MAX_ROOMS)
+
+    def validate(self, attrs):
+        if ('rooms' in attrs) == ('count' in attrs):
+            raise serializers.ValidationError("Give either rooms or count.")
+
+        if len(set(attrs.get('rooms', ()))) != len(attrs.get('rooms', ())):
+            raise serializers.ValidationError({"rooms": ["Rooms must not repeat."]})
+
+        if attrs['start_at'] >= attrs['end_at']:
+            raise serializers.ValidationError("Start date must be before the end date.")
+
+        if attrs['start_at'] < now():
+            raise serializers.ValidationError("Start date cannot be in the past.")
+
+        return attrs
+
+
+class BookingHistorySerializer(serializers.ModelSerializer):
+    """
+    Expects the queryset to select_related('room__hotel').
+    """
+    room_number = serializers.CharField(source='room.room_number')
+    hotel = serializers.IntegerField(source='room.hotel_id')
+    hotel_name = serializers.CharField(source='room.hotel.name')
+    # Archived bookings can no longer change and have none
+    version = serializers.IntegerField(default=None, read_only=True)
+
+    class Meta:
+        model = Booking
+        fields = ['id', 'user', 'room', 'room_number', 'hotel', 'hotel_name', 'start_at', 'end_at', 'version']
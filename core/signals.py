@@ -0,0 +1,56 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from .authentication import user_cache
+from .middleware import record_query
+from .models import Booking, RoomAvailability, availability_cache
+
+
+@receiver([post_save, post_delete], sender=Booking)
+def invalidate_room_availability(sender, instance, **kwargs):
+    """
+    Drop the room from the availability cache once the write is visible to readers.
+    """
+    if settings.BOOKING_AVAILABILITY_CACHE:
+        transaction.on_commit(lambda: availability_cache.invalidate(instance.room_id))
+
+
+@receiver(pre_save, sender=Booking)
+def remember_previous_period(sender, instance, **kwargs):
+    """
+    The calendar has to be refreshed where an updated booking was, too.
+    """
+    if settings.BOOKING_CALENDAR and not instance._state.adding:
+        instance._previous_period = (
+            Booking.objects.filter(pk=instance.pk).values_list("room_id", "start_at", "end_at").first()
+        )
+
+
+@receiver([post_save, post_delete], sender=Booking)
+def refresh_room_calendar(sender, instance, **kwargs):
+    """
+    Recompute the room's calendar bitmaps of the months the booking touches.
+    """
+    intervals = [(instance.room_id, instance.start_at, instance.end_at)]
+    if getattr(instance, "_previous_period", None):
+        intervals.append(instance._previous_period)
+    RoomAvailability.refresh_on_commit(intervals)
+
+
+@receiver([post_save, post_delete], sender=settings.AUTH_USER_MODEL)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """
+    Deactivation or a password change must not be hidden by the JWT user cache.
+    """
+    transaction.on_commit(lambda: user_cache.invalidate_user(instance.pk))
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    """
+    Let MetricsMiddleware time every query, whichever thread runs it.
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
@@ -16,4 +16,28 @@ INTERNAL_SERVER_ERROR_500 = {
     'detail': 'Internal server error',
     'code': 'internal_server_error',
     'number': status.HTTP_500_INTERNAL_SERVER_ERROR
-}
\ No newline at end of file
+}
+
+NOT_FOUND_404 = {
+    'detail': 'Not found',
+    'code': 'not_found',
+    'number': status.HTTP_404_NOT_FOUND
+}
+
+CONFLICT_409 = {
+    'detail': 'Conflict',
+    'code': 'conflict',
+    'number': status.HTTP_409_CONFLICT
+}
+
+UNPROCESSABLE_ENTITY_422 = {
+    'detail': 'Unprocessable entity',
+    'code': 'unprocessable_entity',
+    'number': status.HTTP_422_UNPROCESSABLE_ENTITY
+}
+
+TOO_MANY_REQUESTS_429 = {
+    'detail': 'Too many requests',
+    'code': 'too_many_requests',
+    'number': status.HTTP_429_TOO_MANY_REQUESTS
+}
@@ -0,0 +1,217 @@
+"""
+Concurrency stress harness for the booking write paths. Threads create,
+reschedule and cancel bookings of a few shared rooms at once, each with its
+own database connection, retrying what is retryable (busy rooms, stale
+versions), and the outcome is checked against the database afterwards: no
+two bookings of a room overlap, and every acknowledged write is there.
+"""
+import random
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.core.exceptions import ValidationError
+from django.db import connection
+
+from . import metrics
+from .locks import RoomBusy
+from .models import Booking, StaleVersion
+
+# Share of attempts per operation; the rest are new bookings
+RESCHEDULE_SHARE = 0.3
+CANCEL_SHARE = 0.1
+
+
+def overlapping_bookings(room_ids):
+    """
+    (id, id) pairs of bookings of the same room whose periods intersect.
+    """
+    table = Booking._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT first.id, second.id FROM {table} AS first
+            JOIN {table} AS second ON second.room_id = first.room_id AND second.id > first.id
+                AND second.period && first.period
+            WHERE first.room_id = ANY(%s)
+            """,
+            [list(room_ids)],
+        )
+        return cursor.fetchall()
+
+
+class Ledger:
+    """
+    The writes the workers saw succeed, shared between threads.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        # booking id -> (version, start_at, end_at) of its latest acknowledged write
+        self.bookings = {}
+        self.cancelled = set()
+
+    def pick(self, rng):
+        with self.lock:
+            if not self.bookings:
+                return None
+            booking_id = rng.choice(list(self.bookings))
+            return booking_id, self.bookings[booking_id][0]
+
+    def record(self, booking_id, version, start_at, end_at):
+        with self.lock:
+            # Threads may report writes of one booking out of order; the highest version is the
+            # latest, and a reschedule reported after the cancellation that followed it is stale
+            if booking_id not in self.cancelled and self.bookings.get(booking_id, (0,))[0] < version:
+                self.bookings[booking_id] = (version, start_at, end_at)
+
+    def forget(self, booking_id):
+        with self.lock:
+            self.cancelled.add(booking_id)
+            self.bookings.pop(booking_id, None)
+
+
+class StressRun:
+    """
+    One run of `threads` workers making `attempts` writes each on `rooms`,
+    at random one to three hour periods among the first `slots` hours after
+    `start_at`. Busy rooms are retried up to `max_retries` times and stale
+    versions with the version the refusal reported.
+    """
+    def __init__(self, user, rooms, start_at, threads=16, attempts=25, slots=48, max_retries=5, seed=0):
+        self.user = user
+        self.rooms = list(rooms)
+        self.start_at = start_at
+        self.threads = threads
+        self.attempts = attempts
+        self.slots = slots
+        self.max_retries = max_retries
+        self.seed = seed
+        self.ledger = Ledger()
+        self.outcomes = Counter()
+        self.retries = Counter()
+        self.errors = []
+        self.lock = threading.Lock()
+
+    def period(self, rng):
+        start_at = self.start_at + timedelta(hours=rng.randrange(self.slots))
+        return start_at, start_at + timedelta(hours=rng.randint(1, 3))
+
+    def create(self, rng, retry):
+        start_at, end_at = self.period(rng)
+        booking = retry(lambda: Booking.create_booking(self.user, rng.choice(self.rooms), start_at, end_at))
+        self.ledger.record(booking.id, 1, start_at, end_at)
+        return "created"
+
+    def reschedule(self, rng, retry, booking_id, version):
+        start_at, end_at = self.period(rng)
+        version = retry(lambda version: Booking.reschedule(self.user, booking_id, version, start_at, end_at), version)
+        self.ledger.record(booking_id, version, start_at, end_at)
+        return "rescheduled"
+
+    def cancel(self, rng, retry, booking_id, version):
+        retry(lambda version: Booking.cancel(self.user, booking_id, version), version)
+        self.ledger.forget(booking_id)
+        return "cancelled"
+
+    def work(self, index, barrier):
+        rng = random.Random(f"{self.seed}-{index}")
+        outcomes, retries = Counter(), Counter()
+
+        def retry(call, *version):
+            for attempt in range(self.max_retries + 1):
+                try:
+                    return call(*version)
+                except RoomBusy:
+                    if attempt == self.max_retries:
+                        raise
+                    retries["busy"] += 1
+                    time.sleep(rng.uniform(0.001, 0.005) * 2 ** attempt)
+                except StaleVersion as e:
+                    if attempt == self.max_retries:
+                        raise
+                    retries["stale"] += 1
+                    version = (e.version,)
+
+        try:
+            barrier.wait(30)
+            for _ in range(self.attempts):
+                share = rng.random()
+                picked = self.ledger.pick(rng) if share < RESCHEDULE_SHARE + CANCEL_SHARE else None
+                try:
+                    if picked is None:
+                        outcomes[self.create(rng, retry)] += 1
+                    elif share < RESCHEDULE_SHARE:
+                        outcomes[self.reschedule(rng, retry, *picked)] += 1
+                    else:
+                        outcomes[self.cancel(rng, retry, *picked)] += 1
+                except ValidationError:
+                    outcomes["overlap"] += 1
+                except RoomBusy:
+                    outcomes["busy"] += 1
+                except StaleVersion:
+                    outcomes["stale"] += 1
+                except Booking.DoesNotExist:
+                    # Cancelled by another worker in the meantime
+                    self.ledger.forget(picked[0])
+                    outcomes["gone"] += 1
+        except Exception as e:
+            with self.lock:
+                self.errors.append(e)
+        finally:
+            connection.close()
+            with self.lock:
+                self.outcomes.update(outcomes)
+                self.retries.update(retries)
+
+    def run(self):
+        """
+        Run the workers to completion and return the report.
+        """
+        lock_waits = {name: metrics.lock_wait.totals(strategy=name) for name in ("advisory", "room")}
+        barrier = threading.Barrier(self.threads)
+        workers = [threading.Thread(target=self.work, args=(index, barrier)) for index in range(self.threads)]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+
+        waits = {}
+        for name, (count, total) in lock_waits.items():
+            new_count, new_total = metrics.lock_wait.totals(strategy=name)
+            if new_count > count:
+                waits[name] = {
+                    "count": new_count - count,
+                    "total_seconds": round(new_total - total, 4),
+                    "mean_ms": round((new_total - total) / (new_count - count) * 1000, 3),
+                }
+        attempts = sum(self.outcomes.values())
+        return {
+            "threads": self.threads,
+            "attempts": attempts,
+            "duration_seconds": round(elapsed, 3),
+            "throughput": round(attempts / elapsed, 1),
+            "outcomes": dict(self.outcomes),
+            "retries": dict(self.retries),
+            "lock_waits": waits,
+            "errors": [repr(error) for error in self.errors],
+        }
+
+    def lost_writes(self):
+        """
+        Acknowledged writes the database does not reflect, and bookings it has
+        that no acknowledged write explains, as {booking id: (expected, actual)}.
+        """
+        actual = {
+            booking_id: (version, start_at, end_at)
+            for booking_id, version, start_at, end_at in Booking.objects.filter(room__in=self.rooms)
+            .values_list("id", "version", "start_at", "end_at")
+        }
+        expected = self.ledger.bookings
+        return {
+            booking_id: (expected.get(booking_id), actual.get(booking_id))
+            for booking_id in expected.keys() | actual.keys()
+            if expected.get(booking_id) != actual.get(booking_id)
+        }
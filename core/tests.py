@@ -1,10 +1,64 @@
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.contrib.auth.models import User
 from django.urls import reverse
+from django.core.exceptions import ValidationError
+from django.core.cache import cache
+from django.core.management import call_command
+from django.apps import apps
+from django.db import connection
+from django.utils.timezone import now
 from rest_framework.test import APIClient
-from .models import Room, Hotel, Booking
-from datetime import datetime, timedelta
+from .models import (
+    Room, Hotel, Booking, ArchivedBooking, IdempotencyKey, ImportRun, OutboxEvent, RoomAvailability, StaleVersion,
+    availability_cache,
+)
+from .admission import AdmissionRejected, RoomQueues, TokenBuckets
+from .analytics import hotel_occupancy
+from .bitmaps import occupancy_matrix, room_bitmaps
+from .export import export_bookings
+from .importer import InventoryImporter
+from .outbox import process_batch
+from .routers import LAST_WRITE_KEY, ReplicaRouter, record_write, replica_reads, settle_reads
+from .serializers import FastBookingSerializer
+from .locks import LOCK_STRATEGIES, RoomBusy, room_lock
+from .stress import StressRun, overlapping_bookings
+from .authentication import user_cache
+from .log import BackgroundHandler
+from rest_framework_simplejwt.tokens import AccessToken
+from datetime import datetime, timedelta, timezone as dt_timezone
+import gzip
+from contextlib import contextmanager
+from importlib import import_module
 import json
+import logging
+import os
+import tempfile
+from io import StringIO
+import threading
+import time
+from unittest import mock
+from asgiref.sync import sync_to_async
+
+
+class BookingFixtureMixin:
+    """
+    A hotel with room 101 and a user with an authenticated API client.
+    booking_data books the room for two hours starting at start_at, a day
+    from now.
+    """
+    def setUp(self):
+        super().setUp()
+        self.hotel = Hotel.objects.create(name="hotel transilvania", location="Tehran")
+        self.room = Room.objects.create(hotel=self.hotel, room_number="101")
+        self.user = User.objects.create_user(username="alireza", password="666666")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.start_at = now() + timedelta(days=1)
+        self.booking_data = {
+            "room": self.room.id, "start_at": self.start_at.isoformat(),
+            "end_at": (self.start_at + timedelta(hours=2)).isoformat(),
+        }
+
 
 class SimpleBookingTest(TestCase):
     def setUp(self):
@@ -58,3 +112,1483 @@ class SimpleBookingTest(TestCase):
         self.assertTrue(booking_exists, "The booking should exist in the database.")
 
         print("Room booking test passed: The room was successfully reserved.")
+
+
+class BookingOverlapConstraintTest(BookingFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.end_at = self.start_at + timedelta(hours=2)
+
+    def test_overlapping_booking_is_rejected(self):
+        """
+        The exclusion constraint surfaces as the usual "already booked" ValidationError.
+        """
+        Booking.create_booking(self.user, self.room, self.start_at, self.end_at)
+
+        with self.assertRaisesMessage(ValidationError, "Room is already booked for the given dates."):
+            Booking.create_booking(
+                self.user, self.room, self.start_at + timedelta(hours=1), self.end_at + timedelta(hours=1)
+            )
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_adjacent_bookings_are_allowed(self):
+        """
+        Periods are half-open, so a booking may start exactly when the previous one ends.
+        """
+        Booking.create_booking(self.user, self.room, self.start_at, self.end_at)
+        Booking.create_booking(self.user, self.room, self.end_at, self.end_at + timedelta(hours=2))
+
+        self.assertFalse(Booking.is_room_available(self.room, self.start_at, self.end_at))
+        self.assertTrue(Booking.is_room_available(self.room, self.end_at + timedelta(hours=2), self.end_at + timedelta(hours=3)))
+
+    def test_migration_lists_existing_overlaps(self):
+        check_no_overlaps = import_module("core.migrations.0006_booking_period_exclusion").check_no_overlaps
+        with connection.cursor() as cursor:
+            cursor.execute("ALTER TABLE core_booking DROP CONSTRAINT exclude_overlapping_bookings")
+        first = Booking.objects.create(user=self.user, room=self.room, start_at=self.start_at, end_at=self.end_at)
+        second = Booking.objects.create(user=self.user, room=self.room, start_at=self.start_at + timedelta(hours=1),
+                                        end_at=self.end_at + timedelta(hours=1))
+        Booking.objects.create(user=self.user, room=self.room, start_at=self.end_at + timedelta(hours=1),
+                               end_at=self.end_at + timedelta(hours=2))
+
+        with connection.schema_editor() as schema_editor, self.assertRaises(RuntimeError) as raised:
+            check_no_overlaps(apps, schema_editor)
+        self.assertIn("Found 1 overlapping bookings", str(raised.exception))
+        self.assertIn(f"booking {second.id} of room {self.room.id}", str(raised.exception))
+        self.assertNotIn(f"booking {first.id} ", str(raised.exception))
+
+
+class FastBookingCreateQueryCountTest(BookingFixtureMixin, TransactionTestCase):
+    """
+    Runs outside a wrapping transaction so the counts match production autocommit.
+    """
+    def setUp(self):
+        super().setUp()
+        self.booking_url = reverse('booking')
+
+    def post(self, data):
+        return self.client.post(self.booking_url, data=json.dumps(data), content_type="application/json")
+
+    def test_successful_booking_is_a_single_query(self):
+        with self.assertNumQueries(1):
+            response = self.post(self.booking_data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(Booking.objects.filter(id=response.data["data"]["booking_id"]).exists())
+
+    def test_conflicting_booking_is_a_single_query(self):
+        self.post(self.booking_data)
+
+        with self.assertNumQueries(1):
+            response = self.post(self.booking_data)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("already booked", response.data["error"])
+
+    def test_unknown_room_is_a_bad_request(self):
+        with self.assertNumQueries(1):
+            response = self.post({**self.booking_data, "room": self.room.id + 1000})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("room", response.data["error"])
+
+
+class AvailabilityViewTest(TestCase):
+    def setUp(self):
+        self.hotel = Hotel.objects.create(name="hotel transilvania", location="Tehran")
+        self.other_hotel = Hotel.objects.create(name="hotel caspian", location="Rasht")
+        self.rooms = [Room.objects.create(hotel=self.hotel, room_number=str(100 + i)) for i in range(3)]
+        self.other_room = Room.objects.create(hotel=self.other_hotel, room_number="201")
+        self.user = User.objects.create_user(username="alireza", password="666666")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        self.start_at = now() + timedelta(days=1)
+        self.end_at = self.start_at + timedelta(days=2)
+        Booking.create_booking(self.user, self.rooms[0], self.start_at, self.end_at)
+        self.params = {"start": self.start_at.isoformat(), "end": self.end_at.isoformat()}
+
+    def test_hotel_availability_is_a_single_query(self):
+        url = reverse('hotel-availability', kwargs={"hotel_id": self.hotel.id})
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, self.params)
+
+        self.assertEqual(response.status_code, 200)
+        room_ids = [room["id"] for room in response.data["data"]["results"]]
+        self.assertEqual(room_ids, [self.rooms[1].id, self.rooms[2].id])
+
+    def test_location_availability_is_paginated(self):
+        response = self.client.get(reverse('availability'), {**self.params, "location": "Tehran", "page_size": 1})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([room["id"] for room in response.data["data"]["results"]], [self.rooms[1].id])
+
+        response = self.client.get(response.data["data"]["next"])
+        self.assertEqual([room["id"] for room in response.data["data"]["results"]], [self.rooms[2].id])
+        self.assertIsNone(response.data["data"]["next"])
+
+    def test_invalid_range_is_a_bad_request(self):
+        response = self.client.get(reverse('availability'), {"start": self.params["end"], "end": self.params["start"], "location": "Tehran"})
+
+        self.assertEqual(response.status_code, 400)
+
+
+class BulkBookingViewTest(BookingFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.other_room = Room.objects.create(hotel=self.hotel, room_number="102")
+        Booking.create_booking(self.user, self.room, self.start_at, self.start_at + timedelta(hours=2))
+        self.bookings = [
+            # Conflicts with the existing booking
+            self.item(self.room, 1, 3),
+            self.item(self.room, 3, 5),
+            # Conflicts with the previous item of the batch
+            self.item(self.room, 4, 6),
+            self.item(self.other_room, 1, 3),
+        ]
+        self.bulk_url = reverse('booking-bulk')
+
+    def item(self, room, start_hour, end_hour):
+        return {
+            "room": room.id,
+            "start_at": (self.start_at + timedelta(hours=start_hour)).isoformat(),
+            "end_at": (self.start_at + timedelta(hours=end_hour)).isoformat(),
+        }
+
+    def post(self, mode):
+        return self.client.post(
+            self.bulk_url, data=json.dumps({"bookings": self.bookings, "mode": mode}), content_type="application/json"
+        )
+
+    def test_partial_mode_reports_each_item(self):
+        response = self.post("partial")
+
+        self.assertEqual(response.status_code, 200)
+        statuses = [result["status"] for result in response.data["data"]["results"]]
+        self.assertEqual(statuses, ["failed", "created", "failed", "created"])
+        self.assertEqual(response.data["data"]["created"], 2)
+        self.assertEqual(Booking.objects.count(), 3)
+
+    def test_all_or_nothing_mode_creates_nothing_on_conflict(self):
+        response = self.post("all_or_nothing")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_conflict_detection_is_set_based(self):
+        self.bookings = [self.item(self.other_room, 2 * i, 2 * i + 1) for i in range(50)]
+
+        # Rooms, overlaps and the bulk INSERT, plus its savepoint inside the test transaction
+        with self.assertNumQueries(5):
+            response = self.post("all_or_nothing")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["data"]["created"], 50)
+
+    @override_settings(BOOKING_ADMISSION=True, BOOKING_USER_RATE=1, BOOKING_USER_BURST=5)
+    def test_rate_limit_counts_every_booking_of_the_batch(self):
+        self.assertEqual(self.post("partial").status_code, 200)
+
+        # One of the five tokens is left, and the batch needs four
+        response = self.post("partial")
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "3")
+        self.assertEqual(Booking.objects.count(), 3)
+
+
+@override_settings(BOOKING_AVAILABILITY_CACHE=True)
+class AvailabilityCacheTest(BookingFixtureMixin, TestCase):
+    def setUp(self):
+        availability_cache.clear()
+        super().setUp()
+        self.end_at = self.start_at + timedelta(hours=2)
+
+    def test_repeated_checks_are_answered_from_memory(self):
+        stats = availability_cache.stats()
+        self.assertTrue(Booking.is_room_available(self.room, self.start_at, self.end_at))
+
+        with self.assertNumQueries(0):
+            self.assertTrue(Booking.is_room_available(self.room, self.start_at, self.end_at))
+
+        self.assertEqual(availability_cache.stats()["misses"], stats["misses"] + 1)
+        self.assertEqual(availability_cache.stats()["hits"], stats["hits"] + 1)
+
+    def test_committed_booking_invalidates_the_room(self):
+        self.assertTrue(Booking.is_room_available(self.room, self.start_at, self.end_at))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Booking.create_booking(self.user, self.room, self.start_at, self.end_at)
+
+        self.assertFalse(Booking.is_room_available(self.room, self.start_at, self.end_at))
+        self.assertTrue(Booking.is_room_available(self.room, self.end_at, self.end_at + timedelta(hours=1)))
+
+
+class RoomLockStrategyTest(BookingFixtureMixin, TransactionTestCase):
+    def hold_room_lock(self, locked, release):
+        try:
+            with room_lock(self.room.id):
+                locked.set()
+                release.wait(5)
+        finally:
+            connection.close()
+
+    def assert_busy_while_held(self, strategy):
+        locked, release = threading.Event(), threading.Event()
+        with override_settings(BOOKING_LOCK_STRATEGY=strategy, BOOKING_LOCK_TIMEOUT_MS=0):
+            holder = threading.Thread(target=self.hold_room_lock, args=(locked, release))
+            holder.start()
+            try:
+                self.assertTrue(locked.wait(5))
+                with self.assertRaises(RoomBusy):
+                    Booking.create_booking(self.user, self.room, self.start_at, self.start_at + timedelta(hours=1))
+            finally:
+                release.set()
+                holder.join()
+
+            # Granted again once the holder's transaction ended
+            Booking.create_booking(self.user, self.room, self.start_at, self.start_at + timedelta(hours=1))
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_advisory_lock_fails_fast_when_room_is_busy(self):
+        self.assert_busy_while_held("advisory")
+
+    def test_room_row_lock_fails_fast_when_room_is_busy(self):
+        self.assert_busy_while_held("room")
+
+    @override_settings(BOOKING_LOCK_STRATEGY="advisory", BOOKING_LOCK_TIMEOUT_MS=0)
+    def test_advisory_locks_of_rooms_never_collide(self):
+        # Its id is the same as self.room's modulo 2**31
+        far_room = Room.objects.create(id=self.room.id + 2**31, hotel=self.hotel, room_number="102")
+        locked, release = threading.Event(), threading.Event()
+        holder = threading.Thread(target=self.hold_room_lock, args=(locked, release))
+        holder.start()
+        try:
+            self.assertTrue(locked.wait(5))
+            Booking.create_booking(self.user, far_room, self.start_at, self.start_at + timedelta(hours=1))
+        finally:
+            release.set()
+            holder.join()
+        self.assertEqual(Booking.objects.filter(room=far_room).count(), 1)
+
+    @override_settings(BOOKING_LOCK_STRATEGY="advisory", BOOKING_LOCK_TIMEOUT_MS=0)
+    def test_partial_bulk_booking_fails_only_the_busy_room(self):
+        other_room = Room.objects.create(hotel=self.hotel, room_number="102")
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        items = [
+            {"room": room.id, "start_at": self.start_at.isoformat(),
+             "end_at": (self.start_at + timedelta(hours=1)).isoformat()}
+            for room in (self.room, other_room)
+        ]
+        locked, release = threading.Event(), threading.Event()
+        holder = threading.Thread(target=self.hold_room_lock, args=(locked, release))
+        holder.start()
+        try:
+            self.assertTrue(locked.wait(5))
+            response = client.post(reverse('booking-bulk'), {"bookings": items, "mode": "partial"}, format='json')
+        finally:
+            release.set()
+            holder.join()
+
+        self.assertEqual(response.status_code, 200)
+        busy, created = response.data["data"]["results"]
+        self.assertEqual((busy["status"], busy["error"]), ("failed", "Room is busy, please retry."))
+        self.assertEqual(created["status"], "created")
+        self.assertEqual(list(Booking.objects.values_list("room_id", flat=True)), [other_room.id])
+
+
+class MetricsMiddlewareTest(BookingFixtureMixin, TestCase):
+    def test_requests_and_conflicts_are_exposed(self):
+        for _ in range(2):
+            self.client.post(reverse('booking'), data=json.dumps(self.booking_data), content_type="application/json")
+
+        with override_settings(BOOKING_METRICS_TOKEN="scraper-secret"):
+            response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION="Bearer scraper-secret")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        body = response.content.decode()
+        self.assertIn('booking_requests_total{view="booking",method="POST",status="200"}', body)
+        self.assertIn('booking_requests_total{view="booking",method="POST",status="400"}', body)
+        self.assertIn('booking_request_db_queries_bucket{view="booking",le="+Inf"}', body)
+        self.assertIn('booking_conflicts_total{reason="overlap"}', body)
+
+    @override_settings(BOOKING_METRICS_TOKEN="scraper-secret")
+    def test_metrics_are_refused_without_the_token_or_staff(self):
+        client = APIClient()
+        self.assertEqual(client.get(reverse('metrics')).status_code, 401)
+        self.assertEqual(client.get(reverse('metrics'), HTTP_AUTHORIZATION="Bearer wrong").status_code, 401)
+
+        client.force_login(self.user)
+        self.assertEqual(client.get(reverse('metrics')).status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(client.get(reverse('metrics')).status_code, 200)
+
+
+class RequestLogTest(BookingFixtureMixin, TestCase):
+    def test_request_line_is_logged_only_with_log_requests(self):
+        with override_settings(LOG_REQUESTS=False), self.assertNoLogs("core.middleware", "INFO"):
+            response = self.client.get(reverse('booking-history'))
+        self.assertIn("X-Request-ID", response)
+
+        with override_settings(LOG_REQUESTS=True), self.assertLogs("core.middleware", "INFO") as logs:
+            self.client.get(reverse('booking-history'))
+        self.assertEqual(logs.output, ["INFO:core.middleware:GET /bookings/ 200"])
+
+    def test_background_handler_renders_records_when_logged(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "app.log")
+            handler = BackgroundHandler(path, console=False)
+            background = logging.getLogger("core.tests.background")
+            background.addHandler(handler)
+            background.propagate = False
+            try:
+                rooms = [101]
+                background.warning("Rooms %s", rooms)
+                rooms.append(102)
+                try:
+                    raise ValueError("boom")
+                except ValueError:
+                    background.exception("Failed")
+            finally:
+                background.removeHandler(handler)
+                handler.close()
+            with open(path) as file:
+                lines = [json.loads(line) for line in file]
+
+        self.assertEqual(lines[0]["message"], "Rooms [101]")
+        self.assertEqual(lines[1]["message"], "Failed")
+        self.assertIn("ValueError: boom", lines[1]["exception"])
+
+
+class CachedJWTAuthenticationTest(BookingFixtureMixin, TestCase):
+    def setUp(self):
+        user_cache.clear()
+        super().setUp()
+        # Authenticate with a real token, which is what the cache is for
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+        self.url = reverse('hotel-availability', kwargs={"hotel_id": self.hotel.id})
+        self.params = {"start": self.start_at.isoformat(), "end": (self.start_at + timedelta(hours=2)).isoformat()}
+
+    def test_user_is_loaded_once_per_token(self):
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get(self.url, self.params).status_code, 200)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(self.url, self.params).status_code, 200)
+
+    def test_deactivated_user_is_rejected(self):
+        self.assertEqual(self.client.get(self.url, self.params).status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+
+        self.assertEqual(self.client.get(self.url, self.params).status_code, 401)
+
+    @override_settings(JWT_STATELESS_READS=True)
+    def test_stateless_reads_skip_the_user_lookup(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(self.url, self.params).status_code, 200)
+
+
+class BookingHistoryViewTest(BookingFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.other_user = User.objects.create_user(username="maryam", password="666666")
+        self.bookings = [
+            Booking.create_booking(
+                self.user, self.room, self.start_at + timedelta(hours=i), self.start_at + timedelta(hours=i + 1)
+            )
+            for i in range(5)
+        ]
+        Booking.create_booking(
+            self.other_user, self.room, self.start_at + timedelta(hours=5), self.start_at + timedelta(hours=6)
+        )
+
+    def test_own_bookings_are_keyset_paginated_newest_first(self):
+        url, seen = reverse('booking-history') + "?page_size=2", []
+        while url:
+            # One page of live and one of archived bookings
+            with self.assertNumQueries(2):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(booking["id"] for booking in response.data["data"]["results"])
+            url = response.data["data"]["next"]
+
+        self.assertEqual(seen, [booking.id for booking in reversed(self.bookings)])
+        self.assertEqual(response.data["data"]["results"][0]["hotel_name"], "hotel transilvania")
+
+    def test_room_and_hotel_bookings_are_for_staff(self):
+        room_url = reverse('room-bookings', kwargs={"room_id": self.room.id})
+        hotel_url = reverse('hotel-bookings', kwargs={"hotel_id": self.hotel.id})
+        self.assertEqual(self.client.get(room_url).status_code, 403)
+
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(len(self.client.get(room_url).data["data"]["results"]), 6)
+        self.assertEqual(len(self.client.get(hotel_url).data["data"]["results"]), 6)
+
+    def test_hotel_bookings_merge_the_rooms_page_by_page(self):
+        other_room = Room.objects.create(hotel=self.hotel, room_number="102")
+        start_at = now() + timedelta(days=1, minutes=30)
+        for i in range(4):
+            Booking.create_booking(self.user, other_room, start_at + timedelta(hours=i), start_at + timedelta(hours=i + 1))
+        self.user.is_staff = True
+        self.user.save()
+
+        url, seen = reverse('hotel-bookings', kwargs={"hotel_id": self.hotel.id}) + "?page_size=3", []
+        while url:
+            with self.assertNumQueries(2):
+                response = self.client.get(url)
+            seen.extend(booking["id"] for booking in response.data["data"]["results"])
+            url = response.data["data"]["next"]
+
+        expected = Booking.objects.filter(room__hotel=self.hotel).order_by("-start_at", "-id")
+        self.assertEqual(seen, list(expected.values_list("id", flat=True)))
+
+    def test_invalid_cursor_is_not_found(self):
+        self.assertEqual(self.client.get(reverse('booking-history'), {"cursor": "nonsense"}).status_code, 404)
+
+
+@override_settings(BOOKING_ANALYTICS_CACHE_TTL=0)
+class HotelOccupancyTest(BookingFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user.is_staff = True
+        self.user.save()
+        self.other_room = Room.objects.create(hotel=self.hotel, room_number="102")
+        self.url = reverse('hotel-occupancy', kwargs={"hotel_id": self.hotel.id})
+
+        self.day = (now() + timedelta(days=2)).replace(hour=0, minute=0, second=0, microsecond=0)
+        Booking.create_booking(self.user, self.room, self.day + timedelta(hours=12), self.day + timedelta(hours=36))
+        Booking.create_booking(self.user, self.other_room, self.day + timedelta(hours=6), self.day + timedelta(hours=12))
+
+    def test_daily_and_hourly_occupancy(self):
+        window = {"start": self.day, "end": self.day + timedelta(days=2)}
+        occupancy = hotel_occupancy(self.hotel.id, window["start"], window["end"], "day", include_matrix=True)
+        self.assertEqual(occupancy["matrix"]["rows"], [[0.5, 0.5], [0.25, 0.0]])
+        self.assertEqual([bucket["occupancy"] for bucket in occupancy["buckets"]], [0.375, 0.25])
+        self.assertEqual(occupancy["histogram"]["rooms"][1], 1)
+        self.assertEqual(occupancy["histogram"]["rooms"][5], 1)
+
+        hourly = hotel_occupancy(self.hotel.id, window["start"], window["end"], granularity="hour")
+        self.assertEqual(len(hourly["buckets"]), 48)
+        self.assertEqual(hourly["buckets"][5]["occupancy"], 0.0)
+        self.assertEqual(hourly["buckets"][6]["occupancy"], 0.5)
+        self.assertEqual(hourly["buckets"][12]["occupancy"], 0.5)
+        self.assertEqual(hourly["buckets"][36]["occupancy"], 0.0)
+
+    def test_occupancy_is_cached(self):
+        cache.clear()
+        start_at, end_at = self.day, self.day + timedelta(days=1)
+        with self.settings(BOOKING_ANALYTICS_CACHE_TTL=60):
+            hotel_occupancy(self.hotel.id, start_at, end_at)
+            with self.assertNumQueries(0):
+                hotel_occupancy(self.hotel.id, start_at, end_at)
+
+    def test_occupancy_endpoint_is_for_staff(self):
+        params = {"start": self.day.isoformat(), "end": (self.day + timedelta(days=1)).isoformat()}
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["data"]["rooms"], 2)
+        self.assertNotIn("matrix", response.data["data"])
+
+        self.assertEqual(self.client.get(self.url, {**params, "granularity": "week"}).status_code, 400)
+
+        self.user.is_staff = False
+        self.user.save()
+        self.assertEqual(self.client.get(self.url, params).status_code, 403)
+
+
+class ArchiveBookingsTest(BookingFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        long_ago = now() - timedelta(days=400)
+        self.old = Booking.objects.bulk_create([
+            Booking(user=self.user, room=self.room, start_at=long_ago + timedelta(days=i), end_at=long_ago + timedelta(days=i, hours=1))
+            for i in range(5)
+        ])
+        self.recent = Booking(
+            user=self.user, room=self.room, start_at=now() - timedelta(days=2), end_at=now() - timedelta(days=1)
+        )
+        self.recent.save(validate=False)
+        self.future = Booking.create_booking(self.user, self.room, now() + timedelta(days=1), now() + timedelta(days=2))
+
+    def test_old_bookings_are_moved_in_batches(self):
+        call_command('archive_bookings', retention_days=30, batch_size=2, stdout=StringIO())
+
+        self.assertEqual(set(Booking.objects.values_list('id', flat=True)), {self.recent.id, self.future.id})
+        self.assertEqual(
+            set(ArchivedBooking.objects.values_list('id', flat=True)), {booking.id for booking in self.old}
+        )
+        archived = ArchivedBooking.objects.get(id=self.old[0].id)
+        self.assertEqual((archived.room_id, archived.start_at), (self.room.id, self.old[0].start_at))
+
+    def test_history_reads_live_and_archived_bookings(self):
+        call_command('archive_bookings', retention_days=30, stdout=StringIO())
+
+        url, seen = reverse('booking-history') + "?page_size=3", []
+        while url:
+            response = self.client.get(url)
+            seen.extend(booking["id"] for booking in response.data["data"]["results"])
+            url = response.data["data"]["next"]
+
+        expected = [self.future.id, self.recent.id] + [booking.id for booking in reversed(self.old)]
+        self.assertEqual(seen, expected)
+
+
+class BookingExportTest(TestCase):
+    def setUp(self):
+        self.hotel = Hotel.objects.create(name="hotel transilvania", location="Tehran")
+        self.other_hotel = Hotel.objects.create(name="hotel azadi", location="Tehran")
+        self.user = User.objects.create_user(username="alireza", password="666666", is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        start_at = now() + timedelta(days=1)
+        for number, hotel in enumerate((self.hotel, self.hotel, self.other_hotel)):
+            room = Room.objects.create(hotel=hotel, room_number=str(101 + number))
+            Booking.create_booking(self.user, room, start_at, start_at + timedelta(hours=1))
+
+    def test_export_joins_relations_without_extra_queries(self):
+        # One server-side cursor over live and one over archived bookings
+        with self.assertNumQueries(2):
+            lines = b"".join(export_bookings("csv", chunk_size=2)).decode().splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(lines[0].startswith("id,user_id,username,room_id,room_number,hotel_id,hotel_name"))
+        self.assertIn("alireza", lines[1])
+
+    def test_endpoint_streams_filtered_gzipped_ndjson(self):
+        response = self.client.get(reverse('booking-export'), {"output": "ndjson", "gzip": "true", "hotel": self.hotel.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        rows = [json.loads(line) for line in gzip.decompress(b"".join(response.streaming_content)).splitlines()]
+        self.assertEqual([row["hotel_name"] for row in rows], ["hotel transilvania"] * 2)
+        self.assertEqual(rows[0]["username"], "alireza")
+
+        self.user.is_staff = False
+        self.user.save()
+        self.assertEqual(self.client.get(reverse('booking-export')).status_code, 403)
+
+
+class ImportInventoryTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="alireza", password="666666")
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "inventory.jsonl")
+        self.start_at = (now() + timedelta(days=1)).replace(microsecond=0)
+
+    def booking(self, room_number, hours, length=1, user="alireza"):
+        start_at = self.start_at + timedelta(hours=hours)
+        return {"type": "booking", "hotel": "grand", "room_number": room_number, "user": user,
+                "start_at": start_at.isoformat(), "end_at": (start_at + timedelta(hours=length)).isoformat()}
+
+    def write(self, records, mode="w"):
+        with open(self.path, mode) as stream:
+            for record in records:
+                stream.write((record if isinstance(record, str) else json.dumps(record)) + "\n")
+
+    def rejects(self):
+        with open(self.path + ".rejects.jsonl") as stream:
+            return {json.loads(line)["line"]: json.loads(line)["error"] for line in stream}
+
+    def test_valid_records_are_imported_and_the_rest_rejected(self):
+        self.write([
+            {"type": "hotel", "key": "grand", "name": "Grand Plaza", "location": "Tehran"},
+            {"type": "hotel", "key": "tiny", "name": "GP", "location": "Tehran"},
+            {"type": "room", "hotel": "grand", "room_number": "101"},
+            {"type": "room", "hotel": "grand", "room_number": "10A"},
+            {"type": "room", "hotel": "tiny", "room_number": "102"},
+            self.booking("101", 0, 2),
+            self.booking("101", 1),
+            self.booking("101", 2),
+            self.booking("101", 3, user="nobody"),
+            "{not json",
+        ])
+        call_command('import_inventory', self.path, batch_size=4, stdout=StringIO())
+
+        hotel = Hotel.objects.get()
+        self.assertEqual((hotel.name, hotel.location), ("Grand Plaza", "Tehran"))
+        room = Room.objects.get()
+        self.assertEqual((room.hotel_id, room.room_number), (hotel.id, "101"))
+        self.assertEqual(
+            sorted(Booking.objects.values_list("start_at", "end_at")),
+            [(self.start_at, self.start_at + timedelta(hours=2)),
+             (self.start_at + timedelta(hours=2), self.start_at + timedelta(hours=3))],
+        )
+        self.assertEqual(self.rejects(), {
+            2: "Hotel name must be at least 3 characters long.",
+            4: "Room number must be numeric.",
+            5: "Unknown hotel key.",
+            7: "Overlaps another booking of the file.",
+            9: "Unknown user.",
+            10: "Unreadable record.",
+        })
+
+    def test_import_resumes_and_checks_existing_bookings(self):
+        self.write([
+            {"type": "hotel", "key": "grand", "name": "Grand Plaza", "location": "Tehran"},
+            {"type": "room", "hotel": "grand", "room_number": "101"},
+            self.booking("101", 0),
+        ])
+        call_command('import_inventory', self.path, stdout=StringIO())
+        self.assertEqual(ImportRun.objects.get().position, 3)
+
+        self.write([self.booking("101", 0), self.booking("101", 5)], mode="a")
+        call_command('import_inventory', self.path, stdout=StringIO())
+
+        self.assertEqual(Hotel.objects.count(), 1)
+        self.assertEqual(Booking.objects.count(), 2)
+        self.assertEqual(self.rejects(), {4: "Room is already booked for the given dates."})
+
+    def test_rejects_of_a_rolled_back_batch_are_not_written(self):
+        self.write([
+            {"type": "hotel", "key": "grand", "name": "Grand Plaza", "location": "Tehran"},
+            {"type": "room", "hotel": "grand", "room_number": "101"},
+            {"type": "hotel", "key": "tiny", "name": "GP", "location": "Tehran"},
+            self.booking("101", 0),
+        ])
+        import_bookings = InventoryImporter.import_bookings
+
+        def crash_on_bookings(importer, rows):
+            if rows:
+                raise RuntimeError("crash")
+            return import_bookings(importer, rows)
+
+        # The second batch rejects the hotel, then crashes before committing
+        with mock.patch.object(InventoryImporter, "import_bookings", crash_on_bookings), \
+                self.assertRaises(RuntimeError):
+            call_command('import_inventory', self.path, batch_size=2, stdout=StringIO())
+        self.assertEqual(self.rejects(), {})
+
+        call_command('import_inventory', self.path, batch_size=2, stdout=StringIO())
+        with open(self.path + ".rejects.jsonl") as stream:
+            self.assertEqual(len(stream.readlines()), 1)
+        self.assertEqual(self.rejects(), {3: "Hotel name must be at least 3 characters long."})
+        self.assertEqual(Booking.objects.count(), 1)
+
+
+class IdempotencyKeyTest(BookingFixtureMixin, TestCase):
+    def post(self, data, key="retry-1"):
+        return self.client.post(reverse('booking'), data, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_the_first_response(self):
+        first = self.post(self.booking_data)
+        retry = self.post(self.booking_data)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry.data["data"]["booking_id"], first.data["data"]["booking_id"])
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(Booking.objects.count(), 1)
+
+        # A new key books again, and fails on the overlap
+        self.assertEqual(self.post(self.booking_data, key="retry-2").status_code, 400)
+
+    def test_errors_are_replayed_and_keys_cannot_change_request(self):
+        invalid = {**self.booking_data, "room": 999999}
+        first = self.post(invalid)
+        self.assertEqual(first.status_code, 400)
+        self.assertEqual(self.post(invalid).data, first.data)
+
+        self.assertEqual(self.post(self.booking_data).status_code, 422)
+        self.assertFalse(Booking.objects.exists())
+
+    def test_hold_is_replayed_with_its_expiry(self):
+        first = self.client.post(reverse('booking-hold'), self.booking_data, format='json', HTTP_IDEMPOTENCY_KEY="hold-1")
+        retry = self.client.post(reverse('booking-hold'), self.booking_data, format='json', HTTP_IDEMPOTENCY_KEY="hold-1")
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(json.loads(retry.content), json.loads(first.content))
+        self.assertEqual(Booking.objects.filter(hold_expires_at__isnull=False).count(), 1)
+
+    def test_expired_key_runs_again(self):
+        self.post({**self.booking_data, "room": 999999})
+        IdempotencyKey.objects.update(expires_at=now() - timedelta(seconds=1))
+        self.assertEqual(self.post(self.booking_data).status_code, 200)
+        self.assertEqual(Booking.objects.count(), 1)
+
+    @override_settings(BOOKING_ADMISSION=True, BOOKING_USER_RATE=0, BOOKING_AVAILABILITY_CACHE=True)
+    def test_admission_waits_before_the_key_is_claimed(self):
+        availability_cache.clear()
+        claimed = []
+
+        @contextmanager
+        def admit(room_id, start_at, end_at):
+            claimed.append(IdempotencyKey.objects.exists())
+            yield
+
+        with mock.patch("core.views.admit", admit), self.captureOnCommitCallbacks(execute=True):
+            first = self.post(self.booking_data)
+        self.assertEqual(claimed, [False])
+
+        # Admission now knows the slot is taken, but a retry is replayed before it is asked
+        retry = self.post(self.booking_data)
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(retry.data["data"]["booking_id"], first.data["data"]["booking_id"])
+
+
+class ConcurrentIdempotencyKeyTest(BookingFixtureMixin, TransactionTestCase):
+    def post(self, responses):
+        try:
+            client = APIClient()
+            client.force_authenticate(user=self.user)
+            responses.append(client.post(reverse('booking'), self.booking_data, format='json', HTTP_IDEMPOTENCY_KEY="k"))
+        finally:
+            connection.close()
+
+    def wait_for_lock_wait(self, timeout=10):
+        """
+        Whether another connection waits for a lock within timeout seconds.
+        """
+        deadline = time.monotonic() + timeout
+        with connection.cursor() as cursor:
+            while time.monotonic() < deadline:
+                cursor.execute(
+                    "SELECT 1 FROM pg_stat_activity WHERE datname = current_database() AND wait_event_type = 'Lock'"
+                )
+                if cursor.fetchone():
+                    return True
+                time.sleep(0.01)
+        return False
+
+    @override_settings(BOOKING_IDEMPOTENCY_WAIT_MS=10000)
+    def test_duplicate_waits_for_the_first_request(self):
+        create = FastBookingSerializer.create
+        claimed, release = threading.Event(), threading.Event()
+
+        def held_create(serializer, validated_data):
+            # The key is claimed; keep its transaction open until the duplicate waits on it
+            claimed.set()
+            release.wait(10)
+            return create(serializer, validated_data)
+
+        first_responses, duplicate_responses = [], []
+        first = threading.Thread(target=self.post, args=(first_responses,))
+        duplicate = threading.Thread(target=self.post, args=(duplicate_responses,))
+        with mock.patch.object(FastBookingSerializer, "create", held_create):
+            first.start()
+            self.assertTrue(claimed.wait(10))
+            duplicate.start()
+            try:
+                self.assertTrue(self.wait_for_lock_wait())
+            finally:
+                release.set()
+                first.join()
+                duplicate.join()
+
+        self.assertEqual(first_responses[0].status_code, 200)
+        self.assertEqual(duplicate_responses[0].status_code, 200)
+        self.assertEqual(duplicate_responses[0]["Idempotent-Replayed"], "true")
+        self.assertEqual(first_responses[0].data["data"]["booking_id"], duplicate_responses[0].data["data"]["booking_id"])
+        self.assertEqual(Booking.objects.count(), 1)
+
+
+class AdmissionControlTest(BookingFixtureMixin, TestCase):
+    def booking_at(self, hours=0):
+        start_at = self.start_at + timedelta(hours=hours)
+        return {"room": self.room.id, "start_at": start_at.isoformat(), "end_at": (start_at + timedelta(hours=1)).isoformat()}
+
+    def test_room_queue_is_bounded_in_length_and_wait(self):
+        queues, release = RoomQueues(), threading.Event()
+        admitted = [threading.Event(), threading.Event()]
+
+        def hold(index):
+            with queues.admit(1, concurrency=1, max_queue=1, max_wait=5):
+                admitted[index].set()
+                release.wait(5)
+
+        holders = [threading.Thread(target=hold, args=(index,)) for index in range(2)]
+        holders[0].start()
+        self.assertTrue(admitted[0].wait(5))
+        holders[1].start()
+        while queues.depth() != 1:
+            time.sleep(0.01)
+
+        with self.assertRaises(AdmissionRejected) as full:
+            with queues.admit(1, concurrency=1, max_queue=1, max_wait=5):
+                pass
+        self.assertEqual(full.exception.reason, "queue_full")
+
+        with self.assertRaises(AdmissionRejected) as timeout:
+            with queues.admit(1, concurrency=1, max_queue=2, max_wait=0.05):
+                pass
+        self.assertEqual(timeout.exception.reason, "timeout")
+
+        # Other rooms are unaffected
+        with queues.admit(2, concurrency=1, max_queue=1, max_wait=0.05):
+            self.assertEqual(queues.busy_rooms(), 2)
+
+        release.set()
+        for holder in holders:
+            holder.join()
+        self.assertTrue(admitted[1].is_set())
+        self.assertEqual(queues.busy_rooms(), 0)
+
+    def test_token_bucket_refills_at_rate(self):
+        buckets = TokenBuckets()
+        self.assertEqual([buckets.take("u", rate=10, burst=2) for _ in range(2)], [0, 0])
+        self.assertGreater(buckets.take("u", rate=10, burst=2), 0)
+        time.sleep(0.11)
+        self.assertEqual(buckets.take("u", rate=10, burst=2), 0)
+
+        # A cost above the burst needs a full bucket, then leaves it in debt
+        self.assertEqual(buckets.take("batch", rate=10, burst=2, cost=3), 0)
+        self.assertAlmostEqual(buckets.take("batch", rate=10, burst=2), 0.2, places=1)
+
+    @override_settings(BOOKING_ADMISSION=True, BOOKING_USER_RATE=0.5, BOOKING_USER_BURST=1)
+    def test_fast_users_get_429(self):
+        self.assertEqual(self.client.post(reverse('booking'), self.booking_at(), format='json').status_code, 200)
+        response = self.client.post(reverse('booking'), self.booking_at(hours=2), format='json')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "2")
+
+    @override_settings(BOOKING_ADMISSION=True, BOOKING_USER_RATE=0, BOOKING_AVAILABILITY_CACHE=True)
+    def test_known_booked_slot_is_refused_without_writing(self):
+        availability_cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post(reverse('booking'), self.booking_at(), format='json').status_code, 200)
+        # Only the cache reads the room's bookings; no INSERT is attempted
+        with self.assertNumQueries(1):
+            response = self.client.post(reverse('booking'), self.booking_at(), format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Booking.objects.count(), 1)
+
+
+@mock.patch("core.routers.replicas", return_value=["replica_0"])
+class ReplicaRouterTest(BookingFixtureMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.router = ReplicaRouter()
+        super().setUp()
+
+    def test_reads_use_a_replica_only_inside_a_read_scope(self, replicas):
+        self.assertIsNone(self.router.db_for_read(Booking))
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(Booking), "replica_0")
+            self.assertEqual(self.router.db_for_write(Booking), "default")
+        self.assertIsNone(self.router.db_for_read(Booking))
+
+    def test_recent_writers_read_from_the_primary(self, replicas):
+        with replica_reads(pending_user=True):
+            settle_reads(self.user)
+            self.assertEqual(self.router.db_for_read(Booking), "replica_0")
+
+        record_write(self.user)
+        with replica_reads(pending_user=True):
+            settle_reads(self.user)
+            self.assertEqual(self.router.db_for_read(Booking), "default")
+
+    def test_successful_booking_is_recorded_as_a_write(self, replicas):
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        start_at = now() + timedelta(days=1)
+        response = client.post(reverse('booking'), {
+            "room": self.room.id, "start_at": start_at.isoformat(), "end_at": (start_at + timedelta(hours=1)).isoformat(),
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(cache.get(LAST_WRITE_KEY.format(self.user.id)))
+
+
+class BookingHoldTest(BookingFixtureMixin, TestCase):
+    def hold(self):
+        response = self.client.post(reverse('booking-hold'), self.booking_data, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.data["data"]["hold_id"]
+
+    def history(self):
+        return [booking["id"] for booking in self.client.get(reverse('booking-history')).data["data"]["results"]]
+
+    def test_hold_occupies_the_slot_until_confirmed(self):
+        hold_id = self.hold()
+        self.assertEqual(self.client.post(reverse('booking'), self.booking_data, format='json').status_code, 400)
+        self.assertEqual(self.history(), [])
+
+        for _ in range(2):
+            response = self.client.post(reverse('booking-hold-confirm', args=[hold_id]))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data["data"]["booking_id"], hold_id)
+        self.assertIsNone(Booking.objects.get(pk=hold_id).hold_expires_at)
+        self.assertEqual(self.history(), [hold_id])
+        # A confirmed booking is no longer a hold to release
+        self.assertEqual(self.client.delete(reverse('booking-hold-detail', args=[hold_id])).status_code, 404)
+
+    def test_released_hold_frees_the_slot(self):
+        hold_id = self.hold()
+        self.assertEqual(self.client.delete(reverse('booking-hold-detail', args=[hold_id])).status_code, 200)
+        self.assertEqual(self.client.post(reverse('booking'), self.booking_data, format='json').status_code, 200)
+        self.assertEqual(self.client.post(reverse('booking-hold-confirm', args=[hold_id])).status_code, 404)
+
+    def test_other_users_cannot_touch_a_hold(self):
+        hold_id = self.hold()
+        other = APIClient()
+        other.force_authenticate(user=User.objects.create_user(username="maryam", password="666666"))
+        self.assertEqual(other.post(reverse('booking-hold-confirm', args=[hold_id])).status_code, 404)
+        self.assertEqual(other.delete(reverse('booking-hold-detail', args=[hold_id])).status_code, 404)
+        self.assertIsNotNone(Booking.objects.get(pk=hold_id).hold_expires_at)
+
+    def test_expired_holds_are_swept_in_batches(self):
+        expired = [
+            Booking.objects.create(
+                user=self.user, room=self.room, start_at=now() + timedelta(days=day), end_at=now() + timedelta(days=day, hours=1),
+                hold_expires_at=now() - timedelta(minutes=1),
+            ).id
+            for day in range(2, 5)
+        ]
+        live_hold = self.hold()
+        self.assertEqual(self.client.post(reverse('booking-hold-confirm', args=[expired[0]])).status_code, 404)
+
+        call_command('sweep_holds', batch_size=2, stdout=StringIO())
+        self.assertFalse(Booking.objects.filter(id__in=expired).exists())
+        self.assertTrue(Booking.objects.filter(id=live_hold).exists())
+
+    def test_archive_skips_holds(self):
+        hold = Booking(
+            user=self.user, room=self.room, start_at=now() - timedelta(days=200), end_at=now() - timedelta(days=199),
+            hold_expires_at=now() - timedelta(days=199),
+        )
+        hold.save(validate=False)
+        call_command('archive_bookings', retention_days=30, stdout=StringIO())
+        self.assertTrue(Booking.objects.filter(id=hold.id).exists())
+        self.assertFalse(ArchivedBooking.objects.exists())
+
+
+@override_settings(BOOKING_CALENDAR=True, BOOKING_CALENDAR_SLOT_MINUTES=1440)
+class RoomCalendarTest(TestCase):
+    def setUp(self):
+        self.hotel = Hotel.objects.create(name="hotel transilvania", location="Tehran")
+        self.rooms = [Room.objects.create(hotel=self.hotel, room_number=str(101 + i)) for i in range(2)]
+        self.user = User.objects.create_user(username="alireza", password="666666")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.march = datetime(2030, 3, 1, tzinfo=dt_timezone.utc)
+
+    def book(self, room, start_day, hours):
+        start_at = self.march + timedelta(days=start_day, hours=12)
+        with self.captureOnCommitCallbacks(execute=True):
+            return Booking.create_booking(self.user, room, start_at, start_at + timedelta(hours=hours))
+
+    def calendar(self, days=40):
+        return self.client.get(reverse('hotel-calendar', args=[self.hotel.id]), {
+            "start": self.march.isoformat(), "end": (self.march + timedelta(days=days)).isoformat(),
+        })
+
+    def test_room_bitmaps_mark_every_slot_a_booking_touches(self):
+        february = datetime(2030, 2, 1, tzinfo=dt_timezone.utc)
+        start = int((february + timedelta(days=26, hours=12)).timestamp())
+        # Feb 27 12:00 to Mar 2 06:00 takes Feb 27-28 and Mar 1-2
+        feb, mar = room_bitmaps([february, self.march], 86400, [(start, start + 3 * 86400 - 6 * 3600)])
+        self.assertEqual((len(feb), len(mar)), (4, 4))
+        self.assertEqual(feb, bytes([0, 0, 0, 0b00110000]))
+        self.assertEqual(mar, bytes([0b11000000, 0, 0, 0]))
+
+    def test_occupancy_matrix_ignores_rooms_it_was_not_given(self):
+        month = self.march.date()
+        taken = bytes([0xff] * 4)
+        # Rooms 5 and 9 were added after the rooms were listed
+        occupied = occupancy_matrix([3, 7], [self.march], 86400, [(5, month, taken), (7, month, taken), (9, month, taken)])
+        self.assertFalse(occupied[0].any())
+        self.assertTrue(occupied[1].all())
+
+    def test_bookings_keep_the_calendar_up_to_date(self):
+        booking = self.book(self.rooms[0], start_day=2, hours=36)
+        response = self.calendar()
+        self.assertEqual(response.status_code, 200)
+        data = response.data["data"]
+        self.assertEqual(data["free_rooms"], [self.rooms[1].id])
+        self.assertEqual(data["rooms"][0]["free"], "11001" + "1" * 35)
+        self.assertEqual(data["rooms"][1]["free"], "1" * 40)
+
+        # Moving the booking to April clears March
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.update_booking(self.march + timedelta(days=32), self.march + timedelta(days=33))
+        self.assertEqual(self.calendar().data["data"]["rooms"][0]["free"], "1" * 32 + "0" + "1" * 7)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.delete()
+        self.assertEqual(self.calendar().data["data"]["free_rooms"], [room.id for room in self.rooms])
+
+    def test_ranges_are_widened_to_whole_slots(self):
+        self.book(self.rooms[1], start_day=0, hours=2)
+        response = self.client.get(reverse('hotel-calendar', args=[self.hotel.id]), {
+            "start": (self.march + timedelta(hours=20)).isoformat(),
+            "end": (self.march + timedelta(days=1, hours=1)).isoformat(),
+        })
+        data = response.data["data"]
+        self.assertEqual((data["start"], data["end"]), (self.march, self.march + timedelta(days=2)))
+        self.assertEqual([room["free"] for room in data["rooms"]], ["11", "01"])
+        self.assertEqual(data["free_rooms"], [self.rooms[0].id])
+
+    def test_refresh_reads_every_month_it_recomputes(self):
+        self.book(self.rooms[0], start_day=31, hours=1)
+        self.book(self.rooms[1], start_day=0, hours=1)
+        RoomAvailability.objects.all().delete()
+
+        RoomAvailability.refresh([(self.rooms[0].id, self.march + timedelta(days=31)), (self.rooms[1].id, self.march)])
+        self.assertEqual(
+            sorted(bytes(occupied)[0] for occupied in RoomAvailability.objects.values_list('occupied', flat=True)),
+            [0b10000000, 0b10000000],
+        )
+
+    def test_rebuild_restores_the_bitmaps(self):
+        booking = Booking(user=self.user, room=self.rooms[0], start_at=now() + timedelta(hours=1),
+                          end_at=now() + timedelta(hours=2))
+        booking.insert()
+        self.assertFalse(RoomAvailability.objects.exists())
+
+        call_command('rebuild_calendar', months=1, stdout=StringIO())
+        self.assertEqual(RoomAvailability.objects.count(), 4)
+        self.assertEqual(RoomAvailability.objects.exclude(occupied=bytes(4)).get().room_id, self.rooms[0].id)
+
+    @override_settings(BOOKING_CALENDAR=False)
+    def test_disabled_calendar_is_not_found(self):
+        self.assertEqual(self.calendar().status_code, 404)
+
+
+class AsyncEndpointsTest(BookingFixtureMixin, TransactionTestCase):
+    # Unknown rooms only fail the deferred foreign key when the INSERT commits
+    def setUp(self):
+        super().setUp()
+        self.headers = {"Authorization": f"Bearer {AccessToken.for_user(self.user)}"}
+
+    async def book(self, data):
+        return await self.async_client.post(
+            reverse('async-booking'), data, content_type='application/json', headers=self.headers,
+        )
+
+    async def test_booking_is_created_once(self):
+        response = await self.book(self.booking_data)
+        self.assertEqual(response.status_code, 200)
+        booking_id = response.json()["data"]["booking_id"]
+        self.assertTrue(await Booking.objects.filter(id=booking_id, user=self.user).aexists())
+
+        response = await self.book(self.booking_data)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["error"], "Room is already booked for the given dates.")
+
+    async def test_invalid_bookings_are_rejected(self):
+        response = await self.book({**self.booking_data, "room": self.room.id + 1000})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("room", response.json()["error"])
+
+        response = await self.async_client.post(
+            reverse('async-booking'), "{", content_type='application/json', headers=self.headers,
+        )
+        self.assertEqual(response.status_code, 400)
+
+    async def test_requests_need_a_valid_token(self):
+        response = await self.async_client.post(reverse('async-booking'), self.booking_data, content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+        self.assertIn("WWW-Authenticate", response)
+
+        response = await self.async_client.post(
+            reverse('async-booking'), self.booking_data, content_type='application/json',
+            headers={"Authorization": "Bearer nonsense"},
+        )
+        self.assertEqual(response.status_code, 401)
+
+    async def test_room_availability_matches_the_sync_endpoint(self):
+        await self.book(self.booking_data)
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        for offset, expected in ((1, False), (2, True)):
+            params = {
+                "start": (self.start_at + timedelta(hours=offset)).isoformat(),
+                "end": (self.start_at + timedelta(hours=offset + 1)).isoformat(),
+            }
+            response = await self.async_client.get(
+                reverse('async-room-availability', args=[self.room.id]), params, headers=self.headers,
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()["data"], {"room": self.room.id, "available": expected})
+            response = await sync_to_async(client.get)(reverse('room-availability', args=[self.room.id]), params)
+            self.assertEqual(response.data["data"], {"room": self.room.id, "available": expected})
+
+
+class BookingDetailViewTest(BookingFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.booking = Booking.create_booking(self.user, self.room, self.start_at, self.start_at + timedelta(hours=2))
+        self.url = reverse('booking-detail', args=[self.booking.id])
+
+    def reschedule(self, version, hours, client=None):
+        start_at = self.start_at + timedelta(hours=hours)
+        return (client or self.client).patch(self.url, {
+            "version": version, "start_at": start_at.isoformat(), "end_at": (start_at + timedelta(hours=2)).isoformat(),
+        }, format='json')
+
+    def test_reschedule_bumps_the_version(self):
+        response = self.reschedule(1, hours=4)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["data"]["version"], 2)
+        self.booking.refresh_from_db()
+        self.assertEqual((self.booking.start_at, self.booking.version), (self.start_at + timedelta(hours=4), 2))
+        self.assertEqual(self.client.get(reverse('booking-history')).data["data"]["results"][0]["version"], 2)
+
+        # Whoever still holds version 1 is told the current one
+        response = self.reschedule(1, hours=8)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data["data"], {"version": 2})
+        self.assertEqual(self.reschedule(2, hours=8).status_code, 200)
+
+    def test_reschedule_onto_another_booking_is_rejected(self):
+        Booking.create_booking(self.user, self.room, self.start_at + timedelta(hours=5), self.start_at + timedelta(hours=6))
+        response = self.reschedule(1, hours=4)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["error"], "Room is already booked for the given dates.")
+        self.booking.refresh_from_db()
+        self.assertEqual((self.booking.start_at, self.booking.version), (self.start_at, 1))
+
+        # Overlapping its own old period is fine
+        self.assertEqual(self.reschedule(1, hours=1).status_code, 200)
+
+    def test_cancel_needs_the_current_version(self):
+        self.assertEqual(self.client.delete(self.url).status_code, 400)
+        self.assertEqual(self.client.delete(f"{self.url}?version=2").status_code, 409)
+        response = self.client.delete(f"{self.url}?version=1")
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Booking.objects.filter(id=self.booking.id).exists())
+        self.assertEqual(self.client.delete(f"{self.url}?version=1").status_code, 404)
+
+    def test_only_own_future_bookings_can_change(self):
+        other = APIClient()
+        other.force_authenticate(user=User.objects.create_user(username="maryam", password="666666"))
+        self.assertEqual(self.reschedule(1, hours=4, client=other).status_code, 404)
+        self.assertEqual(other.delete(f"{self.url}?version=1").status_code, 404)
+
+        Booking.objects.filter(id=self.booking.id).update(start_at=now() - timedelta(hours=1))
+        response = self.client.delete(f"{self.url}?version=1")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["error"], "Bookings that already started cannot be changed.")
+
+    @override_settings(BOOKING_AVAILABILITY_CACHE=True)
+    def test_reschedule_refreshes_the_availability_cache(self):
+        availability_cache.clear()
+        old_period = (self.start_at, self.start_at + timedelta(hours=2))
+        self.assertFalse(Booking.is_room_available(self.room, *old_period))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.reschedule(1, hours=4).status_code, 200)
+        self.assertTrue(Booking.is_room_available(self.room, *old_period))
+
+
+class ConcurrentRescheduleTest(BookingFixtureMixin, TransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.booking = Booking.create_booking(self.user, self.room, self.start_at, self.start_at + timedelta(hours=2))
+
+    def reschedule(self, hours, results, ready):
+        try:
+            ready.wait(5)
+            start_at = self.start_at + timedelta(hours=hours)
+            results.append(Booking.reschedule(self.user, self.booking.id, 1, start_at, start_at + timedelta(hours=1)))
+        except StaleVersion as e:
+            results.append(e)
+        finally:
+            connection.close()
+
+    def test_one_of_two_writers_of_a_version_wins(self):
+        results, ready = [], threading.Event()
+        threads = [threading.Thread(target=self.reschedule, args=(hours, results, ready)) for hours in (4, 8)]
+        for thread in threads:
+            thread.start()
+        ready.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(type(result).__name__ for result in results), ["StaleVersion", "int"])
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.version, 2)
+
+    @override_settings(BOOKING_LOCK_STRATEGY="room", BOOKING_LOCK_TIMEOUT_MS=0)
+    def test_reschedule_does_not_wait_for_the_room_lock(self):
+        locked, release = threading.Event(), threading.Event()
+
+        def hold_room_lock():
+            try:
+                with room_lock(self.room.id):
+                    locked.set()
+                    release.wait(5)
+            finally:
+                connection.close()
+
+        holder = threading.Thread(target=hold_room_lock)
+        holder.start()
+        try:
+            self.assertTrue(locked.wait(5))
+            start_at = self.start_at + timedelta(hours=4)
+            self.assertEqual(Booking.reschedule(self.user, self.booking.id, 1, start_at, start_at + timedelta(hours=1)), 2)
+        finally:
+            release.set()
+            holder.join()
+
+
+class GroupBookingTest(TestCase):
+    def setUp(self):
+        self.hotel = Hotel.objects.create(name="hotel transilvania", location="Tehran")
+        self.rooms = Room.objects.bulk_create(Room(hotel=self.hotel, room_number=str(101 + number)) for number in range(6))
+        self.user = User.objects.create_user(username="alireza", password="666666")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.start_at = now() + timedelta(days=1)
+        self.end_at = self.start_at + timedelta(days=2)
+
+    def post(self, **data):
+        return self.client.post(reverse('booking-group'), {
+            "hotel": self.hotel.id, "start_at": self.start_at.isoformat(), "end_at": self.end_at.isoformat(), **data,
+        }, format='json')
+
+    def test_given_rooms_are_booked_all_or_nothing(self):
+        ids = [room.id for room in self.rooms[:3]]
+        response = self.post(rooms=ids[::-1])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([booking["room"] for booking in response.data["data"]["bookings"]], ids)
+        self.assertEqual(Booking.objects.count(), 3)
+
+        response = self.post(rooms=[self.rooms[2].id, self.rooms[3].id])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["error"], f"Rooms {self.rooms[2].id} are already booked for the given dates.")
+        self.assertFalse(Booking.objects.filter(room=self.rooms[3]).exists())
+
+    def test_any_free_rooms_fill_a_count(self):
+        Booking.create_booking(self.user, self.rooms[0], self.start_at + timedelta(hours=1), self.end_at)
+        Booking.objects.create(user=self.user, room=self.rooms[1], start_at=self.start_at, end_at=self.end_at,
+                               hold_expires_at=now() + timedelta(minutes=5))
+        response = self.post(count=3)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([booking["room"] for booking in response.data["data"]["bookings"]],
+                         [room.id for room in self.rooms[2:5]])
+
+        response = self.post(count=2)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["error"], "Only 1 rooms of the hotel are free for the given dates.")
+        self.assertEqual(Booking.objects.count(), 5)
+
+    def test_invalid_requests_are_rejected(self):
+        other_room = Room.objects.create(hotel=Hotel.objects.create(name="other hotel", location="Tabriz"), room_number="1")
+        response = self.post(rooms=[self.rooms[0].id, other_room.id])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("rooms", response.data["error"])
+        self.assertEqual(self.post(rooms=[self.rooms[0].id], count=1).status_code, 400)
+        self.assertEqual(self.post(rooms=[self.rooms[0].id, self.rooms[0].id]).status_code, 400)
+        self.assertEqual(self.post().status_code, 400)
+        self.assertFalse(Booking.objects.exists())
+
+
+class ConcurrentGroupBookingTest(TransactionTestCase):
+    def setUp(self):
+        self.hotel = Hotel.objects.create(name="hotel transilvania", location="Tehran")
+        self.rooms = Room.objects.bulk_create(Room(hotel=self.hotel, room_number=str(101 + number)) for number in range(12))
+        self.user = User.objects.create_user(username="alireza", password="666666")
+        self.start_at = now() + timedelta(days=1)
+        self.end_at = self.start_at + timedelta(days=2)
+
+    def run_concurrently(self, calls):
+        """
+        Start the calls together and return, per call, its result or the exception it raised.
+        """
+        results = [None] * len(calls)
+        barrier = threading.Barrier(len(calls))
+
+        def run(index, call):
+            try:
+                barrier.wait(5)
+                results[index] = call()
+            except Exception as e:
+                results[index] = e
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run, args=(index, call)) for index, call in enumerate(calls)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def assert_no_double_booking(self):
+        rooms = list(Booking.objects.values_list("room_id", flat=True))
+        self.assertEqual(len(rooms), len(set(rooms)))
+        return rooms
+
+    def test_overlapping_groups_neither_deadlock_nor_double_book(self):
+        ids = [room.id for room in self.rooms]
+        # Overlapping room sets in clashing orders, raced by single bookings of the same rooms
+        groups = [ids[0:6], ids[5:0:-1], ids[3:9][::-1], ids[6:12], ids[11:5:-1], ids[::2]]
+        calls = [
+            lambda group=group: Booking.create_group(self.user, self.hotel.id, self.start_at, self.end_at, room_ids=group)
+            for group in groups
+        ] + [
+            lambda room=room: Booking.create_booking(self.user, room, self.start_at, self.end_at)
+            for room in self.rooms[::3]
+        ]
+        for _ in range(3):
+            Booking.objects.all().delete()
+            results = self.run_concurrently(calls)
+            # A deadlock would surface as an OperationalError
+            self.assertEqual(
+                [result for result in results if isinstance(result, Exception) and not isinstance(result, ValidationError)],
+                [],
+            )
+            booked = self.assert_no_double_booking()
+            expected = []
+            for result in results:
+                if isinstance(result, list):
+                    expected += [booking.room_id for booking in result]
+                elif isinstance(result, Booking):
+                    expected.append(result.room_id)
+            self.assertEqual(sorted(booked), sorted(expected))
+
+    def test_groups_asking_for_a_count_share_the_free_rooms(self):
+        results = self.run_concurrently([
+            lambda: Booking.create_group(self.user, self.hotel.id, self.start_at, self.end_at, count=4)
+            for _ in range(4)
+        ])
+        groups = [result for result in results if isinstance(result, list)]
+        # Twelve rooms fit three groups; losers fail cleanly instead of waiting
+        self.assertIn(len(groups), (2, 3))
+        self.assertTrue(all(isinstance(result, (list, ValidationError)) for result in results))
+        self.assertTrue(all(len(group) == 4 for group in groups))
+        self.assertEqual(len(self.assert_no_double_booking()), 4 * len(groups))
+
+
+handled_batches = []
+
+
+def collect_events(events):
+    handled_batches.append([(event.topic, event.payload["booking_id"]) for event in events])
+
+
+def reject_cancellations(events):
+    if any(event.topic == "booking.cancelled" for event in events):
+        raise RuntimeError("cancellations are not handled")
+
+
+@override_settings(BOOKING_OUTBOX=True, BOOKING_OUTBOX_HANDLERS=["core.tests.collect_events"])
+class OutboxTest(BookingFixtureMixin, TestCase):
+    def setUp(self):
+        handled_batches.clear()
+        super().setUp()
+        self.rooms = [self.room] + Room.objects.bulk_create(
+            Room(hotel=self.hotel, room_number=str(number)) for number in (102, 103)
+        )
+
+    def topics(self):
+        return list(OutboxEvent.objects.order_by("id").values_list("topic", flat=True))
+
+    def test_booking_writes_record_events_with_them(self):
+        response = self.client.post(reverse('booking'), self.booking_data, format='json')
+        self.assertEqual(response.status_code, 200)
+        booking_id = response.data["data"]["booking_id"]
+        event = OutboxEvent.objects.get()
+        self.assertEqual(event.payload["booking_id"], booking_id)
+        self.assertEqual(event.payload["room_id"], self.rooms[0].id)
+
+        # Failed writes leave no event behind
+        self.assertEqual(self.client.post(reverse('booking'), self.booking_data, format='json').status_code, 400)
+        self.assertEqual(self.client.post(reverse('booking'), {**self.booking_data, "room": 999999}, format='json')
+                         .status_code, 400)
+        self.assertEqual(self.topics(), ["booking.created"])
+
+        start_at = self.start_at + timedelta(days=1)
+        self.client.patch(reverse('booking-detail', args=[booking_id]), {
+            "version": 1, "start_at": start_at.isoformat(), "end_at": (start_at + timedelta(hours=1)).isoformat(),
+        }, format='json')
+        self.client.delete(f"{reverse('booking-detail', args=[booking_id])}?version=2")
+        self.client.post(reverse('booking-group'), {
+            "hotel": self.hotel.id, "count": 2, "start_at": self.booking_data["start_at"],
+            "end_at": self.booking_data["end_at"],
+        }, format='json')
+        self.assertEqual(self.topics(), ["booking.created", "booking.rescheduled", "booking.cancelled"]
+                         + ["booking.created"] * 2)
+        rescheduled = OutboxEvent.objects.get(topic="booking.rescheduled").payload
+        self.assertEqual(rescheduled["version"], 2)
+        self.assertIn("previous_start_at", rescheduled)
+
+        with override_settings(BOOKING_OUTBOX=False):
+            Booking.create_booking(self.user, self.rooms[2], start_at, start_at + timedelta(hours=1))
+        self.assertEqual(OutboxEvent.objects.count(), 5)
+
+    def test_worker_hands_batches_to_handlers(self):
+        OutboxEvent.emit("booking.created", [{"booking_id": number} for number in range(5)])
+        self.assertEqual(process_batch(3, handlers=[collect_events]), 3)
+        # Leased events are not handed out twice
+        self.assertEqual(process_batch(3, handlers=[collect_events]), 2)
+        self.assertEqual(process_batch(3, handlers=[collect_events]), 0)
+        self.assertEqual(handled_batches, [[("booking.created", number) for number in range(3)],
+                                           [("booking.created", 3), ("booking.created", 4)]])
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    @override_settings(BOOKING_OUTBOX_MAX_ATTEMPTS=2)
+    def test_failing_events_back_off_and_are_given_up(self):
+        OutboxEvent.emit("booking.created", [{"booking_id": 1}])
+        OutboxEvent.emit("booking.cancelled", [{"booking_id": 2}])
+        OutboxEvent.emit("booking.created", [{"booking_id": 3}])
+        handlers = [collect_events, reject_cancellations]
+        with self.assertLogs("core.outbox", level="ERROR"):
+            self.assertEqual(process_batch(10, handlers=handlers), 3)
+        failed = OutboxEvent.objects.get()
+        self.assertEqual((failed.payload["booking_id"], failed.attempts), (2, 1))
+        self.assertIn("cancellations are not handled", failed.last_error)
+        self.assertGreater(failed.available_at, now())
+
+        # Not due again until the backoff passed
+        self.assertEqual(process_batch(10, handlers=handlers), 0)
+        OutboxEvent.objects.update(available_at=now() - timedelta(seconds=1))
+        with self.assertLogs("core.outbox", level="ERROR"):
+            self.assertEqual(process_batch(10, handlers=handlers), 1)
+        self.assertIsNotNone(OutboxEvent.objects.get().failed_at)
+        OutboxEvent.objects.update(available_at=now() - timedelta(seconds=1))
+        self.assertEqual(process_batch(10, handlers=handlers), 0)
+
+    def test_run_outbox_worker_drains_the_outbox(self):
+        OutboxEvent.emit("booking.created", [{"booking_id": number} for number in range(5)])
+        out = StringIO()
+        call_command('run_outbox_worker', batch_size=2, once=True, stdout=out)
+        self.assertIn("Processed 5 outbox events", out.getvalue())
+        self.assertEqual([len(batch) for batch in handled_batches], [2, 2, 1])
+
+
+class BookingStressTest(TransactionTestCase):
+    """
+    Hundreds of concurrent creates, reschedules and cancellations of a few
+    rooms under every lock strategy. BOOKING_STRESS_THREADS and
+    BOOKING_STRESS_ATTEMPTS (per thread) scale the run,
+    BOOKING_STRESS_MIN_THROUGHPUT fails it below that many attempts per
+    second, and BOOKING_STRESS_REPORT names a file for the JSON reports.
+    """
+    def setUp(self):
+        self.hotel = Hotel.objects.create(name="hotel transilvania", location="Tehran")
+        self.rooms = Room.objects.bulk_create(Room(hotel=self.hotel, room_number=str(101 + number)) for number in range(4))
+        self.user = User.objects.create_user(username="alireza", password="666666")
+        self.start_at = now() + timedelta(days=1)
+
+    def test_concurrent_writes_neither_overlap_nor_get_lost(self):
+        threads = int(os.environ.get("BOOKING_STRESS_THREADS", 16))
+        attempts = int(os.environ.get("BOOKING_STRESS_ATTEMPTS", 25))
+        min_throughput = float(os.environ.get("BOOKING_STRESS_MIN_THROUGHPUT", 0))
+        reports = {}
+        for strategy in LOCK_STRATEGIES:
+            with self.subTest(strategy=strategy), \
+                    override_settings(BOOKING_LOCK_STRATEGY=strategy, BOOKING_LOCK_TIMEOUT_MS=200):
+                Booking.objects.all().delete()
+                run = StressRun(self.user, self.rooms, self.start_at, threads=threads, attempts=attempts)
+                report = reports[strategy] = run.run()
+
+                # A deadlock or any other unexpected error ends its worker early
+                self.assertEqual(report["errors"], [])
+                self.assertEqual(report["attempts"], threads * attempts)
+                self.assertEqual(overlapping_bookings(room.id for room in self.rooms), [])
+                self.assertEqual(run.lost_writes(), {})
+                # Four rooms are too few for the writers to stay out of each other's way
+                self.assertGreater(report["outcomes"].get("overlap", 0), 0)
+                self.assertGreaterEqual(report["throughput"], min_throughput)
+
+        if path := os.environ.get("BOOKING_STRESS_REPORT"):
+            with open(path, "w") as file:
+                json.dump(reports, file, indent=2)
@@ -1,37 +1,607 @@
+import json
 import logging
+import math
+from datetime import timedelta
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import APIException, NotAuthenticated
 from rest_framework.views import APIView
-from rest_framework.permissions import IsAuthenticated
-from .models import Booking
-from .serializers import BookingSerializer
+from django.conf import settings
+from rest_framework.permissions import IsAuthenticated, IsAdminUser, SAFE_METHODS
+from .models import ArchivedBooking, Booking, Room, RoomAvailability, StaleVersion
+from .pagination import RoomCursorPagination, BookingKeysetPagination
+from .serializers import (
+    BookingSerializer, FastBookingSerializer, AvailabilityQuerySerializer, AvailableRoomSerializer,
+    BulkBookingSerializer, BookingHistorySerializer, OccupancyQuerySerializer, ExportQuerySerializer,
+    CalendarQuerySerializer, BookingUpdateSerializer, BookingVersionSerializer, GroupBookingSerializer,
+)
 from django.core.exceptions import ValidationError
-from .responses import bad_request_response, internal_server_error_response, success_response
+from django.utils.crypto import constant_time_compare
+from django.utils.timezone import now
+from . import metrics
+from .admission import AdmissionRejected, admit, throttle_user
+from .authentication import AsyncJWTAuthentication
+from .analytics import hotel_occupancy
+from .export import export_bookings
+from .idempotency import HEADER as IDEMPOTENCY_HEADER, idempotent
+from .locks import RoomBusy
+from .log import bind
+from .metrics import registry
+from .routers import replica_reads, settle_reads
+from .responses import (
+    bad_request_response, conflict_response, custom_response, internal_server_error_response, json_response,
+    not_found_response, success_response, too_many_requests_response,
+)
+from .statuses import BAD_REQUEST_400, CONFLICT_409, TOO_MANY_REQUESTS_429
 
 logger = logging.getLogger(__name__)
 
+
+class ReplicaReadsMixin:
+    """
+    Read-only requests read from a replica, unless the user wrote within
+    BOOKING_READ_YOUR_WRITES_SECONDS.
+    """
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in SAFE_METHODS:
+            return super().dispatch(request, *args, **kwargs)
+        with replica_reads(pending_user=True):
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        settle_reads(request.user)
+
+
 class BookingView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
+        bind(user_id=request.user.id)
         # Log the request for debugging purposes
-        logger.info(f"User {request.user.username} is attempting to create a booking.")
+        logger.info("User %s is attempting to create a booking.", request.user.username)
+
+        retry_after = throttle_user(request.user.id)
+        if retry_after:
+            logger.warning("User %s is booking too fast.", request.user.username)
+            response = too_many_requests_response("Too many booking requests, please slow down.")  # Returns 429 error
+            response["Retry-After"] = str(math.ceil(retry_after))
+            return response
+
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if key is not None:
+            return idempotent(request, key, lambda: self.create(request), admission=self.admitted)
+        return self.admitted(lambda: self.create(request))
+
+    def admitted(self, handler):
+        """
+        Run handler() once the room has a free writing slot; see
+        core.admission.admit. Data that does not validate goes straight to
+        the handler, which reports the errors.
+        """
+        if not settings.BOOKING_ADMISSION:
+            return handler()
+        # FastBookingSerializer validates without touching the database
+        serializer = FastBookingSerializer(data=self.request.data)
+        if not serializer.is_valid():
+            return handler()
+        room_id = serializer.validated_data['room_id']
+        try:
+            with admit(room_id, serializer.validated_data['start_at'], serializer.validated_data['end_at']):
+                return handler()
+        except AdmissionRejected as e:
+            logger.warning("Room %s turned the request away: %s", room_id, e.reason)
+            if e.reason == "booked":
+                return bad_request_response("Room is already booked for the given dates.")  # Returns 400 error
+            response = conflict_response("Room is busy, please retry.")  # Returns 409 error
+            response["Retry-After"] = str(math.ceil(e.retry_after))
+            return response
 
-        serializer = BookingSerializer(data=request.data, context={'request': request})
+    def get_serializer_class(self):
+        return FastBookingSerializer if settings.BOOKING_FAST_CREATE else BookingSerializer
+
+    def perform_create(self, serializer):
+        booking = serializer.save(user=self.request.user)
+        return success_response({"message": "Booking successful!", "booking_id": booking.id})
+
+    def create(self, request):
+        serializer = self.get_serializer_class()(data=request.data, context={'request': request})
         
         if serializer.is_valid():
+            bind(room_id=serializer.initial_data['room'])
             try:
-                booking = Booking.create_booking(
-                    user=request.user,
-                    room=serializer.validated_data['room'],
-                    start_at=serializer.validated_data['start_at'],
-                    end_at=serializer.validated_data['end_at']
-                )
-                return success_response({"message": "Booking successful!", "booking_id": booking.id})
+                return self.perform_create(serializer)
             except ValidationError as e:
-                logger.warning(f"Validation error: {str(e)}")
-                return bad_request_response(str(e))  # Returns 400 error
+                logger.warning("Validation error: %s", e)
+                # Field errors keep the same shape as serializer.errors
+                return bad_request_response(e.message_dict if hasattr(e, 'error_dict') else str(e))  # Returns 400 error
+            except RoomBusy as e:
+                logger.warning("Room %s is busy.", e)
+                return conflict_response("Room is busy, please retry.")  # Returns 409 error
             except Exception as e:
-                logger.error(f"Unexpected error: {str(e)}")
+                logger.exception("Unexpected error: %s", e)
                 return internal_server_error_response("An unexpected error occurred.")  # Returns 500 error
         
-        logger.warning(f"Invalid serializer data: {serializer.errors}")
+        logger.warning("Invalid serializer data: %s", serializer.errors)
         return bad_request_response(serializer.errors)  # Returns 400 error for invalid serializer
+
+
+class BookingHoldView(BookingView):
+    """
+    Hold a room for BOOKING_HOLD_TTL seconds while the client checks out. The
+    hold occupies the slot like a booking until it is confirmed or released.
+    """
+    def get_serializer_class(self):
+        # A hold is always the single INSERT
+        return FastBookingSerializer
+
+    def perform_create(self, serializer):
+        hold = serializer.save(
+            user=self.request.user, hold_expires_at=now() + timedelta(seconds=settings.BOOKING_HOLD_TTL)
+        )
+        metrics.holds.inc(outcome="created")
+        return success_response({"message": "Room held.", "hold_id": hold.id, "expires_at": hold.hold_expires_at})
+
+
+class BookingHoldDetailView(APIView):
+    """
+    Give back the slot of one of the requesting user's holds.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def delete(self, request, hold_id):
+        bind(user_id=request.user.id)
+        if not Booking.release_hold(request.user, hold_id):
+            return not_found_response("Hold does not exist.")  # Returns 404 error
+        return success_response({"message": "Hold released."})
+
+
+class BookingHoldConfirmView(APIView):
+    """
+    Turn one of the requesting user's holds into a booking before it expires.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, hold_id):
+        bind(user_id=request.user.id)
+        if not Booking.confirm_hold(request.user, hold_id):
+            logger.warning("User %s could not confirm hold %s.", request.user.username, hold_id)
+            return not_found_response("Hold does not exist or has expired.")  # Returns 404 error
+        return success_response({"message": "Booking successful!", "booking_id": hold_id})
+
+
+class BookingDetailView(APIView):
+    """
+    Reschedule or cancel one of the requesting user's bookings. Both take
+    the version the client last saw and answer 409 Conflict, with the
+    current version, when the booking changed in between.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def patch(self, request, booking_id):
+        bind(user_id=request.user.id)
+        serializer = BookingUpdateSerializer(data=request.data)
+        if not serializer.is_valid():
+            return bad_request_response(serializer.errors)
+
+        data = serializer.validated_data
+
+        def reschedule():
+            version = Booking.reschedule(request.user, booking_id, data['version'], data['start_at'], data['end_at'])
+            return {"booking_id": booking_id, "version": version, "start_at": data['start_at'], "end_at": data['end_at']}
+
+        return self.write(request, booking_id, reschedule)
+
+    def delete(self, request, booking_id):
+        bind(user_id=request.user.id)
+        # DELETE has no body, so the version comes in the query string
+        serializer = BookingVersionSerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return bad_request_response(serializer.errors)
+
+        def cancel():
+            Booking.cancel(request.user, booking_id, serializer.validated_data['version'])
+            return {"message": "Booking cancelled.", "booking_id": booking_id}
+
+        return self.write(request, booking_id, cancel)
+
+    @staticmethod
+    def write(request, booking_id, perform):
+        """
+        Run perform() and answer with its data, or with the error it raised.
+        """
+        try:
+            return success_response(perform())
+        except Booking.DoesNotExist:
+            return not_found_response("Booking does not exist.")  # Returns 404 error
+        except StaleVersion as e:
+            logger.warning("User %s wrote booking %s at a stale version.", request.user.username, booking_id)
+            return custom_response(  # Returns 409 error
+                CONFLICT_409, data={"version": e.version}, error="Booking was changed by another request.",
+            )
+        except ValidationError as e:
+            logger.warning("Validation error: %s", e)
+            return bad_request_response(e.messages[0])  # Returns 400 error
+
+
+class BulkBookingView(APIView):
+    """
+    Create up to 1000 bookings in one request, either all or nothing or
+    with per-item success and failure.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        bind(user_id=request.user.id)
+        logger.info("User %s is attempting to create bookings in bulk.", request.user.username)
+
+        envelope = BulkBookingSerializer(data=request.data)
+        if not envelope.is_valid():
+            return bad_request_response(envelope.errors)
+        all_or_nothing = envelope.validated_data['mode'] == BulkBookingSerializer.MODE_ALL_OR_NOTHING
+
+        # The per-user rate limit counts every booking of the batch; room queues do not apply
+        retry_after = throttle_user(request.user.id, len(envelope.validated_data['bookings']))
+        if retry_after:
+            logger.warning("User %s is booking too fast.", request.user.username)
+            response = too_many_requests_response("Too many booking requests, please slow down.")  # Returns 429 error
+            response["Retry-After"] = str(math.ceil(retry_after))
+            return response
+
+        items, valid_indexes, results = [], [], []
+        for index, data in enumerate(envelope.validated_data['bookings']):
+            serializer = FastBookingSerializer(data=data)
+            if serializer.is_valid():
+                valid_indexes.append(index)
+                items.append(serializer.validated_data)
+                results.append(None)
+            else:
+                results.append({"index": index, "status": "failed", "error": serializer.errors})
+
+        # In all-or-nothing mode a single invalid item already dooms the batch
+        if items and (not all_or_nothing or len(items) == len(results)):
+            try:
+                outcomes = Booking.create_bookings(request.user, items, all_or_nothing=all_or_nothing)
+            except ValidationError as e:
+                outcomes = [e.messages[0]] * len(items)
+            except RoomBusy:
+                logger.warning("Bulk booking rejected: rooms are busy.")
+                return conflict_response("Rooms are busy, please retry.")
+            for index, outcome in zip(valid_indexes, outcomes):
+                if isinstance(outcome, Booking):
+                    results[index] = {"index": index, "status": "created", "booking_id": outcome.id}
+                elif outcome is None:
+                    results[index] = {"index": index, "status": "skipped"}
+                else:
+                    results[index] = {"index": index, "status": "failed", "error": str(outcome)}
+        else:
+            for index in valid_indexes:
+                results[index] = {"index": index, "status": "skipped"}
+
+        created = sum(result["status"] == "created" for result in results)
+        if all_or_nothing and created != len(results):
+            logger.warning("Bulk booking rejected: %d of %d items failed.", len(results) - created, len(results))
+            return bad_request_response(results)
+        return success_response({"created": created, "results": results})
+
+
+class GroupBookingView(APIView):
+    """
+    Book several rooms of one hotel for the same dates, all or nothing:
+    the given rooms, or any `count` free ones.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        bind(user_id=request.user.id)
+        logger.info("User %s is attempting to book a group of rooms.", request.user.username)
+
+        retry_after = throttle_user(request.user.id)
+        if retry_after:
+            logger.warning("User %s is booking too fast.", request.user.username)
+            response = too_many_requests_response("Too many booking requests, please slow down.")  # Returns 429 error
+            response["Retry-After"] = str(math.ceil(retry_after))
+            return response
+
+        serializer = GroupBookingSerializer(data=request.data)
+        if not serializer.is_valid():
+            return bad_request_response(serializer.errors)
+
+        data = serializer.validated_data
+        try:
+            bookings = Booking.create_group(
+                request.user, data['hotel'], data['start_at'], data['end_at'],
+                room_ids=data.get('rooms'), count=data.get('count'),
+            )
+        except ValidationError as e:
+            logger.warning("Group booking rejected: %s", e)
+            return bad_request_response(e.message_dict if hasattr(e, 'error_dict') else e.messages[0])
+        except RoomBusy:
+            logger.warning("Group booking rejected: rooms are busy.")
+            return conflict_response("Rooms are busy, please retry.")
+        return success_response({
+            "message": "Booking successful!",
+            "bookings": [{"booking_id": booking.id, "room": booking.room_id} for booking in bookings],
+        })
+
+
+class AvailabilityView(ReplicaReadsMixin, APIView):
+    """
+    Free rooms of every hotel in ?location= for [start, end).
+    """
+    permission_classes = [IsAuthenticated]
+    pagination_class = RoomCursorPagination
+
+    def get_rooms(self, params):
+        return Room.objects.filter(hotel__location=params['location'])
+
+    def get(self, request, **kwargs):
+        query = AvailabilityQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return bad_request_response(query.errors)
+
+        params = {**query.validated_data, **kwargs}
+        if 'location' not in params and 'hotel_id' not in params:
+            return bad_request_response({'location': ['This field is required.']})
+
+        rooms = self.get_rooms(params).available(params['start'], params['end'])
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(rooms, request, view=self)
+        return success_response({
+            "next": paginator.get_next_link(),
+            "previous": paginator.get_previous_link(),
+            "results": AvailableRoomSerializer(page, many=True).data,
+        })
+
+
+class HotelAvailabilityView(AvailabilityView):
+    """
+    Free rooms of one hotel for [start, end).
+    """
+    def get_rooms(self, params):
+        return Room.objects.filter(hotel_id=params['hotel_id'])
+
+
+class HotelCalendarView(ReplicaReadsMixin, APIView):
+    """
+    Free and taken slots of every room of one hotel over [start, end), read
+    from the precomputed calendar bitmaps.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, hotel_id):
+        if not settings.BOOKING_CALENDAR:
+            return not_found_response("The availability calendar is not enabled.")
+
+        query = CalendarQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return bad_request_response(query.errors)
+
+        params = query.validated_data
+        return success_response(RoomAvailability.hotel_calendar(hotel_id, params['start'], params['end']))
+
+
+class RoomAvailabilityView(ReplicaReadsMixin, APIView):
+    """
+    Whether one room is free for [start, end).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, room_id):
+        query = AvailabilityQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return bad_request_response(query.errors)
+
+        params = query.validated_data
+        return success_response({
+            "room": room_id, "available": Booking.is_room_available(room_id, params['start'], params['end']),
+        })
+
+
+class BookingHistoryView(ReplicaReadsMixin, APIView):
+    """
+    The requesting user's bookings, newest first, keyset-paginated.
+    """
+    permission_classes = [IsAuthenticated]
+    pagination_class = BookingKeysetPagination
+
+    def get_filters(self, request, **kwargs):
+        return {"user_id": request.user.id}
+
+    def get_partitions(self, **kwargs):
+        return None
+
+    def get(self, request, **kwargs):
+        # Live and archived bookings, merged page by page
+        filters = self.get_filters(request, **kwargs)
+        bookings = [
+            queryset.filter(**filters).select_related('room__hotel')
+            for queryset in (Booking.objects.confirmed(), ArchivedBooking.objects.all())
+        ]
+        paginator = self.pagination_class()
+        paginator.partitions = self.get_partitions(**kwargs)
+        page = paginator.paginate_queryset(bookings, request, view=self)
+        return success_response({
+            "next": paginator.get_next_link(),
+            "results": BookingHistorySerializer(page, many=True).data,
+        })
+
+
+class RoomBookingsView(BookingHistoryView):
+    """
+    Every booking of one room, for staff.
+    """
+    permission_classes = [IsAdminUser]
+    # Staff status has to come from the database, not from token claims
+    stateless_reads = False
+
+    def get_filters(self, request, room_id):
+        return {"room_id": room_id}
+
+
+class HotelBookingsView(RoomBookingsView):
+    """
+    Every booking of one hotel, for staff. Bookings are indexed by room, so
+    each page merges the newest bookings of every room past the cursor.
+    """
+    def get_filters(self, request, hotel_id):
+        # The partitions are the hotel's rooms already
+        return {}
+
+    def get_partitions(self, hotel_id):
+        return "room_id", Room.objects.filter(hotel_id=hotel_id)
+
+
+class HotelOccupancyView(ReplicaReadsMixin, APIView):
+    """
+    Per-day or per-hour occupancy of one hotel's rooms over [start, end), for staff.
+    """
+    permission_classes = [IsAdminUser]
+    stateless_reads = False
+
+    def get(self, request, hotel_id):
+        query = OccupancyQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return bad_request_response(query.errors)
+
+        params = query.validated_data
+        try:
+            occupancy = hotel_occupancy(
+                hotel_id, params['start'], params['end'], params['granularity'], include_matrix=params['matrix']
+            )
+        except ValidationError as e:
+            return bad_request_response(str(e.message))
+        return success_response(occupancy)
+
+
+class BookingExportView(ReplicaReadsMixin, APIView):
+    """
+    Every live and archived booking as a streamed CSV or NDJSON download, for staff.
+    """
+    permission_classes = [IsAdminUser]
+    stateless_reads = False
+    content_types = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+    def get(self, request):
+        query = ExportQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return bad_request_response(query.errors)
+
+        params = query.validated_data
+        filters = {name: params[key] for name, key in (("hotel_id", "hotel"), ("start", "start"), ("end", "end"))
+                   if key in params}
+        filename = f"bookings.{params['output']}" + (".gz" if params['gzip'] else "")
+        response = StreamingHttpResponse(
+            self.stream(export_bookings(params['output'], params['gzip'], **filters)),
+            content_type="application/gzip" if params['gzip'] else self.content_types[params['output']],
+        )
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
+    @staticmethod
+    def stream(chunks):
+        # Rows are read after the view returned, outside dispatch's replica scope
+        with replica_reads():
+            yield from chunks
+
+
+class AsyncAPIView(View):
+    """
+    Base of the native async endpoints, served without thread hops under
+    ASGI: JWT authentication through the async ORM, no CSRF (tokens are not
+    cookies) and the usual response envelope.
+    """
+    @classmethod
+    def as_view(cls, **initkwargs):
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        authenticator = AsyncJWTAuthentication()
+        try:
+            authenticated = await authenticator.aauthenticate(request)
+        except APIException as e:
+            return self.unauthorized(authenticator, e.detail)
+        if authenticated is None:
+            return self.unauthorized(authenticator, NotAuthenticated.default_detail)
+        request.user, request.auth = authenticated
+        bind(user_id=request.user.id)
+        return await super().dispatch(request, *args, **kwargs)
+
+    @staticmethod
+    def unauthorized(authenticator, detail):
+        # The shape DRF gives authentication failures
+        response = JsonResponse({"detail": detail}, status=401)
+        response["WWW-Authenticate"] = authenticator.authenticate_header(None)
+        return response
+
+
+class AsyncBookingView(AsyncAPIView):
+    """
+    POST /booking/ on the async ORM. Idempotency keys and admission queues
+    need transactions and blocking waits, so they stay on the sync endpoint;
+    the per-user rate limit applies here too.
+    """
+    async def post(self, request):
+        logger.info("User %s is attempting to create a booking.", request.user.username)
+
+        retry_after = throttle_user(request.user.id)
+        if retry_after:
+            logger.warning("User %s is booking too fast.", request.user.username)
+            response = json_response(TOO_MANY_REQUESTS_429, error="Too many booking requests, please slow down.")
+            response["Retry-After"] = str(math.ceil(retry_after))
+            return response
+
+        try:
+            data = json.loads(request.body)
+        except ValueError:
+            return json_response(BAD_REQUEST_400, error="Request body must be JSON.")
+        serializer = FastBookingSerializer(data=data)
+        if not serializer.is_valid():
+            logger.warning("Invalid serializer data: %s", serializer.errors)
+            return json_response(BAD_REQUEST_400, error=serializer.errors)
+
+        bind(room_id=serializer.validated_data['room_id'])
+        try:
+            booking = await Booking.ainsert(user=request.user, **serializer.validated_data)
+        except ValidationError as e:
+            logger.warning("Validation error: %s", e)
+            return json_response(BAD_REQUEST_400, error=e.message_dict if hasattr(e, 'error_dict') else e.messages[0])
+        except RoomBusy as e:
+            logger.warning("Room %s is busy.", e)
+            return json_response(CONFLICT_409, error="Room is busy, please retry.")
+        return json_response(data={"message": "Booking successful!", "booking_id": booking.id})
+
+
+class AsyncRoomAvailabilityView(AsyncAPIView):
+    """
+    RoomAvailabilityView on the async ORM.
+    """
+    async def get(self, request, room_id):
+        query = AvailabilityQuerySerializer(data=request.GET)
+        if not query.is_valid():
+            return json_response(BAD_REQUEST_400, error=query.errors)
+
+        params = query.validated_data
+        with replica_reads(pending_user=True):
+            await sync_to_async(settle_reads)(request.user)
+            available = await Booking.ais_room_available(room_id, params['start'], params['end'])
+        return json_response(data={"room": room_id, "available": available})
+
+
+def metrics_view(request):
+    """
+    Prometheus text exposition of this worker's metrics, for scrapers holding
+    BOOKING_METRICS_TOKEN and for staff.
+    """
+    token = settings.BOOKING_METRICS_TOKEN
+    scheme, _, credentials = request.headers.get("Authorization", "").partition(" ")
+    if not (token and scheme.lower() == "bearer" and constant_time_compare(credentials, token)):
+        if not request.user.is_staff:
+            response = HttpResponse("Forbidden", status=403 if request.user.is_authenticated else 401,
+                                    content_type="text/plain; charset=utf-8")
+            if token:
+                response["WWW-Authenticate"] = "Bearer"
+            return response
+    return HttpResponse(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")